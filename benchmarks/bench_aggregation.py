@@ -0,0 +1,61 @@
+"""
+Benchmark of delta aggregation rules.
+
+Run from the repository root:
+    python -m benchmarks.bench_aggregation --trainers 32 --params 4000000
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from orchestrator.aggregation import AGGREGATION_RULES, aggregate
+
+
+def _naive_mean(deltas: list, n_keys: int) -> dict:
+    # старый подход: цикл по тренерам и по ключам state_dict
+    result = {}
+    for k in range(n_keys):
+        acc = deltas[0][k].copy()
+        for d in deltas[1:]:
+            acc += d[k]
+        result[k] = acc / len(deltas)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trainers", type=int, default=32)
+    parser.add_argument("--params", type=int, default=4_000_000)
+    parser.add_argument("--trim", type=int, default=2)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--naive-keys", type=int, default=64, help="state_dict keys for the per-key baseline")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    stacked = rng.standard_normal((args.trainers, args.params), dtype=np.float32)
+    out = np.empty(args.params, dtype=np.float32)
+    print(f"trainers={args.trainers} params={args.params} ({stacked.nbytes / 2**20:.0f} MiB)")
+
+    for rule in AGGREGATION_RULES:
+        for workers in sorted({1, args.workers}):
+            aggregate(stacked, rule=rule, trim=args.trim, out=out, workers=workers)
+            timings = []
+            for _ in range(args.repeats):
+                started = time.perf_counter()
+                aggregate(stacked, rule=rule, trim=args.trim, out=out, workers=workers)
+                timings.append(time.perf_counter() - started)
+            print(f"{rule:>13} workers={workers}: best {min(timings) * 1000:8.1f} ms, "
+                  f"median {sorted(timings)[len(timings) // 2] * 1000:8.1f} ms")
+
+    chunks = np.array_split(np.arange(args.params), args.naive_keys)
+    deltas = [{k: row[idx] for k, idx in enumerate(chunks)} for row in stacked]
+    started = time.perf_counter()
+    _naive_mean(deltas, args.naive_keys)
+    print(f"   naive mean (per-key loop): {(time.perf_counter() - started) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
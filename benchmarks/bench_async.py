@@ -0,0 +1,144 @@
+"""
+Convergence per wall-clock: synchronous epoch aggregation (every round
+waits for the slowest trainer, then averages) versus the asynchronous,
+staleness-bounded mode (each delta is applied on arrival).
+
+The model is a least-squares regression trained with local SGD, so the
+real aggregators from orchestrator.aggregation are exercised on real
+deltas; time is simulated from per-trainer speeds in steps/second.
+
+Run from the repository root:
+    python -m benchmarks.bench_async --speeds 8,8,6,4,0.5 --horizon 300
+"""
+
+import argparse
+import heapq
+
+import numpy as np
+
+from orchestrator.aggregation import AsyncAggregator, EpochAggregator
+from orchestrator.fleet import SIMULATED_TRAINERS
+
+
+class Problem:
+    def __init__(self, n_features: int, samples: int, noise: float, seed: int):
+        rng = np.random.default_rng(seed)
+        self.x = rng.standard_normal((samples, n_features)).astype(np.float32)
+        w_true = rng.standard_normal(n_features).astype(np.float32)
+        self.y = self.x @ w_true + noise * rng.standard_normal(samples).astype(np.float32)
+        w_best = np.linalg.lstsq(self.x, self.y, rcond=None)[0]
+        self.best = self.loss(w_best)
+
+    def loss(self, w: np.ndarray) -> float:
+        r = self.x @ w - self.y
+        return float(r @ r) / (2 * len(r))
+
+    def local_delta(self, w: np.ndarray, steps: int, lr: float, batch: int, rng) -> np.ndarray:
+        local = w.copy()
+        for _ in range(steps):
+            idx = rng.integers(0, len(self.y), size=batch)
+            xb = self.x[idx]
+            local -= lr * (xb.T @ (xb @ local - self.y[idx])) / batch
+        return local - w
+
+
+def _params(aggregator, n: int) -> tuple:
+    version, params = aggregator.snapshot()
+    return version, np.zeros(n, dtype=np.float32) if params is None else params
+
+
+def _run_sync(problem, speeds, trainers, args, rng) -> list:
+    aggregator = EpochAggregator(rule="mean")
+    n = problem.x.shape[1]
+    now, curve = 0.0, [(0.0, problem.loss(np.zeros(n, dtype=np.float32)))]
+    while now < args.horizon:
+        _, w = _params(aggregator, n)
+        durations = []
+        for trainer, speed in zip(trainers, speeds):
+            aggregator.add_delta(trainer, problem.local_delta(w, args.steps, args.lr, args.batch, rng))
+            durations.append(args.overhead + args.steps / speed * rng.uniform(1 - args.jitter, 1 + args.jitter))
+        aggregator.aggregate()
+        now += max(durations)
+        curve.append((now, problem.loss(_params(aggregator, n)[1])))
+    return curve
+
+
+def _run_async(problem, speeds, trainers, args, rng) -> tuple:
+    aggregator = AsyncAggregator(max_staleness=args.max_staleness, alpha=args.alpha, mixing=args.mixing)
+    n = problem.x.shape[1]
+    curve = [(0.0, problem.loss(np.zeros(n, dtype=np.float32)))]
+    events = []
+    for i in range(len(speeds)):
+        version, w = _params(aggregator, n)
+        took = args.overhead + args.steps / speeds[i] * rng.uniform(1 - args.jitter, 1 + args.jitter)
+        heapq.heappush(events, (took, i, version, w))
+    while events:
+        now, i, base, w = heapq.heappop(events)
+        if now > args.horizon:
+            break
+        result = aggregator.add_delta(trainers[i], problem.local_delta(w, args.steps, args.lr, args.batch, rng), base)
+        if result["applied"]:
+            curve.append((now, problem.loss(_params(aggregator, n)[1])))
+        # тренер сразу берёт свежую модель и следующую задачу
+        version, w = _params(aggregator, n)
+        took = args.overhead + args.steps / speeds[i] * rng.uniform(1 - args.jitter, 1 + args.jitter)
+        heapq.heappush(events, (now + took, i, version, w))
+    return curve, aggregator
+
+
+def _time_to(curve: list, target: float) -> float:
+    for t, loss in curve:
+        if loss <= target:
+            return t
+    return float("inf")
+
+
+def _loss_at(curve: list, t: float) -> float:
+    loss = curve[0][1]
+    for at, value in curve:
+        if at > t:
+            break
+        loss = value
+    return loss
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--speeds", default="8,8,6,4,0.5", help="steps/second per simulated trainer")
+    parser.add_argument("--steps", type=int, default=10, help="local SGD steps per task")
+    parser.add_argument("--overhead", type=float, default=0.5, help="seconds per task (fetch, upload)")
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--horizon", type=float, default=300.0, help="simulated seconds")
+    parser.add_argument("--features", type=int, default=256)
+    parser.add_argument("--samples", type=int, default=20_000)
+    parser.add_argument("--lr", type=float, default=0.01)
+    parser.add_argument("--batch", type=int, default=32)
+    parser.add_argument("--max-staleness", type=int, default=4)
+    parser.add_argument("--alpha", type=float, default=0.5)
+    parser.add_argument("--mixing", type=float, default=0.5)
+    parser.add_argument("--target", type=float, default=2.0, help="target loss as a multiple of the optimum")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    speeds = [float(v) for v in args.speeds.split(",")]
+    if len(speeds) > len(SIMULATED_TRAINERS):
+        parser.error(f"at most {len(SIMULATED_TRAINERS)} simulated trainers")
+    trainers = [t["address"].lower() for t in SIMULATED_TRAINERS[:len(speeds)]]
+    problem = Problem(args.features, args.samples, 0.1, args.seed)
+    target = problem.best * args.target
+    print(f"trainers={len(speeds)} speeds={speeds} steps/task={args.steps} "
+          f"optimum={problem.best:.4f} target={target:.4f}")
+
+    sync = _run_sync(problem, speeds, trainers, args, np.random.default_rng(args.seed))
+    curve, aggregator = _run_async(problem, speeds, trainers, args, np.random.default_rng(args.seed))
+    checkpoints = [args.horizon * f for f in (0.1, 0.25, 0.5, 1.0)]
+    for name, c, versions in (("sync ", sync, len(sync) - 1), ("async", curve, aggregator.version)):
+        losses = "  ".join(f"t={t:.0f}s {_loss_at(c, t):.4f}" for t in checkpoints)
+        print(f"{name}: {versions:5d} versions, target reached at {_time_to(c, target):7.1f} s | {losses}")
+    stats = aggregator.stats()
+    print(f"async: applied {stats['applied']}, rejected {stats['rejected']} stale deltas, "
+          f"mean staleness {stats['mean_staleness']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Benchmark of delta compression modes.
+
+Reports bytes on wire, trainer-side encode and orchestrator-side decode
+throughput, and the relative error of the aggregated (mean) delta compared
+to aggregating the uncompressed deltas. The error-feedback columns show the
+error of the sum over several rounds, which is what the global model sees.
+
+Run from the repository root:
+    python -m benchmarks.bench_compression --params 2000000 --trainers 8
+"""
+
+import argparse
+import time
+
+import numpy as np
+import torch
+
+from common import delta_format as wire
+from orchestrator.aggregation import aggregate
+from trainer.compression import MODES, DeltaCompressor
+
+
+def _payload(parts: list) -> np.ndarray:
+    return np.frombuffer(b"".join(parts), dtype=np.uint8)
+
+
+def _relative_error(approx: np.ndarray, exact: np.ndarray) -> float:
+    return float(np.linalg.norm(approx - exact) / (np.linalg.norm(exact) + 1e-12))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--params", type=int, default=2_000_000)
+    parser.add_argument("--trainers", type=int, default=8)
+    parser.add_argument("--tensors", type=int, default=8, help="segments for per-tensor int8 scales")
+    parser.add_argument("--topk-ratio", type=float, default=0.01)
+    parser.add_argument("--rounds", type=int, default=5, help="rounds for the error-feedback comparison")
+    args = parser.parse_args()
+
+    gen = torch.Generator().manual_seed(0)
+    # дельты с разным масштабом по тензорам, как у реальных слоёв
+    segments = [args.params // args.tensors] * args.tensors
+    segments[-1] += args.params - sum(segments)
+    scales = torch.cat([torch.full((n,), 10.0 ** -i) for i, n in enumerate(segments)])
+    rounds = [
+        [torch.randn(args.params, generator=gen) * scales for _ in range(args.trainers)]
+        for _ in range(args.rounds)
+    ]
+    exact_rounds = [aggregate(torch.stack(deltas).numpy(), rule="mean") for deltas in rounds]
+    exact_total = np.sum(exact_rounds, axis=0)
+    raw_bytes = args.params * 4
+
+    print(f"params={args.params} trainers={args.trainers} raw={raw_bytes / 2**20:.1f} MiB")
+    print(f"{'mode':>6} {'bytes':>12} {'ratio':>6} {'enc MB/s':>9} {'dec MB/s':>9} "
+          f"{'err 1 round':>12} {'err sum':>9} {'err sum+EF':>11}")
+
+    for mode in MODES:
+        if mode == "none":
+            continue
+        totals = {}
+        for error_feedback in (False, True):
+            compressors = [
+                DeltaCompressor(mode, topk_ratio=args.topk_ratio, segments=segments, error_feedback=error_feedback)
+                for _ in range(args.trainers)
+            ]
+            total = np.zeros(args.params, dtype=np.float32)
+            enc_time = dec_time = 0.0
+            for r, deltas in enumerate(rounds):
+                stacked = np.empty((args.trainers, args.params), dtype=np.float32)
+                for i, (compressor, delta) in enumerate(zip(compressors, deltas)):
+                    started = time.perf_counter()
+                    parts = compressor.encode(delta.clone())
+                    enc_time += time.perf_counter() - started
+                    payload = _payload(parts)
+                    started = time.perf_counter()
+                    wire.decode_into(payload, stacked[i])
+                    dec_time += time.perf_counter() - started
+                agg = aggregate(stacked, rule="mean")
+                total += agg
+                if r == 0 and not error_feedback:
+                    first_error = _relative_error(agg, exact_rounds[0])
+                    wire_bytes = payload.size
+            totals[error_feedback] = _relative_error(total, exact_total)
+            if not error_feedback:
+                n_encoded = args.trainers * len(rounds)
+                enc_rate = raw_bytes * n_encoded / enc_time / 1e6
+                dec_rate = raw_bytes * n_encoded / dec_time / 1e6
+
+        print(f"{mode:>6} {wire_bytes:>12} {raw_bytes / wire_bytes:>6.1f} {enc_rate:>9.0f} {dec_rate:>9.0f} "
+              f"{first_error:>12.2e} {totals[False]:>9.2e} {totals[True]:>11.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Graph size over uptime with churning trainer addresses: the store without
+retention versus node TTL + edge windows + aggregation over a size cap.
+
+Time is simulated through the store's clock, so hours of uptime take
+seconds. Every simulated second `--rate` requests arrive (get_task +
+submit_update edges, as the orchestrator records them); each one comes
+from a new address with probability `--churn`, otherwise from a recently
+active one. Reported per checkpoint: nodes, edges, full `/graph` payload
+size, memory held by the store and the time of one `expire()` pass.
+
+Run from the repository root:
+    python -m benchmarks.bench_graph --hours 4 --rate 10 --churn 0.05
+"""
+
+import argparse
+import json
+import random
+import time
+import tracemalloc
+
+from orchestrator.graph import GraphStore
+
+
+def _request(graph: GraphStore, trainer: str):
+    node = f"trainer:{trainer}"
+    graph.ensure_node(node, f"Trainer {trainer[:6]}", "trainer")
+    graph.record_edge(node, "orchestrator", "request_task")
+    graph.record_edge("orchestrator", node, "assign_task")
+    graph.record_edge(node, "orchestrator", "submit_update")
+    graph.record_edge("orchestrator", "contract", "submit_update")
+
+
+def _payload_bytes(graph: GraphStore) -> int:
+    version, full, nodes, edges, removed = graph.changes()
+    return len(json.dumps({"version": version, "full": full, "nodes": nodes, "edges": edges, "removed": removed}))
+
+
+def _run(name: str, graph: GraphStore, clock: list, args) -> list:
+    rng = random.Random(args.seed)
+    graph.ensure_node("orchestrator", "Orchestrator", "orchestrator")
+    graph.ensure_node("contract", "JobManager", "contract")
+    active, seq, rows = [], 0, []
+    checkpoints = {int(args.hours * 3600 * f) for f in (0.125, 0.25, 0.5, 1.0)}
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    expire_ms = 0.0
+    for second in range(1, int(args.hours * 3600) + 1):
+        clock[0] += 1
+        for _ in range(args.rate):
+            if not active or rng.random() < args.churn:
+                seq += 1
+                active.append("0x%040x" % seq)
+                # «недавно активные» — скользящее окно адресов, старые уходят навсегда
+                if len(active) > args.fleet:
+                    active.pop(0)
+            _request(graph, rng.choice(active))
+        if second % args.interval == 0:
+            started = time.perf_counter()
+            graph.expire()
+            expire_ms = (time.perf_counter() - started) * 1000
+        if second in checkpoints:
+            memory = (tracemalloc.get_traced_memory()[0] - base) / 2**20
+            rows.append((second / 3600, graph.node_count(), graph.edge_count(), _payload_bytes(graph) / 1024,
+                         memory, expire_ms, seq))
+            print(f"{name:9s} {second / 3600:6.1f} h  addresses {seq:8d}  nodes {rows[-1][1]:7d}  "
+                  f"edges {rows[-1][2]:7d}  /graph {rows[-1][3]:9.1f} KiB  memory {memory:7.1f} MiB  "
+                  f"expire {expire_ms:6.2f} ms")
+    tracemalloc.stop()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--hours", type=float, default=4.0, help="simulated uptime")
+    parser.add_argument("--rate", type=int, default=10, help="trainer requests per simulated second")
+    parser.add_argument("--churn", type=float, default=0.05, help="share of requests from a new address")
+    parser.add_argument("--fleet", type=int, default=300, help="addresses active at any time")
+    parser.add_argument("--node-ttl", type=float, default=900)
+    parser.add_argument("--edge-window", type=float, default=300)
+    parser.add_argument("--max-nodes", type=int, default=500)
+    parser.add_argument("--interval", type=int, default=5, help="seconds between expire() passes")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    for name, kwargs in (
+        ("unbounded", {}),
+        ("retention", {"node_ttl": args.node_ttl, "edge_window": args.edge_window, "max_nodes": args.max_nodes}),
+    ):
+        clock = [1_700_000_000.0]
+        _run(name, GraphStore(clock=lambda: clock[0], **kwargs), clock, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Benchmark of update hashing: one serial SHA-256 versus the chunked Merkle
+root with a growing number of hashing threads.
+
+Run from the repository root:
+    python -m benchmarks.bench_hashing --mib 512
+"""
+
+import argparse
+import hashlib
+import os
+import time
+
+from common.merkle import DEFAULT_CHUNK_SIZE, hash_leaves, merkle_root
+
+
+def _best(fn, repeats: int) -> float:
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mib", type=int, default=512, help="payload size")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    payload = bytearray(os.urandom(1 << 20)) * args.mib
+    size_mb = len(payload) / 1e6
+    print(f"payload={args.mib} MiB chunk={args.chunk_size} cores={os.cpu_count()}")
+
+    serial = _best(lambda: hashlib.sha256(payload).digest(), args.repeats)
+    print(f"{'sha256 serial':>18}: {serial * 1000:8.1f} ms  {size_mb / serial:8.0f} MB/s")
+
+    workers = 1
+    while workers <= (os.cpu_count() or 1):
+        elapsed = _best(lambda: merkle_root(hash_leaves([payload], args.chunk_size, workers=workers)), args.repeats)
+        print(f"{f'merkle {workers} thr':>18}: {elapsed * 1000:8.1f} ms  {size_mb / elapsed:8.0f} MB/s")
+        workers *= 2
+
+
+if __name__ == "__main__":
+    main()
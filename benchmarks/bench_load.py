@@ -0,0 +1,420 @@
+"""
+Load test of the orchestrator hot paths with a fake swarm.
+
+The FastAPI app runs in-process and is called directly through ASGI (no
+sockets, no HTTP client), so the numbers measure the handlers, the graph,
+the scheduler and the journal rather than the network stack. A threaded
+JSON-RPC server stands in for the Web3 node, so `/submit_update` goes
+through the real contract path (transaction building, nonces, batching).
+
+Thousands of simulated trainers loop over `/get_task` (+ optional
+`/upload_delta`) + `/submit_update`, validators post `/submit_validation`
+for uploaded deltas (so only with `--upload-params`),
+dashboards poll `/graph` with ETag and `?since=` like the frontend and
+probes poll `/health`. The workload is a fixed number of rounds with a fixed seed, so results of
+two commits are comparable; `--json` saves them and `--baseline` compares
+against a saved run and fails on regressions.
+
+Run from the repository root:
+    python -m benchmarks.bench_load --trainers 2000 --validators 200 --pollers 50 --rounds 5
+    python -m benchmarks.bench_load --json before.json
+    python -m benchmarks.bench_load --baseline before.json --tolerance 0.2
+    python -m benchmarks.bench_load --chain direct --rpc-latency 1   # slow node
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlencode
+
+CONTRACT_ABI = [
+    {"type": "function", "name": "submitUpdate", "stateMutability": "nonpayable", "outputs": [],
+     "inputs": [{"name": "jobId", "type": "uint256"}, {"name": "updateHash", "type": "bytes32"}]},
+    {"type": "function", "name": "submitUpdatesFor", "stateMutability": "nonpayable", "outputs": [],
+     "inputs": [{"name": "jobId", "type": "uint256"}, {"name": "trainerList", "type": "address[]"},
+                {"name": "updateHashes", "type": "bytes32[]"}]},
+    {"type": "function", "name": "validateUpdates", "stateMutability": "nonpayable", "outputs": [],
+     "inputs": [{"name": "jobId", "type": "uint256"}, {"name": "indices", "type": "uint256[]"},
+                {"name": "valid", "type": "bool[]"}]},
+    {"type": "event", "name": "UpdateSubmitted", "anonymous": False,
+     "inputs": [{"name": "jobId", "type": "uint256", "indexed": True},
+                {"name": "trainer", "type": "address", "indexed": True},
+                {"name": "updateHash", "type": "bytes32", "indexed": False},
+                {"name": "index", "type": "uint256", "indexed": False}]},
+]
+
+RPC_RESULTS = {
+    "web3_clientVersion": "bench-node/1.0",
+    "net_version": "31337",
+    "eth_chainId": "0x7a69",
+    "eth_gasPrice": "0x3b9aca00",
+    "eth_getTransactionCount": "0x0",
+    "eth_blockNumber": "0x1",
+    "eth_getLogs": [],
+    "eth_estimateGas": "0x7a120",
+    "eth_call": "0x",
+    "eth_sendRawTransaction": "0x" + "ab" * 32,
+}
+
+# оператор пакетных транзакций — первый аккаунт Hardhat, его ключ общеизвестен
+OPERATOR_ADDRESS = "0xf39Fd6e51aad88F6F4ce6aB8827279cffFb92266"
+OPERATOR_KEY = "0xac0974bec39a17e36ba4a6b4d238ff944bacb478cbed5efcae784d7bf4f2ff80"
+
+# пакет «смайнен» сразу; событий в квитанции нет, индексы апдейтов проставляет сам бенчмарк
+RPC_RESULTS["eth_getTransactionReceipt"] = {
+    "transactionHash": RPC_RESULTS["eth_sendRawTransaction"], "transactionIndex": "0x0",
+    "blockHash": "0x" + "cd" * 32, "blockNumber": "0x1", "from": OPERATOR_ADDRESS, "to": None,
+    "cumulativeGasUsed": "0x0", "gasUsed": "0x0", "effectiveGasPrice": "0x3b9aca00", "contractAddress": None,
+    "logs": [], "logsBloom": "0x" + "00" * 256, "type": "0x0", "status": "0x1",
+}
+
+
+class _RPCHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    calls: dict = {}
+    lock = threading.Lock()
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("content-length", 0))))
+        requests = body if isinstance(body, list) else [body]
+        if self.latency:
+            time.sleep(self.latency)
+        replies = []
+        for req in requests:
+            method = req.get("method")
+            with self.lock:
+                self.calls[method] = self.calls.get(method, 0) + 1
+            if method in RPC_RESULTS:
+                replies.append({"jsonrpc": "2.0", "id": req.get("id"), "result": RPC_RESULTS[method]})
+            else:
+                replies.append({"jsonrpc": "2.0", "id": req.get("id"),
+                                "error": {"code": -32601, "message": f"{method} not supported"}})
+        data = json.dumps(replies if isinstance(body, list) else replies[0]).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class _NodeServer(ThreadingHTTPServer):
+    # в direct-режиме сотни тредов пула стучатся одновременно; бэклог 5 даёт сбросы соединений
+    request_queue_size = 1024
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # оборванные по таймауту запросы оркестратора — ожидаемое поведение, не трейсбек
+        pass
+
+
+def _start_node(latency: float) -> ThreadingHTTPServer:
+    _RPCHandler.latency = latency
+    server = _NodeServer(("127.0.0.1", 0), _RPCHandler)
+    threading.Thread(target=server.serve_forever, name="bench-node", daemon=True).start()
+    return server
+
+
+async def asgi_request(app, method: str, path: str, query: dict = None, headers: dict = None,
+                       body: bytes = b"") -> tuple:
+    """Call an ASGI app directly; returns (status, headers dict, body bytes)."""
+    raw_headers = [(k.lower().encode(), str(v).encode()) for k, v in (headers or {}).items()]
+    raw_headers.append((b"content-length", str(len(body)).encode()))
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": method, "scheme": "http", "path": path, "raw_path": path.encode(),
+        "query_string": urlencode(query or {}).encode(), "headers": raw_headers,
+        "client": ("127.0.0.1", 50000), "server": ("bench", 80), "root_path": "",
+    }
+    sent = [False]
+
+    async def receive():
+        if not sent[0]:
+            sent[0] = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await asyncio.sleep(3600)
+        return {"type": "http.disconnect"}
+
+    response = {"status": 0, "headers": {}, "body": []}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = {k.decode(): v.decode() for k, v in message.get("headers", [])}
+        elif message["type"] == "http.response.body":
+            response["body"].append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return response["status"], response["headers"], b"".join(response["body"])
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: dict = {}
+        self.errors: dict = {}
+        self.degraded: dict = {}
+
+    async def call(self, name: str, app, *args, **kwargs) -> tuple:
+        started = time.perf_counter()
+        status, headers, body = await asgi_request(app, *args, **kwargs)
+        self.latencies.setdefault(name, []).append(time.perf_counter() - started)
+        # ошибки контракта и загрузки хэндлеры возвращают как 200 со status=error
+        if (status >= 400 and status != 404) or b'"status":"error"' in body:
+            self.errors[name] = self.errors.get(name, 0) + 1
+        elif b'"node_timeout"' in body:
+            # нода не ответила вовремя: запрос отвечен, но транзакция не подготовлена
+            self.degraded[name] = self.degraded.get(name, 0) + 1
+        return status, headers, body
+
+
+def _rss_mib() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _percentile(values: list, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def _trainer(app, rec: Recorder, address: str, rounds: int, payload: bytes, rng: random.Random,
+                   think: float, uploaded: list):
+    for _ in range(rounds):
+        _, _, body = await rec.call("get_task", app, "POST", "/get_task",
+                                    headers={"content-type": "application/json"},
+                                    body=json.dumps({"trainer": address, "job_id": 0}).encode())
+        task = json.loads(body)
+        if not task.get("steps"):
+            # в бенчмарке не ждём retry_after: свободных диапазонов нет — это тоже нагрузка
+            continue
+        update_hash = "%064x" % rng.getrandbits(256)
+        if payload:
+            _, _, body = await rec.call("upload_delta", app, "POST", "/upload_delta",
+                                        query={"trainer": address, "job_id": 0,
+                                               "base_version": task.get("model_version", 0)},
+                                        headers={"content-type": "application/octet-stream"}, body=payload)
+            update_hash = json.loads(body).get("update_hash", update_hash)
+        await rec.call("submit_update", app, "POST", "/submit_update",
+                       headers={"content-type": "application/json"},
+                       body=json.dumps({"trainer": address, "job_id": 0, "update_hash": update_hash,
+                                        "lease_id": task.get("lease_id")}).encode())
+        if payload:
+            # стенд-нода не выпускает UpdateSubmitted — индекс в цепи проставляем за неё
+            sys.modules["orchestrator.orchestrator"].update_store.set_index(update_hash, len(uploaded))
+            uploaded.append(update_hash)
+        if think:
+            await asyncio.sleep(rng.uniform(0, 2 * think))
+
+
+async def _validator(app, rec: Recorder, address: str, rounds: int, rng: random.Random, think: float,
+                     uploaded: list):
+    for _ in range(rounds):
+        # вердикт выносится только по загруженной дельте
+        while not uploaded:
+            await asyncio.sleep(0.01)
+        update_hash = rng.choice(uploaded)
+        await rec.call("submit_validation", app, "POST", "/submit_validation",
+                       headers={"content-type": "application/json"},
+                       body=json.dumps({"validator": address, "job_id": 0, "update_hash": update_hash,
+                                        "valid": rng.random() > 0.1}).encode())
+        if think:
+            await asyncio.sleep(rng.uniform(0, 2 * think))
+
+
+async def _poller(app, rec: Recorder, polls: int, interval: float):
+    etag, version = None, None
+    for _ in range(polls):
+        headers = {"if-none-match": etag} if etag else {}
+        query = {"since": version} if version is not None else {}
+        status, resp_headers, body = await rec.call("graph", app, "GET", "/graph", query=query, headers=headers)
+        if status == 200:
+            etag = resp_headers.get("etag")
+            version = json.loads(body)["version"]
+        await asyncio.sleep(interval)
+
+
+async def _prober(app, rec: Recorder, interval: float):
+    # liveness-проба балансировщика: не должна зависеть от ноды
+    while True:
+        await rec.call("health", app, "GET", "/health")
+        await asyncio.sleep(interval)
+
+
+async def _swarm(app, args) -> tuple:
+    rng = random.Random(args.seed)
+    rec = Recorder()
+    payload = bytes(args.upload_params * 4)
+    uploaded: list = []
+    tasks = [_trainer(app, rec, "0x%040x" % (i + 1), args.rounds, payload, random.Random(rng.random()), args.think,
+                      uploaded)
+             for i in range(args.trainers)]
+    tasks += [_validator(app, rec, "0x%040x" % (10**6 + i), args.rounds, random.Random(rng.random()), args.think,
+                         uploaded)
+              for i in range(args.validators if payload else 0)]
+    # дашборды опрашивают граф, пока работает рой
+    pollers = [asyncio.ensure_future(_poller(app, rec, 10**9, args.poll_interval)) for _ in range(args.pollers)]
+    pollers += [asyncio.ensure_future(_prober(app, rec, args.poll_interval)) for _ in range(args.probes)]
+    started = time.perf_counter()
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+    for p in pollers:
+        p.cancel()
+    await asyncio.gather(*pollers, return_exceptions=True)
+    return rec, elapsed
+
+
+async def _serve(app, args) -> tuple:
+    # startup/shutdown-хэндлеры (sync и async) — в том же event loop, что и рой
+    await app.router.startup()
+    try:
+        rss_loaded = _rss_mib()
+        rec, elapsed = await _swarm(app, args)
+    finally:
+        await app.router.shutdown()
+    return rec, elapsed, rss_loaded
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ""
+
+
+def _compare(result: dict, baseline: dict, tolerance: float) -> list:
+    regressions = []
+    for name, cur in result["endpoints"].items():
+        old = baseline.get("endpoints", {}).get(name)
+        if not old:
+            continue
+        for key, worse in (("p50_ms", lambda a, b: a > b), ("p99_ms", lambda a, b: a > b),
+                           ("rps", lambda a, b: a < b)):
+            change = cur[key] / old[key] - 1 if old[key] else 0.0
+            flag = worse(cur[key], old[key]) and abs(change) > tolerance
+            print(f"  {name:18s} {key:7s} {old[key]:10.2f} -> {cur[key]:10.2f} ({change:+6.1%})"
+                  f"{'  REGRESSION' if flag else ''}")
+            if flag:
+                regressions.append(f"{name} {key}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trainers", type=int, default=2000)
+    parser.add_argument("--validators", type=int, default=200)
+    parser.add_argument("--pollers", type=int, default=50, help="dashboards polling /graph")
+    parser.add_argument("--rounds", type=int, default=5, help="task/update (or validation) cycles per client")
+    parser.add_argument("--think", type=float, default=0.0, help="mean pause between client requests, s")
+    parser.add_argument("--probes", type=int, default=5, help="clients polling /health")
+    parser.add_argument("--poll-interval", type=float, default=0.5)
+    parser.add_argument("--upload-params", type=int, default=0, help="float32 params per uploaded delta, 0 = no upload")
+    parser.add_argument("--chain", choices=["direct", "batched"], default="batched",
+                        help="direct = one transaction per update, batched = operator batches")
+    parser.add_argument("--rpc-latency", type=float, default=0.0, help="stand-in node latency per call, s")
+    parser.add_argument("--shards", type=int, default=256)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--log", action="store_true", help="keep orchestrator INFO logging")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="compare with a results file written by --json")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    args = parser.parse_args()
+
+    node = _start_node(args.rpc_latency)
+    workdir = tempfile.mkdtemp(prefix="load-bench-")
+    abi_dir = os.path.join(workdir, "artifacts", "contracts", "JobManager.sol")
+    os.makedirs(abi_dir)
+    with open(os.path.join(abi_dir, "JobManager.json"), "w") as f:
+        json.dump({"abi": CONTRACT_ABI}, f)
+    os.environ.update({
+        "WEB3_PROVIDER_URL": f"http://127.0.0.1:{node.server_address[1]}",
+        "SIMULATION_ENABLED": "false",
+        "INDEXER_ENABLED": "false",
+        "STATE_DIR": os.path.join(workdir, "state"),
+        "UPDATE_STORE_DIR": os.path.join(workdir, "updates"),
+        "MODEL_STORE_DIR": os.path.join(workdir, "models"),
+        "SCHED_SHARDS": str(args.shards),
+        "ORCHESTRATOR_ADDRESS": OPERATOR_ADDRESS if args.chain == "batched" else "",
+        "ORCHESTRATOR_PRIVATE_KEY": OPERATOR_KEY if args.chain == "batched" else "",
+    })
+    cwd = os.getcwd()
+    sys.path.insert(0, cwd)  # '' в sys.path после chdir указывал бы на workdir
+    os.chdir(workdir)  # ABI ищется по относительному пути artifacts/...
+    try:
+        rss_before = _rss_mib()
+        import orchestrator.orchestrator as orch
+        if not args.log:
+            logging.getLogger("orchestrator").setLevel(logging.WARNING)
+        rec, elapsed, rss_loaded = asyncio.run(_serve(orch.app, args))
+        rss_after = _rss_mib()
+        graph_size = (orch.graph.node_count(), orch.graph.edge_count())
+    finally:
+        os.chdir(cwd)
+        node.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    total = sum(len(v) for v in rec.latencies.values())
+    print(f"commit {_git_commit() or '?'}: {args.trainers} trainers, {args.validators} validators, "
+          f"{args.pollers} pollers, {args.rounds} rounds, chain={args.chain}")
+    print(f"{total} requests in {elapsed:.2f} s = {total / elapsed:.0f} req/s; "
+          f"graph {graph_size[0]} nodes / {graph_size[1]} edges")
+    print(f"{'endpoint':18s} {'requests':>9s} {'req/s':>9s} {'p50 ms':>8s} {'p99 ms':>8s} {'max ms':>8s} {'errors':>7s} {'degraded':>9s}")
+    endpoints = {}
+    for name, values in sorted(rec.latencies.items()):
+        stats = {
+            "requests": len(values),
+            "rps": len(values) / elapsed,
+            "p50_ms": _percentile(values, 0.50) * 1000,
+            "p99_ms": _percentile(values, 0.99) * 1000,
+            "max_ms": max(values) * 1000,
+            "errors": rec.errors.get(name, 0),
+            "degraded": rec.degraded.get(name, 0),
+        }
+        endpoints[name] = stats
+        print(f"{name:18s} {stats['requests']:9d} {stats['rps']:9.0f} {stats['p50_ms']:8.2f} "
+              f"{stats['p99_ms']:8.2f} {stats['max_ms']:8.2f} {stats['errors']:7d} {stats['degraded']:9d}")
+    print(f"RSS: {rss_before:.0f} MiB before import, {rss_loaded:.0f} MiB loaded, {rss_after:.0f} MiB after run "
+          f"(+{rss_after - rss_loaded:.0f} MiB); RPC calls: {dict(sorted(_RPCHandler.calls.items()))}")
+
+    result = {
+        "commit": _git_commit(),
+        "config": vars(args),
+        "requests": total,
+        "elapsed_s": elapsed,
+        "rps": total / elapsed,
+        "rss_mib": {"loaded": rss_loaded, "after": rss_after},
+        "graph": {"nodes": graph_size[0], "edges": graph_size[1]},
+        "rpc_calls": dict(_RPCHandler.calls),
+        "endpoints": endpoints,
+    }
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print(f"vs baseline {baseline.get('commit') or args.baseline}:")
+        regressions = _compare(result, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regressions beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
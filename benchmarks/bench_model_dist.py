@@ -0,0 +1,71 @@
+"""
+Benchmark of global model distribution: bytes and CPU time per trainer
+pull for a full download versus a diff from the previous version, for
+dense updates (every parameter moves) and sparse ones (top-k uploads).
+
+Run from the repository root:
+    python -m benchmarks.bench_model_dist --params 10000000 --trainers 64
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from common.model_diff import apply_diff
+from orchestrator.model_store import ModelStore
+
+
+def _versions(n_params: int, rounds: int, density: float, scale: float, rng) -> list:
+    params = rng.standard_normal(n_params).astype(np.float32) * 0.05
+    versions = [params.copy()]
+    for _ in range(rounds):
+        if density >= 1.0:
+            params += (rng.standard_normal(n_params) * scale).astype(np.float32)
+        else:
+            idx = rng.choice(n_params, size=int(n_params * density), replace=False)
+            params[idx] += (rng.standard_normal(idx.size) * scale).astype(np.float32)
+        versions.append(params.copy())
+    return versions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--params", type=int, default=10_000_000)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--trainers", type=int, default=64, help="pulls of the same diff per round")
+    parser.add_argument("--scale", type=float, default=1e-4, help="std of a parameter update")
+    parser.add_argument("--densities", default="1.0,0.1,0.01", help="fraction of params changed per version")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    full = args.params * 4
+    print(f"params={args.params} full model={full / 2**20:.1f} MiB, {args.trainers} trainers pull every version")
+    for density in (float(v) for v in args.densities.split(",")):
+        versions = _versions(args.params, args.rounds, density, args.scale, rng)
+        store = ModelStore(keep=2, keep_on_disk=args.rounds + 1)
+        sizes, encode, apply = [], [], []
+        store.publish(0, versions[0])
+        for v in range(1, len(versions)):
+            store.publish(v, versions[v])
+            started = time.perf_counter()
+            payload = store.diff(v - 1, v)
+            encode.append(time.perf_counter() - started)
+            for _ in range(args.trainers - 1):
+                assert store.diff(v - 1, v) is payload  # остальные тренеры получают кэшированный дифф
+            started = time.perf_counter()
+            restored = apply_diff(versions[v - 1], payload)
+            apply.append(time.perf_counter() - started)
+            assert np.array_equal(restored.view(np.uint32), versions[v].view(np.uint32))
+            sizes.append(len(payload))
+        size = sum(sizes) / len(sizes)
+        print(f"density {density:5.2f}: diff {size / 2**20:7.2f} MiB ({size / full:6.1%} of full), "
+              f"encode {np.mean(encode) * 1000:6.1f} ms once per version, "
+              f"apply {np.mean(apply) * 1000:6.1f} ms per trainer; "
+              f"round traffic {args.trainers * size / 2**20:8.1f} MiB vs {args.trainers * full / 2**20:8.1f} MiB full")
+        # старые версии вытеснены из памяти на диск и читаются обратно
+        assert store.get(0) is not None and store.stats()["hits"]["disk"] >= 1
+
+
+if __name__ == "__main__":
+    main()
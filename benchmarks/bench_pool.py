@@ -0,0 +1,64 @@
+"""
+Benchmark of the local trainer pool: training throughput of one leased
+task split across N worker processes, versus a single process.
+
+Run from the repository root:
+    python -m benchmarks.bench_pool --workers 1,2,4 --steps 400
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from common.shards import write_dataset
+from trainer.flatparams import FlatParameters
+from trainer.pool import TrainerPool
+from trainer.trainer import initial_model
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", default="1,2,4", help="comma separated pool sizes")
+    parser.add_argument("--steps", type=int, default=400, help="batches per leased task")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="pool-bench-")
+    try:
+        rng = np.random.default_rng(0)
+        samples = args.steps * args.batch_size
+        write_dataset(directory,
+                      rng.integers(0, 256, size=(samples, 1, 28, 28), dtype=np.uint8),
+                      rng.integers(0, 10, size=samples, dtype=np.int64), 1)
+        print(f"cores={os.cpu_count()} steps/task={args.steps} batch={args.batch_size}")
+        baseline = None
+        for n in (int(v) for v in args.workers.split(",")):
+            flat_params = FlatParameters(initial_model(0))
+            pool = TrainerPool(flat_params, n, data_dir=directory, batch_size=args.batch_size)
+            pool.start()
+            try:
+                task = {"shard_id": 0, "start": 0, "steps": args.steps}
+                pool.train(task)  # прогрев: запуск процессов, импорт torch, первое отображение шарда
+                timings = []
+                for _ in range(args.rounds):
+                    started = time.perf_counter()
+                    pool.train(task)
+                    timings.append(time.perf_counter() - started)
+            finally:
+                pool.close()
+            best = min(timings)
+            rate = args.steps * args.batch_size / best
+            baseline = baseline or rate
+            print(f"workers={n} threads/worker={pool.threads}: {rate:9.0f} samples/s "
+                  f"(x{rate / baseline:.2f}), 1 upload per task")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Simulation of epoch wall-clock: the old static task (10 steps on shard 0
+per round, every round waits for the slowest trainer) versus the
+shard-lease scheduler with adaptive steps and lease reassignment.
+
+The fleet is SIMULATED_TRAINERS with configurable speeds in steps/second;
+time is simulated, so the run takes milliseconds.
+
+Run from the repository root:
+    python -m benchmarks.bench_scheduler --speeds 8,8,6,4,0.5 --fail 2@40
+"""
+
+import argparse
+import heapq
+import math
+import random
+
+from orchestrator.fleet import SIMULATED_TRAINERS
+from orchestrator.scheduler import ShardScheduler
+
+STATIC_STEPS = 10
+
+
+def _parse_fail(value: str) -> dict:
+    fails = {}
+    for item in filter(None, value.split(",")):
+        index, at = item.split("@")
+        fails[int(index)] = float(at)
+    return fails
+
+
+def _static_epoch(speeds: list, total_batches: int, overhead: float, jitter: float,
+                  fails: dict, rng: random.Random) -> float:
+    # синхронные раунды: каждый тренер делает 10 шагов, раунд ждёт самого медленного
+    per_round = STATIC_STEPS * len(speeds)
+    now = 0.0
+    for _ in range(math.ceil(total_batches / per_round)):
+        durations = []
+        for i, speed in enumerate(speeds):
+            if i in fails and fails[i] <= now:
+                return math.inf
+            durations.append(overhead + STATIC_STEPS / speed * rng.uniform(1 - jitter, 1 + jitter))
+        now += max(durations)
+    return now
+
+
+def _scheduled_epochs(speeds: list, args, fails: dict, rng: random.Random) -> tuple:
+    clock = [0.0]
+    scheduler = ShardScheduler(
+        n_shards=args.shards,
+        shard_batches=args.shard_batches,
+        target_seconds=args.target_seconds,
+        default_steps=STATIC_STEPS,
+        max_steps=10_000,
+        lease_timeout=args.lease_timeout,
+        clock=lambda: clock[0],
+    )
+    trainers = [t["address"].lower() for t in SIMULATED_TRAINERS[:len(speeds)]]
+    events = [(0.0, i, None) for i in range(len(speeds))]
+    heapq.heapify(events)
+    durations = []
+    while events and scheduler.epochs_done < args.epochs:
+        now, i, lease_id = heapq.heappop(events)
+        if clock[0] > args.horizon:
+            break
+        clock[0] = now
+        if i in fails and fails[i] <= now:
+            continue
+        if lease_id is not None:
+            result = scheduler.complete(trainers[i], lease_id)
+            if result and result["epoch_done"]:
+                durations.append(scheduler.last_epoch_seconds)
+        task = scheduler.acquire(trainers[i])
+        if not task["steps"]:
+            heapq.heappush(events, (now + task["retry_after"], i, None))
+            continue
+        took = args.overhead + task["steps"] / speeds[i] * rng.uniform(1 - args.jitter, 1 + args.jitter)
+        heapq.heappush(events, (now + took, i, task["lease_id"]))
+    return durations, scheduler
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--speeds", default="8,8,6,4,0.5", help="steps/second per simulated trainer")
+    parser.add_argument("--shards", type=int, default=16)
+    parser.add_argument("--shard-batches", type=int, default=100)
+    parser.add_argument("--overhead", type=float, default=0.5, help="seconds per task (fetch, upload)")
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--target-seconds", type=float, default=10.0)
+    parser.add_argument("--lease-timeout", type=float, default=30.0)
+    parser.add_argument("--epochs", type=int, default=3)
+    parser.add_argument("--fail", default="", help="trainer@seconds that stop responding, e.g. 2@40")
+    parser.add_argument("--horizon", type=float, default=1e6, help="simulated seconds limit")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    speeds = [float(v) for v in args.speeds.split(",")]
+    if len(speeds) > len(SIMULATED_TRAINERS):
+        parser.error(f"at most {len(SIMULATED_TRAINERS)} simulated trainers")
+    fails = _parse_fail(args.fail)
+    total = args.shards * args.shard_batches
+    print(f"trainers={len(speeds)} speeds={speeds} batches/epoch={total} fail={fails or '-'}")
+
+    rng = random.Random(args.seed)
+    static = _static_epoch(speeds, total, args.overhead, args.jitter, fails, rng)
+    print(f"static  (10 steps/round, barrier): epoch {static:9.1f} s" if math.isfinite(static)
+          else "static  (10 steps/round, barrier): epoch never finishes (failed trainer)")
+
+    rng = random.Random(args.seed)
+    durations, scheduler = _scheduled_epochs(speeds, args, fails, rng)
+    if durations:
+        print(f"leases  (adaptive steps):          epoch {sum(durations) / len(durations):9.1f} s "
+              f"(mean of {len(durations)}, reassigned {scheduler.reassigned} ranges)")
+    else:
+        print("leases  (adaptive steps):          no epoch finished within the horizon")
+    for address, stats in scheduler.status()["trainers"].items():
+        print(f"  {address[:10]}: {stats['steps_per_second']} steps/s measured, "
+              f"{stats['completed']} leases, {stats['expired']} expired")
+
+
+if __name__ == "__main__":
+    main()
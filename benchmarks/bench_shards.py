@@ -0,0 +1,72 @@
+"""
+Benchmark of the memory-mapped shard loader: time to the first batch and
+batch throughput versus reading the whole dataset into memory first.
+
+Run from the repository root:
+    python -m benchmarks.bench_shards --samples 200000 --shards 16
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from common.shards import HEADER_SIZE, ShardedDataset, write_dataset
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--samples", type=int, default=200_000)
+    parser.add_argument("--shards", type=int, default=16)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--steps", type=int, default=200)
+    parser.add_argument("--dir", help="reuse/keep a dataset directory instead of a temp one")
+    args = parser.parse_args()
+
+    directory = args.dir or tempfile.mkdtemp(prefix="shards-bench-")
+    try:
+        if not os.path.exists(os.path.join(directory, "index.json")):
+            rng = np.random.default_rng(0)
+            x = rng.integers(0, 256, size=(args.samples, 1, 28, 28), dtype=np.uint8)
+            y = rng.integers(0, 10, size=args.samples, dtype=np.int64)
+            write_dataset(directory, x, y, args.shards)
+            del x, y
+        dataset = ShardedDataset(directory)
+        total = dataset.index["records"]
+        size = sum(os.path.getsize(os.path.join(directory, s["file"])) for s in dataset.index["shards"])
+        print(f"records={total} shards={dataset.n_shards} size={size / 2**20:.0f} MiB")
+
+        # старый подход: прочитать весь датасет в память до первого шага
+        started = time.perf_counter()
+        arrays = []
+        for entry in dataset.index["shards"]:
+            with open(os.path.join(directory, entry["file"]), "rb") as f:
+                f.seek(HEADER_SIZE)
+                arrays.append(np.frombuffer(f.read(), dtype=np.uint8))
+        eager = time.perf_counter() - started
+        del arrays
+
+        started = time.perf_counter()
+        dataset = ShardedDataset(directory)
+        first = next(dataset.batches(3, 0, 1, args.batch_size))
+        lazy = time.perf_counter() - started
+        print(f"time to first batch: eager load {eager * 1000:.1f} ms, memmap {lazy * 1000:.2f} ms")
+        assert first[0].shape[0] == args.batch_size
+
+        started = time.perf_counter()
+        seen = 0
+        for x, _ in dataset.batches(3, 0, args.steps, args.batch_size):
+            seen += x.shape[0]
+            x.sum()
+        took = time.perf_counter() - started
+        print(f"memmap batches: {args.steps / took:.0f} batches/s ({seen / took:.0f} samples/s)")
+    finally:
+        if not args.dir:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
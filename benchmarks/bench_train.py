@@ -0,0 +1,93 @@
+"""
+Training throughput of one trainer process on CPU for each option of
+`trainer/engine.py`, against the old per-call `train_steps` loop (fresh SGD
+optimizer every task).
+
+Tasks read a memory-mapped uint8 shard through `shard_batches`, as a
+trainer with `--data` does. The first round of every configuration is a
+warm-up (page cache, and compilation for `compile`) and is reported
+separately; samples/s is the best of the following rounds.
+
+Run from the repository root:
+    python -m benchmarks.bench_train --steps 400 --batch-size 64
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import torch
+
+from common.shards import ShardedDataset, write_dataset
+from trainer.engine import TrainingEngine
+from trainer.flatparams import FlatParameters
+from trainer.trainer import initial_model, shard_batches, train_steps
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--steps", type=int, default=400, help="batches per leased task")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--accumulate", type=int, default=4)
+    parser.add_argument("--prefetch", type=int, default=4)
+    parser.add_argument("--compile", action=argparse.BooleanOptionalAction, default=True,
+                        help="include torch.compile configurations (slow warm-up)")
+    args = parser.parse_args()
+
+    configs = [
+        ("train_steps (old)", None),
+        ("engine fp32", {}),
+        (f"accumulate {args.accumulate}", {"accumulate": args.accumulate}),
+        ("bf16 autocast", {"precision": "bf16"}),
+        (f"prefetch {args.prefetch}", {"prefetch": args.prefetch}),
+        (f"bf16 + accumulate + prefetch", {"precision": "bf16", "accumulate": args.accumulate,
+                                           "prefetch": args.prefetch}),
+    ]
+    if args.compile:
+        configs += [
+            ("compile", {"compile": True}),
+            ("compile + accumulate + prefetch", {"compile": True, "accumulate": args.accumulate,
+                                                 "prefetch": args.prefetch}),
+        ]
+
+    directory = tempfile.mkdtemp(prefix="train-bench-")
+    try:
+        rng = np.random.default_rng(0)
+        samples = args.steps * args.batch_size
+        write_dataset(directory,
+                      rng.integers(0, 256, size=(samples, 1, 28, 28), dtype=np.uint8),
+                      rng.integers(0, 10, size=samples, dtype=np.int64), 1)
+        dataset = ShardedDataset(directory)
+        task = {"shard_id": 0, "start": 0, "steps": args.steps}
+        print(f"torch {torch.__version__}, cores={os.cpu_count()}, threads={torch.get_num_threads()}, "
+              f"steps/task={args.steps}, batch={args.batch_size}")
+        baseline = None
+        for name, options in configs:
+            model = initial_model(0)
+            flat_params = FlatParameters(model)
+            if options is None:
+                train = lambda: train_steps(model, shard_batches(dataset, task, args.batch_size), args.steps)
+            else:
+                engine = TrainingEngine(model, **options)
+                train = lambda: engine.train(shard_batches(dataset, task, args.batch_size), args.steps)
+            timings = []
+            for _ in range(args.rounds + 1):
+                flat_params.snapshot()
+                started = time.perf_counter()
+                trained = train()
+                timings.append(time.perf_counter() - started)
+            rate = trained / min(timings[1:])
+            baseline = baseline or rate
+            print(f"{name:32s} {rate:9.0f} samples/s (x{rate / baseline:.2f})  "
+                  f"warm-up round {timings[0] * 1000:8.1f} ms  "
+                  f"|delta| {flat_params.delta().abs().sum().item():.3f}")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
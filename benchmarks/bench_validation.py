@@ -0,0 +1,77 @@
+"""
+Benchmark of update validation: candidate deltas judged one forward pass
+at a time versus stacked into vmap batches, for a growing number of
+updates N.
+
+Run from the repository root:
+    python -m benchmarks.bench_validation --updates 1,8,32,128 --holdout 512
+"""
+
+import argparse
+import time
+
+import torch
+import torch.nn as nn
+
+from trainer.trainer import initial_model
+from validator.engine import BatchedValidator
+
+
+def _sequential(model: nn.Module, base: torch.Tensor, deltas: torch.Tensor, x, y) -> list:
+    # старый подход: загрузить параметры и прогнать held-out батч для каждого кандидата
+    loss_fn = nn.CrossEntropyLoss()
+    params = list(model.parameters())
+    losses = []
+    with torch.no_grad():
+        for delta in deltas:
+            flat = base + delta
+            offset = 0
+            for p in params:
+                p.copy_(flat[offset:offset + p.numel()].view_as(p))
+                offset += p.numel()
+            losses.append(float(loss_fn(model(x), y)))
+    return losses
+
+
+def _best(fn, repeats: int) -> float:
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--updates", default="1,8,32,128", help="comma separated N values")
+    parser.add_argument("--holdout", type=int, default=512)
+    parser.add_argument("--max-batch", type=int, default=64)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=0, help="torch threads, 0 = default")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    model = initial_model(0)
+    x = torch.randn(args.holdout, 784)
+    y = torch.randint(0, 10, (args.holdout,))
+    engine = BatchedValidator(model, x, y, max_batch=args.max_batch)
+    base = engine.base.clone()
+    reference = initial_model(0)
+    print(f"params={engine.n_params} holdout={args.holdout} max_batch={args.max_batch}")
+
+    for n in (int(v) for v in args.updates.split(",")):
+        deltas = torch.randn(n, engine.n_params) * 1e-3
+        batched = engine.losses(deltas)
+        sequential = _sequential(reference, base, deltas, x, y)
+        err = float((batched - torch.tensor(sequential)).abs().max())
+
+        t_seq = _best(lambda: _sequential(reference, base, deltas, x, y), args.repeats)
+        t_batch = _best(lambda: engine.losses(deltas), args.repeats)
+        print(f"N={n:>5}: sequential {n / t_seq:9.1f} upd/s, batched {n / t_batch:9.1f} upd/s "
+              f"(x{t_seq / t_batch:.1f}), max |dloss| {err:.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Serialization of a full `/graph` payload: FastAPI's default path
+(`jsonable_encoder` + `json.dumps`), plain `json.dumps` of the same dicts,
+orjson, and the columnar binary format of `orchestrator/wire.py`.
+
+Each row covers the whole response build: reading the records out of the
+store, shaping them and encoding. Payload size is reported raw and gzipped
+(what a proxy with compression would send), plus the client-side decode
+time of each body in Python.
+
+Run from the repository root:
+    python -m benchmarks.bench_wire --nodes 10000 --edges 100000
+"""
+
+import argparse
+import gzip
+import json
+import random
+import time
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+
+from orchestrator.graph import GraphStore
+from orchestrator.wire import decode_graph, dumps, encode_graph
+
+LABELS = ("request_task", "assign_task", "submit_update", "validate", "aggregate", "report")
+STATUSES = ("active", "idle", "training", "submitted", "validating")
+
+
+def _build(n_nodes: int, n_edges: int, seed: int) -> GraphStore:
+    rng = random.Random(seed)
+    graph = GraphStore(edge_window=300)
+    ids = []
+    for i in range(n_nodes):
+        kind = "validator" if i % 5 == 0 else "trainer"
+        node = f"{kind}:0x{rng.getrandbits(160):040x}"
+        graph.ensure_node(node, f"{kind.title()} {node[-6:]}", kind)
+        graph.update_status(node, rng.choice(STATUSES))
+        ids.append(node)
+    while graph.edge_count() < n_edges:
+        source, target = rng.sample(ids, 2)
+        graph.record_edge(source, target, rng.choice(LABELS))
+    return graph
+
+
+def _starlette_json(content) -> bytes:
+    # то же, что делает JSONResponse.render
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode()
+
+
+def _median(fn, repeats: int) -> tuple:
+    timings, result = [], None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - started)
+    return sorted(timings)[len(timings) // 2], result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--nodes", type=int, default=10_000)
+    parser.add_argument("--edges", type=int, default=100_000)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    graph = _build(args.nodes, args.edges, args.seed)
+    meta = {"updated_at": "2024-01-01T00:00:00Z", "job_state": {"current_epoch": 3, "total_epochs": 10}}
+
+    def payload() -> dict:
+        version, full, nodes, edges, removed = graph.changes()
+        return {"version": version, "full": full, "nodes": nodes, "edges": edges, "removed": removed, **meta}
+
+    encoders = (
+        ("fastapi default", lambda: _starlette_json(jsonable_encoder(payload())),
+         json.loads),
+        ("json.dumps", lambda: _starlette_json(payload()), json.loads),
+        ("orjson", lambda: dumps(payload()), orjson.loads),
+        ("columns", lambda: encode_graph(*graph.change_rows(), edge_window=graph.edge_window, meta=meta),
+         decode_graph),
+    )
+    print(f"graph: {graph.node_count()} nodes, {graph.edge_count()} edges; median of {args.repeats}")
+    baseline = None
+    for name, encode, decode in encoders:
+        seconds, body = _median(encode, args.repeats)
+        decode_seconds, _ = _median(lambda: decode(body), args.repeats)
+        baseline = baseline or seconds
+        print(f"{name:16s} encode {seconds * 1000:8.1f} ms ({baseline / seconds:4.1f}x)  "
+              f"body {len(body) / 2**20:6.2f} MiB  gzip {len(gzip.compress(body, 6)) / 2**20:6.2f} MiB  "
+              f"decode {decode_seconds * 1000:7.1f} ms")
+
+    raw, _ = _median(graph.change_rows, args.repeats)
+    shaped, _ = _median(graph.changes, args.repeats)
+    print(f"of which reading the store: change_rows {raw * 1000:.1f} ms, changes (dicts, ISO times) "
+          f"{shaped * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    main()
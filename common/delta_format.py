@@ -0,0 +1,100 @@
+"""
+Wire format of compressed trainer deltas, shared by the trainer's encoders
+(trainer/compression.py), the orchestrator and the validator.
+
+A payload is a 16-byte header (magic, mode, number of parameters) followed
+by mode-specific sections:
+
+    fp16   float16 values
+    int8   uint32 segment count, pad, uint64 segment sizes, float32 scales, int8 values
+    topk   uint64 k, uint32 indices, float32 values
+
+Decoders write straight into a caller-provided float32 row, so a payload
+is expanded once, into the aggregation buffer.
+"""
+
+import struct
+from typing import Optional
+
+import numpy as np
+
+MAGIC = b"DLT1"
+HEADER = struct.Struct("<4sBxxxQ")
+MODES = {"none": 0, "fp16": 1, "int8": 2, "topk": 3}
+MODE_NAMES = {v: k for k, v in MODES.items()}
+CONTENT_TYPE = "application/x-parallel-delta"
+
+
+class DeltaFormatError(ValueError):
+    pass
+
+
+def pack_header(mode: str, n_params: int) -> bytes:
+    return HEADER.pack(MAGIC, MODES[mode], n_params)
+
+
+def as_payload(data) -> np.ndarray:
+    """uint8 view of a bytes-like payload (no copy)."""
+    return data if isinstance(data, np.ndarray) else np.frombuffer(data, dtype=np.uint8)
+
+
+def read_header(payload: np.ndarray) -> tuple:
+    """Return (mode name, n_params) of an encoded payload."""
+    payload = as_payload(payload)
+    if payload.size < HEADER.size:
+        raise DeltaFormatError("Payload shorter than header")
+    magic, mode, n_params = HEADER.unpack(payload[:HEADER.size].tobytes())
+    if magic != MAGIC:
+        raise DeltaFormatError("Bad delta magic")
+    if mode not in MODE_NAMES or mode == MODES["none"]:
+        raise DeltaFormatError(f"Unknown delta mode {mode}")
+    return MODE_NAMES[mode], n_params
+
+
+def _section(payload: np.ndarray, dtype, count: int, offset: int) -> np.ndarray:
+    dtype = np.dtype(dtype)
+    end = offset + count * dtype.itemsize
+    if end > payload.size:
+        raise DeltaFormatError("Truncated delta payload")
+    return payload[offset:end].view(dtype)
+
+
+def decode_into(payload: np.ndarray, out: np.ndarray) -> str:
+    """Decode a uint8 payload into the float32 row `out`; return the mode name."""
+    payload = as_payload(payload)
+    mode, n_params = read_header(payload)
+    if out.size != n_params:
+        raise DeltaFormatError(f"Delta has {n_params} params, expected {out.size}")
+    body = HEADER.size
+
+    if mode == "fp16":
+        np.copyto(out, _section(payload, np.float16, n_params, body))
+    elif mode == "int8":
+        (count,) = struct.unpack("<I", payload[body:body + 4].tobytes())
+        sizes = _section(payload, np.uint64, count, body + 8).astype(np.int64)
+        scales = _section(payload, np.float32, count, body + 8 + 8 * count)
+        if int(sizes.sum()) != n_params:
+            raise DeltaFormatError("int8 segments do not cover the delta")
+        q = _section(payload, np.int8, n_params, body + 8 + 12 * count)
+        offset = 0
+        for size, scale in zip(sizes, scales):
+            np.multiply(q[offset:offset + size], scale, out=out[offset:offset + size], casting="unsafe")
+            offset += size
+    else:
+        (k,) = struct.unpack("<Q", payload[body:body + 8].tobytes())
+        idx = _section(payload, np.uint32, k, body + 8)
+        vals = _section(payload, np.float32, k, body + 8 + 4 * k)
+        if k and int(idx.max()) >= n_params:
+            raise DeltaFormatError("topk index out of range")
+        out.fill(0)
+        out[idx] = vals
+    return mode
+
+
+def decode(payload: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+    payload = as_payload(payload)
+    _, n_params = read_header(payload)
+    if out is None:
+        out = np.empty(n_params, dtype=np.float32)
+    decode_into(payload, out)
+    return out
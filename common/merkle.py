@@ -0,0 +1,164 @@
+"""
+Merkle tree over fixed-size chunks of a delta payload.
+
+The update hash committed on chain is the root of a binary SHA-256 tree
+whose leaves are consecutive `chunk_size` slices of the payload as sent.
+Leaves can be hashed in parallel, a single chunk can be checked against
+the root with an inclusion proof, and an upload can be resumed chunk by
+chunk because every chunk is verifiable on its own.
+
+Leaves and inner nodes are domain-separated (0x00 / 0x01 prefix). A node
+without a sibling on its level is promoted unchanged to the next level.
+"""
+
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Optional
+
+DEFAULT_CHUNK_SIZE = 1 << 20
+MIN_CHUNK_SIZE = 4 << 10
+MAX_CHUNK_SIZE = 64 << 20
+
+_LEAF = b"\x00"
+_NODE = b"\x01"
+
+_pool: Optional[ThreadPoolExecutor] = None
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(max_workers=os.cpu_count() or 4, thread_name_prefix="merkle")
+    return _pool
+
+
+def leaf_hash(chunk) -> bytes:
+    h = hashlib.sha256(_LEAF)
+    # hashlib отпускает GIL на буферах > 2 КБ, поэтому листья считаются параллельно
+    h.update(chunk)
+    return h.digest()
+
+
+def node_hash(left: bytes, right: bytes) -> bytes:
+    return hashlib.sha256(_NODE + left + right).digest()
+
+
+def build_levels(leaves: list) -> list:
+    """All tree levels, leaves first, root level last."""
+    if not leaves:
+        raise ValueError("Merkle tree needs at least one leaf")
+    levels = [list(leaves)]
+    while len(levels[-1]) > 1:
+        level = levels[-1]
+        parent = [node_hash(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            parent.append(level[-1])
+        levels.append(parent)
+    return levels
+
+
+def merkle_root(leaves: list) -> bytes:
+    return build_levels(leaves)[-1][0]
+
+
+def merkle_proof(levels: list, index: int) -> list:
+    """Sibling hashes (bottom-up) proving leaf `index`; promoted levels are skipped."""
+    proof = []
+    for level in levels[:-1]:
+        sibling = index ^ 1
+        if sibling < len(level):
+            proof.append(level[sibling])
+        index //= 2
+    return proof
+
+
+def verify_proof(chunk, index: int, n_leaves: int, proof: list, root: bytes) -> bool:
+    node = leaf_hash(chunk)
+    count = n_leaves
+    steps = iter(proof)
+    while count > 1:
+        sibling = index ^ 1
+        if sibling < count:
+            try:
+                other = next(steps)
+            except StopIteration:
+                return False
+            node = node_hash(other, node) if index & 1 else node_hash(node, other)
+        index //= 2
+        count = (count + 1) // 2
+    return next(steps, None) is None and node == root
+
+
+def iter_chunks(parts: Iterable, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """Yield `chunk_size` slices of the concatenated parts.
+
+    Chunks inside one part are zero-copy memoryviews; only a chunk that
+    straddles a part boundary is assembled into a new bytes object.
+    """
+    pending = []
+    pending_size = 0
+    for part in parts:
+        buf = memoryview(part).cast("B")
+        pos = 0
+        if pending_size:
+            take = min(chunk_size - pending_size, len(buf))
+            pending.append(buf[:take])
+            pending_size += take
+            pos = take
+            if pending_size < chunk_size:
+                continue
+            yield b"".join(pending)
+            pending, pending_size = [], 0
+        while len(buf) - pos >= chunk_size:
+            yield buf[pos:pos + chunk_size]
+            pos += chunk_size
+        if pos < len(buf):
+            pending.append(buf[pos:])
+            pending_size = len(buf) - pos
+    if pending_size:
+        yield b"".join(pending)
+
+
+def hash_leaves(parts: Iterable, chunk_size: int = DEFAULT_CHUNK_SIZE, workers: int = 0) -> list:
+    """Leaf hashes of the payload; `workers` > 1 (or 0 = shared pool) hashes in parallel."""
+    chunks = list(iter_chunks(parts, chunk_size))
+    if workers == 1 or len(chunks) < 2:
+        return [leaf_hash(c) for c in chunks]
+    pool = _executor() if workers == 0 else ThreadPoolExecutor(max_workers=workers)
+    try:
+        return list(pool.map(leaf_hash, chunks))
+    finally:
+        if workers != 0:
+            pool.shutdown()
+
+
+class MerkleStream:
+    """Computes leaf hashes incrementally while a payload streams in."""
+
+    def __init__(self, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.leaves: list = []
+        self._leaf = None
+        self._filled = 0
+
+    def update(self, data):
+        buf = memoryview(data).cast("B")
+        pos = 0
+        while pos < len(buf):
+            if self._leaf is None:
+                self._leaf = hashlib.sha256(_LEAF)
+                self._filled = 0
+            take = min(self.chunk_size - self._filled, len(buf) - pos)
+            self._leaf.update(buf[pos:pos + take])
+            self._filled += take
+            pos += take
+            if self._filled == self.chunk_size:
+                self.leaves.append(self._leaf.digest())
+                self._leaf = None
+
+    def finish(self) -> bytes:
+        if self._leaf is not None:
+            self.leaves.append(self._leaf.digest())
+            self._leaf = None
+        return merkle_root(self.leaves)
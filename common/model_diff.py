@@ -0,0 +1,111 @@
+"""
+Diffs between versions of the flat float32 global model.
+
+A diff is the XOR of the two versions' bit patterns, split into four byte
+planes (all low bytes, then all second bytes, ...) and deflated. Unchanged
+parameters XOR to zero and sign/exponent bytes of small updates mostly do
+too, so the payload grows with how much of the model changed, not with its
+size. Applying a diff is exact: the result is bit-identical to the target.
+
+    header (32 bytes) | zlib(byte planes of base XOR target)
+
+`ModelReplica` keeps a local copy in sync with the orchestrator's `/model`
+endpoint: ETag revalidation, diff download when the held version is still
+retained, full download otherwise.
+"""
+
+import struct
+import zlib
+from typing import Optional
+
+import numpy as np
+
+MAGIC = b"MDF1"
+# magic, codec, base version, target version, n_params
+HEADER = struct.Struct("<4sBxxxQQQ")
+CODEC_XOR_ZLIB = 1
+CONTENT_TYPE = "application/x-parallel-model-diff"
+
+
+class ModelDiffError(ValueError):
+    pass
+
+
+def encode_diff(base: np.ndarray, target: np.ndarray, base_version: int, target_version: int,
+                level: int = 1) -> bytes:
+    if base.size != target.size:
+        raise ModelDiffError(f"Base has {base.size} params, target {target.size}")
+    xor = np.bitwise_xor(base.view(np.uint32), target.view(np.uint32))
+    # байтовые плоскости: нули и повторяющиеся старшие байты сжимаются длинными сериями
+    planes = xor.view(np.uint8).reshape(-1, 4).T.tobytes()
+    header = HEADER.pack(MAGIC, CODEC_XOR_ZLIB, base_version, target_version, target.size)
+    return header + zlib.compress(planes, level)
+
+
+def read_header(payload) -> tuple:
+    """(base version, target version, n_params) of a diff payload."""
+    if len(payload) < HEADER.size:
+        raise ModelDiffError("Truncated model diff")
+    magic, codec, base_version, target_version, n_params = HEADER.unpack_from(payload)
+    if magic != MAGIC or codec != CODEC_XOR_ZLIB:
+        raise ModelDiffError(f"Not a model diff (magic {magic!r}, codec {codec})")
+    return base_version, target_version, n_params
+
+
+def apply_diff(base: np.ndarray, payload) -> np.ndarray:
+    """Return the target version reconstructed from `base` and a diff payload."""
+    _, _, n_params = read_header(payload)
+    if base.size != n_params:
+        raise ModelDiffError(f"Diff is for {n_params} params, base has {base.size}")
+    try:
+        planes = zlib.decompress(memoryview(payload)[HEADER.size:])
+    except zlib.error as e:
+        raise ModelDiffError(f"Corrupt model diff: {e}") from None
+    if len(planes) != 4 * n_params:
+        raise ModelDiffError(f"Diff body has {len(planes)} bytes, expected {4 * n_params}")
+    xor = np.frombuffer(planes, dtype=np.uint8).reshape(4, n_params).T.copy().view(np.uint32).reshape(-1)
+    return np.bitwise_xor(base.view(np.uint32), xor).view(np.float32)
+
+
+class ModelReplica:
+    """Local copy of the global model, refreshed with as few bytes as possible."""
+
+    def __init__(self):
+        self.version = 0
+        self.etag: Optional[str] = None
+        self.flat: Optional[np.ndarray] = None
+        self.last_bytes = 0
+
+    def sync(self, session, registry: str, timeout: float = 30) -> bool:
+        """Bring the copy up to date; True if it changed.
+
+        The held ETag goes out as `If-None-Match`: an unchanged model costs a
+        304, a retained older version gets a diff, anything else a full copy.
+        A diff that does not apply is dropped in favour of a full download.
+        """
+        try:
+            return self._fetch(session, registry, timeout, revalidate=self.flat is not None)
+        except ModelDiffError:
+            return self._fetch(session, registry, timeout, revalidate=False)
+
+    def _fetch(self, session, registry: str, timeout: float, revalidate: bool) -> bool:
+        headers = {"Accept": f"{CONTENT_TYPE}, application/octet-stream"}
+        if revalidate and self.etag is not None:
+            headers["If-None-Match"] = self.etag
+        resp = session.get(f"{registry}/model", headers=headers, timeout=timeout)
+        self.last_bytes = 0
+        if resp.status_code in (304, 404):
+            return False
+        resp.raise_for_status()
+        body = resp.content
+        if resp.headers.get("content-type", "").startswith(CONTENT_TYPE):
+            base_version, _, _ = read_header(body)
+            if self.flat is None or base_version != self.version:
+                raise ModelDiffError(f"Diff from v{base_version}, replica holds v{self.version}")
+            self.flat = apply_diff(self.flat, body)
+        else:
+            self.flat = np.frombuffer(body, dtype=np.float32).copy()
+        self.version = int(resp.headers.get("X-Model-Version", 0))
+        self.etag = resp.headers.get("ETag")
+        self.last_bytes = len(body)
+        return True
@@ -0,0 +1,188 @@
+"""
+Sharded on-disk dataset: fixed-stride binary records opened with `numpy.memmap`.
+
+A dataset is a directory with `index.json` (shard list, record count,
+dtypes and sample shape) and one file per shard:
+
+    header (64 bytes) | x records (n * x_stride) | y records (n * y_stride)
+
+Samples and labels are stored as two contiguous fixed-stride sections, so
+a batch of consecutive records is a plain slice of the mapping: no parsing,
+no copy. Shards are opened lazily and read-only through the page cache, so
+a trainer only touches the shard it was assigned and several trainer
+processes on one host share the same cached pages.
+"""
+
+import argparse
+import json
+import mmap
+import os
+import struct
+from typing import Optional
+
+import numpy as np
+
+MAGIC = b"SHD1"
+VERSION = 1
+# magic, version, x dtype, y dtype, records, x stride, y stride, ndim, shape[4]
+HEADER = struct.Struct("<4sHBBQIIB3x4I")
+HEADER_SIZE = 64
+INDEX_FILE = "index.json"
+
+DTYPES = {0: np.uint8, 1: np.float16, 2: np.float32, 3: np.int64, 4: np.int32, 5: np.int16}
+DTYPE_CODES = {np.dtype(v): k for k, v in DTYPES.items()}
+
+
+class ShardFormatError(ValueError):
+    pass
+
+
+def shard_name(i: int) -> str:
+    return f"shard-{i:05d}.bin"
+
+
+def write_shard(path: str, x: np.ndarray, y: np.ndarray):
+    """Write samples `x` [n, ...] and labels `y` [n] as one shard file."""
+    if x.shape[0] != y.shape[0]:
+        raise ShardFormatError(f"{x.shape[0]} samples but {y.shape[0]} labels")
+    sample_shape = x.shape[1:]
+    if len(sample_shape) > 4:
+        raise ShardFormatError(f"Sample shape {sample_shape} has more than 4 dims")
+    x = np.ascontiguousarray(x)
+    y = np.ascontiguousarray(y)
+    try:
+        x_code, y_code = DTYPE_CODES[x.dtype], DTYPE_CODES[y.dtype]
+    except KeyError as e:
+        raise ShardFormatError(f"Unsupported dtype {e}") from None
+    x_stride = x[0].nbytes if len(x) else int(np.prod(sample_shape)) * x.dtype.itemsize
+    dims = list(sample_shape) + [0] * (4 - len(sample_shape))
+    header = HEADER.pack(MAGIC, VERSION, x_code, y_code, x.shape[0], x_stride, y.dtype.itemsize,
+                         len(sample_shape), *dims)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(header.ljust(HEADER_SIZE, b"\0"))
+        f.write(memoryview(x).cast("B"))
+        f.write(memoryview(y).cast("B"))
+    os.replace(tmp, path)
+
+
+def write_dataset(directory: str, x: np.ndarray, y: np.ndarray, n_shards: int) -> dict:
+    """Split (x, y) into `n_shards` contiguous shards and write the index."""
+    os.makedirs(directory, exist_ok=True)
+    bounds = np.linspace(0, len(x), n_shards + 1, dtype=np.int64)
+    shards = []
+    for i in range(n_shards):
+        lo, hi = int(bounds[i]), int(bounds[i + 1])
+        write_shard(os.path.join(directory, shard_name(i)), x[lo:hi], y[lo:hi])
+        shards.append({"file": shard_name(i), "records": hi - lo})
+    index = {
+        "version": VERSION,
+        "records": int(len(x)),
+        "sample_shape": list(x.shape[1:]),
+        "x_dtype": str(x.dtype),
+        "y_dtype": str(y.dtype),
+        "shards": shards,
+    }
+    with open(os.path.join(directory, INDEX_FILE), "w") as f:
+        json.dump(index, f, indent=2)
+    return index
+
+
+class Shard:
+    """Read-only mapping of one shard file; `x` and `y` are zero-copy views."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            raw = f.read(HEADER.size)
+        if len(raw) < HEADER.size:
+            raise ShardFormatError(f"{path}: truncated header")
+        magic, version, x_code, y_code, n, x_stride, y_stride, ndim, *dims = HEADER.unpack(raw)
+        if magic != MAGIC or version != VERSION:
+            raise ShardFormatError(f"{path}: not a shard file (magic {magic!r}, version {version})")
+        self.records = n
+        self.sample_shape = tuple(dims[:ndim])
+        x_dtype, y_dtype = np.dtype(DTYPES[x_code]), np.dtype(DTYPES[y_code])
+        if x_stride != int(np.prod(self.sample_shape)) * x_dtype.itemsize or y_stride != y_dtype.itemsize:
+            raise ShardFormatError(f"{path}: stride does not match dtype and shape")
+        expected = HEADER_SIZE + n * (x_stride + y_stride)
+        if os.path.getsize(path) < expected:
+            raise ShardFormatError(f"{path}: {os.path.getsize(path)} bytes, expected {expected}")
+        # mode="c": страницы разделяются через page cache, запись (которой нет) не попадает в файл
+        self.x = np.memmap(path, dtype=x_dtype, mode="c", offset=HEADER_SIZE, shape=(n, *self.sample_shape))
+        self.y = np.memmap(path, dtype=y_dtype, mode="c", offset=HEADER_SIZE + n * x_stride, shape=(n,))
+        self._x_stride = x_stride
+
+    def __len__(self) -> int:
+        return self.records
+
+    def willneed(self, start: int, stop: int):
+        """Ask the kernel to read records [start, stop) ahead (no-op where madvise is missing)."""
+        mm = getattr(self.x, "_mmap", None)
+        if mm is None or not hasattr(mm, "madvise"):
+            return
+        page = mmap.PAGESIZE
+        lo = (HEADER_SIZE + start * self._x_stride) // page * page
+        hi = HEADER_SIZE + stop * self._x_stride
+        try:
+            mm.madvise(mmap.MADV_WILLNEED, lo, max(0, min(hi, len(mm)) - lo))
+        except (OSError, ValueError):
+            pass
+
+
+class ShardedDataset:
+    """Dataset directory; shards are mapped on first use only."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        with open(os.path.join(directory, INDEX_FILE)) as f:
+            self.index = json.load(f)
+        self.n_shards = len(self.index["shards"])
+        self._open: dict = {}
+
+    def shard(self, i: int) -> Shard:
+        i %= self.n_shards
+        shard = self._open.get(i)
+        if shard is None:
+            shard = self._open[i] = Shard(os.path.join(self.directory, self.index["shards"][i]["file"]))
+        return shard
+
+    def batches(self, shard_id: int, start: int, steps: int, batch_size: int,
+                limit: Optional[int] = None):
+        """Yield (x, y) numpy views for batches start..start+steps of a shard.
+
+        Batch `b` covers records [b * batch_size, (b + 1) * batch_size) and
+        wraps around when the shard has fewer batches than requested.
+        """
+        shard = self.shard(shard_id)
+        n_batches = max(1, len(shard) // batch_size)
+        for b in range(start, start + steps):
+            lo = (b % n_batches) * batch_size
+            hi = min(lo + batch_size, len(shard))
+            if b + 1 < start + steps:
+                nxt = ((b + 1) % n_batches) * batch_size
+                shard.willneed(nxt, nxt + batch_size)
+            yield shard.x[lo:hi], shard.y[lo:hi]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic MNIST-shaped sharded dataset")
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--samples", type=int, default=60_000)
+    parser.add_argument("--shards", type=int, default=16)
+    parser.add_argument("--dtype", choices=["uint8", "float32"], default="uint8")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    if args.dtype == "uint8":
+        x = rng.integers(0, 256, size=(args.samples, 1, 28, 28), dtype=np.uint8)
+    else:
+        x = rng.standard_normal((args.samples, 1, 28, 28), dtype=np.float32)
+    y = rng.integers(0, 10, size=args.samples, dtype=np.int64)
+    index = write_dataset(args.out, x, y, args.shards)
+    print(f"Wrote {index['records']} records in {args.shards} shards to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
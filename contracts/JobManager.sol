@@ -18,20 +18,28 @@ contract JobManager {
     mapping(address => bool) public validators;
 
     struct Update {
-        address trainer;
-        bytes32 hash;     // хэш delta-обновления
+        address trainer;  // trainer + два флага упакованы в один слот
         bool validated;
         bool paid;
+        bytes32 hash;     // хэш delta-обновления
     }
-    // jobId => список обновлений
-    mapping(uint256 => Update[]) public jobUpdates;
+    // jobId => список обновлений; снаружи читается через jobUpdates(jobId, i)
+    mapping(uint256 => Update[]) private _jobUpdates;
+
+    // jobId => оператор (оркестратор), которому владелец разрешил пакетную отправку
+    mapping(uint256 => mapping(address => bool)) public jobOperators;
+
+    // Начисленные, но ещё не выведенные награды (pull-выплаты)
+    mapping(address => uint256) public pendingWithdrawals;
 
     event JobCreated(uint256 indexed jobId, address indexed owner, uint256 deposit);
     event TrainerRegistered(address indexed trainer);
     event ValidatorRegistered(address indexed validator);
-    event UpdateSubmitted(uint256 indexed jobId, address indexed trainer, bytes32 updateHash);
-    event UpdateValidated(uint256 indexed jobId, address indexed trainer, bytes32 updateHash, bool valid);
+    event UpdateSubmitted(uint256 indexed jobId, address indexed trainer, bytes32 updateHash, uint256 index);
+    event UpdateValidated(uint256 indexed jobId, address indexed trainer, bytes32 updateHash, uint256 index, bool valid);
     event Paid(uint256 indexed jobId, address indexed trainer, uint256 amount);
+    event OperatorSet(uint256 indexed jobId, address indexed operator, bool allowed);
+    event Withdrawn(address indexed account, uint256 amount);
 
     // Создание задания: владелец отправляет депозит и задаёт размер награды
     function createJob(uint256 baseReward) external payable returns (uint256) {
@@ -61,43 +69,111 @@ contract JobManager {
         emit ValidatorRegistered(msg.sender);
     }
 
+    // Владелец задания разрешает (или запрещает) оператору пакетные вызовы
+    function setOperator(uint256 jobId, address operator, bool allowed) external {
+        require(msg.sender == jobs[jobId].owner, "Only job owner");
+        jobOperators[jobId][operator] = allowed;
+        emit OperatorSet(jobId, operator, allowed);
+    }
+
     // Отправка хэша обновления тренером
     function submitUpdate(uint256 jobId, bytes32 updateHash) external {
         require(trainers[msg.sender], "Not registered trainer");
-        Job storage job = jobs[jobId];
-        require(job.active, "Job not active");
-        jobUpdates[jobId].push(Update({
-            trainer: msg.sender,
-            hash: updateHash,
+        require(jobs[jobId].active, "Job not active");
+        _pushUpdate(jobId, msg.sender, updateHash);
+    }
+
+    // Пакетная отправка: тренер публикует несколько своих хэшей одной транзакцией
+    function submitUpdates(uint256 jobId, bytes32[] calldata updateHashes) external {
+        require(trainers[msg.sender], "Not registered trainer");
+        require(jobs[jobId].active, "Job not active");
+        for (uint256 i = 0; i < updateHashes.length; i++) {
+            _pushUpdate(jobId, msg.sender, updateHashes[i]);
+        }
+    }
+
+    // Пакетная отправка оператором задания от имени нескольких тренеров
+    function submitUpdatesFor(uint256 jobId, address[] calldata trainerList, bytes32[] calldata updateHashes) external {
+        require(jobOperators[jobId][msg.sender], "Not job operator");
+        require(trainerList.length == updateHashes.length, "Length mismatch");
+        require(jobs[jobId].active, "Job not active");
+        for (uint256 i = 0; i < updateHashes.length; i++) {
+            require(trainers[trainerList[i]], "Not registered trainer");
+            _pushUpdate(jobId, trainerList[i], updateHashes[i]);
+        }
+    }
+
+    // index в событии — позиция апдейта в jobUpdates[jobId], по ней идёт валидация
+    function _pushUpdate(uint256 jobId, address trainer, bytes32 updateHash) internal {
+        uint256 index = _jobUpdates[jobId].length;
+        _jobUpdates[jobId].push(Update({
+            trainer: trainer,
             validated: false,
-            paid: false
+            paid: false,
+            hash: updateHash
         }));
-        emit UpdateSubmitted(jobId, msg.sender, updateHash);
+        emit UpdateSubmitted(jobId, trainer, updateHash, index);
     }
 
     // Валидация обновления валидатором; index – индекс апдейта в списке jobUpdates[jobId]
     function validateUpdate(uint256 jobId, uint256 index, bool valid) external {
         require(validators[msg.sender], "Not registered validator");
-        Update storage update = jobUpdates[jobId][index];
-        require(!update.validated, "Already validated");
-        update.validated = true;
-        emit UpdateValidated(jobId, update.trainer, update.hash, valid);
-        if (valid) {
-            _payout(jobId, index);
+        Job storage job = jobs[jobId];
+        uint256 reward = _validate(jobId, job.baseReward, index, valid);
+        if (reward > 0) {
+            require(job.deposit >= reward, "Insufficient deposit");
+            job.deposit -= reward;
         }
     }
 
-    // Внутренняя функция выплаты награды
-    function _payout(uint256 jobId, uint256 index) internal {
-        Update storage update = jobUpdates[jobId][index];
-        require(update.validated, "Not validated");
-        require(!update.paid, "Already paid");
+    // Пакетная валидация: валидатор или оператор задания; депозит списывается один раз
+    function validateUpdates(uint256 jobId, uint256[] calldata indices, bool[] calldata valid) external {
+        require(validators[msg.sender] || jobOperators[jobId][msg.sender], "Not validator or operator");
+        require(indices.length == valid.length, "Length mismatch");
         Job storage job = jobs[jobId];
-        require(job.deposit >= job.baseReward, "Insufficient deposit");
+        uint256 baseReward = job.baseReward;
+        uint256 total = 0;
+        for (uint256 i = 0; i < indices.length; i++) {
+            total += _validate(jobId, baseReward, indices[i], valid[i]);
+        }
+        if (total > 0) {
+            require(job.deposit >= total, "Insufficient deposit");
+            job.deposit -= total;
+        }
+    }
+
+    // Отмечает обновление и начисляет награду; возвращает сумму к списанию с депозита
+    function _validate(uint256 jobId, uint256 baseReward, uint256 index, bool valid) internal returns (uint256) {
+        Update storage update = _jobUpdates[jobId][index];
+        require(!update.validated, "Already validated");
+        update.validated = true;
+        emit UpdateValidated(jobId, update.trainer, update.hash, index, valid);
+        if (!valid) {
+            return 0;
+        }
         update.paid = true;
-        job.deposit -= job.baseReward;
-        payable(update.trainer).transfer(job.baseReward);
-        emit Paid(jobId, update.trainer, job.baseReward);
+        pendingWithdrawals[update.trainer] += baseReward;
+        emit Paid(jobId, update.trainer, baseReward);
+        return baseReward;
+    }
+
+    // Вывод начисленных наград (pull-выплата вместо transfer на каждое обновление)
+    function withdraw() external {
+        uint256 amount = pendingWithdrawals[msg.sender];
+        require(amount > 0, "Nothing to withdraw");
+        pendingWithdrawals[msg.sender] = 0;
+        payable(msg.sender).transfer(amount);
+        emit Withdrawn(msg.sender, amount);
+    }
+
+    // Геттер с прежним порядком полей: упаковка хранилища не меняет позиционный ABI
+    function jobUpdates(uint256 jobId, uint256 index) external view returns (address trainer, bytes32 hash, bool validated, bool paid) {
+        Update storage update = _jobUpdates[jobId][index];
+        return (update.trainer, update.hash, update.validated, update.paid);
+    }
+
+    function jobUpdatesCount(uint256 jobId) external view returns (uint256) {
+        return _jobUpdates[jobId].length;
     }
 
     // Вывод неиспользованных средств владельцем
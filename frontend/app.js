@@ -114,14 +114,104 @@ const graphApiBase = window.location.hostname
   ? `http://${window.location.hostname}:8000`
   : "http://localhost:8000";
 
+// Колоночный формат /graph (orchestrator/wire.py): таблица строк + параллельные
+// типизированные массивы; секции выровнены на 8 байт, данные little-endian
+const GRAPH_COLUMNS_TYPE = "application/x-parallel-graph";
+const graphAccept = window.TextDecoder
+  ? `${GRAPH_COLUMNS_TYPE}, application/json;q=0.5`
+  : "application/json";
+
+const decodeGraphColumns = (buffer) => {
+  const view = new DataView(buffer);
+  const magic = String.fromCharCode(...new Uint8Array(buffer, 0, 4));
+  if (magic !== "GRF1" || view.getUint8(4) !== 1) throw new Error("Unknown graph format");
+  const full = (view.getUint8(5) & 1) === 1;
+  const version = Number(view.getBigUint64(8, true));
+  const edgeWindow = view.getFloat64(16, true);
+  const [metaLen, nStrings, blobLen, nNodes, nEdges, nGoneNodes, nGoneEdges] =
+    Array.from({ length: 7 }, (_, i) => view.getUint32(24 + i * 4, true));
+
+  let pos = 56;
+  const take = (size) => {
+    const start = pos;
+    pos += size + ((8 - (size % 8)) % 8);
+    return start;
+  };
+  const utf8 = new TextDecoder();
+  const meta = JSON.parse(utf8.decode(new Uint8Array(buffer, take(metaLen), metaLen)));
+  const offsets = new Uint32Array(buffer, take(4 * (nStrings + 1)), nStrings + 1);
+  const blob = new Uint8Array(buffer, take(blobLen), blobLen);
+  const strings = new Array(nStrings);
+  for (let i = 0; i < nStrings; i++) strings[i] = utf8.decode(blob.subarray(offsets[i], offsets[i + 1]));
+
+  const nodeStart = take(28 * nNodes);
+  const nodeSeen = new Float64Array(buffer, nodeStart, nNodes);
+  const nodeCols = new Uint32Array(buffer, nodeStart + 8 * nNodes, 5 * nNodes);
+  const nodes = new Array(nNodes);
+  for (let i = 0; i < nNodes; i++) {
+    const node = {
+      id: strings[nodeCols[i]],
+      label: strings[nodeCols[nNodes + i]],
+      type: strings[nodeCols[2 * nNodes + i]],
+      status: strings[nodeCols[3 * nNodes + i]],
+      last_seen: nodeSeen[i],
+    };
+    if (nodeCols[4 * nNodes + i]) node.members = nodeCols[4 * nNodes + i];
+    nodes[i] = node;
+  }
+
+  const edgeStart = take(24 * nEdges);
+  const edgeSeen = new Float64Array(buffer, edgeStart, nEdges);
+  const edgeCols = new Uint32Array(buffer, edgeStart + 8 * nEdges, 4 * nEdges);
+  const edges = new Array(nEdges);
+  for (let i = 0; i < nEdges; i++) {
+    const source = strings[edgeCols[i]];
+    const target = strings[edgeCols[nEdges + i]];
+    const label = strings[edgeCols[2 * nEdges + i]];
+    const count = edgeCols[3 * nEdges + i];
+    const edge = { id: `${source}|${target}|${label}`, source, target, label, count, last_seen: edgeSeen[i] };
+    if (edgeWindow) edge.rate = count / edgeWindow;
+    edges[i] = edge;
+  }
+
+  const goneNodes = new Uint32Array(buffer, take(4 * nGoneNodes), nGoneNodes);
+  const goneEdges = new Uint32Array(buffer, take(12 * nGoneEdges), 3 * nGoneEdges);
+  const removedEdges = new Array(nGoneEdges);
+  for (let i = 0; i < nGoneEdges; i++) {
+    removedEdges[i] = `${strings[goneEdges[i]]}|${strings[goneEdges[nGoneEdges + i]]}|${strings[goneEdges[2 * nGoneEdges + i]]}`;
+  }
+
+  return {
+    version,
+    full,
+    nodes,
+    edges,
+    removed: { nodes: Array.from(goneNodes, (i) => strings[i]), edges: removedEdges },
+    updated_at: meta.updated_at,
+    job_state: meta.job_state,
+  };
+};
+
+// Запрашиваем только изменения с последней известной версии; 304 — граф не менялся
 const graphFetch = async () => {
   const controller = new AbortController();
   const timeoutId = setTimeout(() => controller.abort(), 5000);
   try {
-    const res = await fetch(`${graphApiBase}/graph`, { signal: controller.signal });
-    clearTimeout(timeoutId);
+    const query = graphState.version !== null ? `?since=${graphState.version}` : "";
+    const headers = { Accept: graphAccept };
+    if (graphState.etag) headers["If-None-Match"] = graphState.etag;
+    const res = await fetch(`${graphApiBase}/graph${query}`, { signal: controller.signal, headers });
+    if (res.status === 304) {
+      clearTimeout(timeoutId);
+      return null;
+    }
     if (!res.ok) throw new Error("Graph fetch failed");
-    return res.json();
+    graphState.etag = res.headers.get("ETag");
+    const payload = (res.headers.get("Content-Type") || "").startsWith(GRAPH_COLUMNS_TYPE)
+      ? decodeGraphColumns(await res.arrayBuffer())
+      : await res.json();
+    clearTimeout(timeoutId);
+    return payload;
   } catch (e) {
     clearTimeout(timeoutId);
     throw e;
@@ -133,6 +223,9 @@ const graphState = {
   edges: [],
   width: 0,
   height: 0,
+  edgeMap: new Map(),
+  version: null,
+  etag: null,
   jobState: null,
   mouseX: 0,
   mouseY: 0,
@@ -190,56 +283,100 @@ const statusColors = {
   submitted: "#a78bfa",
   validating: "#fbbf24",
   requesting: "#6366f1",
+  aggregate: "#94a3b8",
+};
+
+// Push-канал: пока поток SSE открыт, опрос /graph не нужен
+let graphStreamActive = false;
+
+const setGraphStatus = (connected) => {
+  if (!graphStatus) return;
+  graphStatus.textContent = connected ? "connected" : "disconnected";
+  if (connected) {
+    graphStatus.style.color = currentTheme === 'dark' ? "#22d3ee" : "#0d9488";
+  } else {
+    graphStatus.style.color = currentTheme === 'dark' ? "#f472b6" : "#ec4899";
+  }
+};
+
+const connectGraphStream = () => {
+  if (!window.EventSource) return;
+  const source = new EventSource(`${graphApiBase}/events`);
+  source.addEventListener("graph", (event) => {
+    graphStreamActive = true;
+    applyGraphPayload(JSON.parse(event.data));
+    setGraphStatus(true);
+  });
+  source.onerror = () => {
+    // EventSource переподключается сам; до этого работает обычный опрос
+    graphStreamActive = false;
+  };
 };
 
 const updateGraphData = async () => {
-  if (!graphCanvas) return;
+  if (!graphCanvas || graphStreamActive) return;
   try {
     const payload = await graphFetch();
-    const incomingNodes = payload.nodes || [];
-    const incomingEdges = payload.edges || [];
-    graphState.jobState = payload.job_state || null;
-
-    incomingNodes.forEach((node) => {
-      if (!graphState.nodes.has(node.id)) {
-        const angle = Math.random() * Math.PI * 2;
-        const radius = 100 + Math.random() * 100;
-        graphState.nodes.set(node.id, {
-          ...node,
-          x: graphState.width / 2 + Math.cos(angle) * radius,
-          y: graphState.height / 2 + Math.sin(angle) * radius,
-          vx: 0,
-          vy: 0,
-          targetX: null,
-          targetY: null,
-          pulsePhase: Math.random() * Math.PI * 2,
-        });
-      } else {
-        const existing = graphState.nodes.get(node.id);
-        Object.assign(existing, node);
-      }
-    });
-
-    graphState.edges = incomingEdges;
-
-    if (graphNodesCount) {
-      animateValue(graphNodesCount, incomingNodes.length.toString());
-    }
-    if (graphEdgesCount) {
-      animateValue(graphEdgesCount, incomingEdges.length.toString());
+    if (payload) {
+      applyGraphPayload(payload);
     }
-    if (graphStatus) {
-      graphStatus.textContent = "connected";
-      graphStatus.style.color = currentTheme === 'dark' ? "#22d3ee" : "#0d9488";
+    setGraphStatus(true);
+  } catch (error) {
+    setGraphStatus(false);
+  }
+};
+
+const applyGraphPayload = (payload) => {
+  const incomingNodes = payload.nodes || [];
+  const incomingEdges = payload.edges || [];
+  graphState.jobState = payload.job_state || null;
+  graphState.version = payload.version ?? null;
+
+  if (payload.full) {
+    // полный снимок (первый запрос или сброс графа) заменяет локальное состояние
+    const ids = new Set(incomingNodes.map((node) => node.id));
+    for (const id of graphState.nodes.keys()) {
+      if (!ids.has(id)) graphState.nodes.delete(id);
     }
+    graphState.edgeMap.clear();
+  }
 
-    updateJobStateDisplay();
-  } catch (error) {
-    if (graphStatus) {
-      graphStatus.textContent = "disconnected";
-      graphStatus.style.color = currentTheme === 'dark' ? "#f472b6" : "#ec4899";
+  incomingNodes.forEach((node) => {
+    if (!graphState.nodes.has(node.id)) {
+      const angle = Math.random() * Math.PI * 2;
+      const radius = 100 + Math.random() * 100;
+      graphState.nodes.set(node.id, {
+        ...node,
+        x: graphState.width / 2 + Math.cos(angle) * radius,
+        y: graphState.height / 2 + Math.sin(angle) * radius,
+        vx: 0,
+        vy: 0,
+        targetX: null,
+        targetY: null,
+        pulsePhase: Math.random() * Math.PI * 2,
+      });
+    } else {
+      const existing = graphState.nodes.get(node.id);
+      Object.assign(existing, node);
     }
+  });
+
+  incomingEdges.forEach((edge) => graphState.edgeMap.set(edge.id, edge));
+
+  // вытесненные по TTL и свёрнутые в агрегат узлы/рёбра
+  const removed = payload.removed || {};
+  (removed.nodes || []).forEach((id) => graphState.nodes.delete(id));
+  (removed.edges || []).forEach((id) => graphState.edgeMap.delete(id));
+  graphState.edges = Array.from(graphState.edgeMap.values());
+
+  if (graphNodesCount) {
+    animateValue(graphNodesCount, graphState.nodes.size.toString());
   }
+  if (graphEdgesCount) {
+    animateValue(graphEdgesCount, graphState.edges.length.toString());
+  }
+
+  updateJobStateDisplay();
 };
 
 const updateJobStateDisplay = () => {
@@ -416,6 +553,8 @@ const startGraph = () => {
       let baseRadius = 14;
       if (node.type === "orchestrator") baseRadius = 22;
       if (node.type === "contract") baseRadius = 18;
+      // агрегат свёрнутых тренеров/валидаторов растёт с числом участников
+      if (node.members) baseRadius = 14 + Math.min(12, Math.log2(node.members + 1) * 2);
 
       const pulseScale = 1 + Math.sin(time * 2 + node.pulsePhase) * 0.05;
       const radius = baseRadius * (isHovered ? 1.2 : pulseScale);
@@ -552,6 +691,7 @@ const startGraph = () => {
 
   resize();
   updateGraphData();
+  connectGraphStream();
   
   if (!reduceMotion) {
     render();
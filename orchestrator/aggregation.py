@@ -0,0 +1,338 @@
+"""
+Robust aggregation of trainer deltas.
+
+Deltas of one epoch are written as rows of a preallocated float32 buffer
+of shape [n_trainers, n_params]; the rules from docs/WHITEPAPER.md (mean,
+coordinate-wise median, trimmed mean) are then computed column-block by
+column-block with batched NumPy reductions over axis 0.
+
+`AsyncAggregator` is the barrier-free alternative: deltas are applied on
+arrival, down-weighted by staleness of the model version they started from.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import numpy as np
+
+logger = logging.getLogger("orchestrator.aggregation")
+
+AGGREGATION_RULES = ("mean", "median", "trimmed_mean")
+
+# Ширина блока колонок: [n_trainers, BLOCK] помещается в L2 и не раздувает временные копии
+DEFAULT_BLOCK_SIZE = 1 << 16
+
+
+def _aggregate_block(block: np.ndarray, rule: str, trim: int, out: np.ndarray):
+    n = block.shape[0]
+    if rule == "mean":
+        np.mean(block, axis=0, out=out)
+    elif rule == "median":
+        np.median(block, axis=0, out=out)
+    elif rule == "trimmed_mean":
+        if trim == 0:
+            np.mean(block, axis=0, out=out)
+            return
+        # partition ставит q минимальных в начало и q максимальных в конец каждой колонки
+        part = np.partition(block, (trim - 1, n - trim), axis=0)
+        np.mean(part[trim:n - trim], axis=0, out=out)
+    else:
+        raise ValueError(f"Unknown aggregation rule: {rule}")
+
+
+def aggregate(
+    stacked: np.ndarray,
+    rule: str = "mean",
+    trim: int = 1,
+    out: Optional[np.ndarray] = None,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+    workers: int = 1,
+) -> np.ndarray:
+    """Aggregate a [n_trainers, n_params] matrix of deltas into one delta.
+
+    `trim` is the number q of values dropped from each side per coordinate
+    for the trimmed mean. Column blocks are independent, so `workers > 1`
+    spreads them over a thread pool (NumPy releases the GIL in reductions).
+    """
+    if stacked.ndim != 2:
+        raise ValueError(f"Expected [n_trainers, n_params], got shape {stacked.shape}")
+    n, n_params = stacked.shape
+    if n == 0:
+        raise ValueError("No deltas to aggregate")
+    if rule not in AGGREGATION_RULES:
+        raise ValueError(f"Unknown aggregation rule: {rule}")
+    if rule == "trimmed_mean" and 2 * trim >= n:
+        raise ValueError(f"trim={trim} leaves nothing to average for {n} deltas")
+    if out is None:
+        out = np.empty(n_params, dtype=stacked.dtype)
+
+    starts = range(0, n_params, block_size)
+
+    def run(start: int):
+        stop = min(start + block_size, n_params)
+        _aggregate_block(stacked[:, start:stop], rule, trim, out[start:stop])
+
+    if workers > 1 and n_params > block_size:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(run, starts))
+    else:
+        for start in starts:
+            run(start)
+    return out
+
+
+def _check_width(n_params: int, expected: Optional[int], max_params: Optional[int]):
+    """Reject a delta width that does not match the model or exceeds `max_params`.
+
+    Called before anything of that width is allocated: the width of a
+    compressed delta comes from its header, not from the payload size.
+    """
+    if expected is not None and n_params != expected:
+        raise ValueError(f"Delta has {n_params} params, expected {expected}")
+    if n_params <= 0 or (max_params is not None and n_params > max_params):
+        raise ValueError(f"Delta has {n_params} params, limit is {max_params}")
+
+
+class DeltaBuffer:
+    """Preallocated row buffer for the deltas of a single epoch."""
+
+    def __init__(self, n_params: int, capacity: int = 16, dtype=np.float32):
+        self.n_params = n_params
+        self.dtype = np.dtype(dtype)
+        self._data = np.empty((capacity, n_params), dtype=self.dtype)
+        self.trainers: list = []
+
+    def __len__(self) -> int:
+        return len(self.trainers)
+
+    @property
+    def capacity(self) -> int:
+        return self._data.shape[0]
+
+    def reserve(self, trainer: str) -> np.ndarray:
+        """Claim the next row for `trainer` and return it as a writable view."""
+        if len(self.trainers) == self.capacity:
+            try:
+                grown = np.empty((self.capacity * 2, self.n_params), dtype=self.dtype)
+            except MemoryError:
+                raise ValueError(f"Cannot grow delta buffer past {self.capacity} rows") from None
+            grown[: self.capacity] = self._data
+            self._data = grown
+        self.trainers.append(trainer)
+        return self._data[len(self.trainers) - 1]
+
+    def add(self, trainer: str, delta: np.ndarray) -> int:
+        if delta.size != self.n_params:
+            raise ValueError(f"Delta has {delta.size} params, expected {self.n_params}")
+        self.reserve(trainer)[:] = delta.reshape(-1)
+        return len(self.trainers) - 1
+
+    def stacked(self) -> np.ndarray:
+        """View of the filled rows, no copy."""
+        return self._data[: len(self.trainers)]
+
+    def clear(self):
+        self.trainers.clear()
+
+
+class EpochAggregator:
+    """Collects per-trainer deltas and folds them into the global parameters.
+
+    `n_params` pins the model width up front; without it the width is taken
+    from the first delta, as long as it stays within `max_params`.
+    """
+
+    def __init__(self, rule: str = "mean", trim: int = 1, workers: int = 1,
+                 n_params: Optional[int] = None, max_params: Optional[int] = None):
+        if rule not in AGGREGATION_RULES:
+            raise ValueError(f"Unknown aggregation rule: {rule}")
+        self.rule = rule
+        self.trim = trim
+        self.workers = workers
+        self.n_params = n_params
+        self.max_params = max_params
+        self.params: Optional[np.ndarray] = None
+        self.version = 0
+        self._buffer: Optional[DeltaBuffer] = None
+        self._out: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        return len(self._buffer) if self._buffer is not None else 0
+
+    def snapshot(self) -> tuple:
+        """(version, copy of the global params or None) taken under the lock."""
+        with self._lock:
+            return self.version, None if self.params is None else self.params.copy()
+
+    def _ensure_buffer(self, n_params: int):
+        expected = self.n_params
+        if expected is None and self.params is not None:
+            expected = self.params.size
+        if expected is None and self._buffer is not None and len(self._buffer):
+            expected = self._buffer.n_params
+        _check_width(n_params, expected, self.max_params)
+        # пустой буфер чужой ширины пересоздаём: ширину задаёт не первая дельта навсегда, а модель
+        if self._buffer is None or self._buffer.n_params != n_params:
+            try:
+                self._buffer = DeltaBuffer(n_params)
+                self._out = np.empty(n_params, dtype=np.float32)
+            except MemoryError:
+                self._buffer = self._out = None
+                raise ValueError(f"Cannot allocate delta buffer for {n_params} params") from None
+
+    def add_delta(self, trainer: str, delta: np.ndarray) -> int:
+        """Store a flat float32 delta from `trainer` for the current epoch."""
+        delta = np.asarray(delta, dtype=np.float32).reshape(-1)
+        with self._lock:
+            self._ensure_buffer(delta.size)
+            return self._buffer.add(trainer, delta)
+
+    def add_with(self, trainer: str, n_params: int, fill) -> int:
+        """Reserve a row for `trainer` and let `fill(row)` write the delta into it.
+
+        Used to decode compressed payloads straight into the stacked buffer.
+        """
+        with self._lock:
+            self._ensure_buffer(n_params)
+            row = self._buffer.reserve(trainer)
+            try:
+                fill(row)
+            except Exception:
+                self._buffer.trainers.pop()
+                raise
+            return len(self._buffer) - 1
+
+    def aggregate(self) -> Optional[dict]:
+        """Aggregate pending deltas, apply them to the global params and reset the buffer."""
+        with self._lock:
+            if not self.pending:
+                return None
+            stacked = self._buffer.stacked()
+            n = stacked.shape[0]
+            rule = self.rule
+            # trimmed mean вырождается при малом числе тренеров, тогда берём медиану
+            if rule == "trimmed_mean" and 2 * self.trim >= n:
+                rule = "median"
+
+            started = time.perf_counter()
+            result = aggregate(stacked, rule=rule, trim=self.trim, out=self._out, workers=self.workers)
+            duration = time.perf_counter() - started
+
+            if self.params is None:
+                self.params = np.zeros_like(result)
+            self.params += result
+            self.version += 1
+            trainers = list(self._buffer.trainers)
+            self._buffer.clear()
+
+        logger.info(f"Aggregated {n} deltas with {rule} in {duration * 1000:.1f} ms")
+        return {
+            "rule": rule,
+            "n_deltas": n,
+            "n_params": int(result.size),
+            "trainers": trainers,
+            "duration_ms": round(duration * 1000, 3),
+            "delta_norm": float(np.linalg.norm(result)),
+            "version": self.version,
+        }
+
+
+class AsyncAggregator:
+    """Applies each delta as it arrives, weighted by how stale its base model is.
+
+    A delta computed from model version `base_version` while the global model
+    is already at `version` has staleness `s = version - base_version`. It is
+    applied as `params += mixing * (1 + s) ** -alpha * delta`; deltas with
+    `s > max_staleness` are rejected. Every applied delta bumps the version,
+    so there is no epoch barrier and slow trainers do not hold back the rest.
+    """
+
+    rule = "async"
+
+    def __init__(self, max_staleness: int = 4, alpha: float = 0.5, mixing: float = 0.5,
+                 n_params: Optional[int] = None, max_params: Optional[int] = None):
+        self.max_staleness = max_staleness
+        self.alpha = alpha
+        self.mixing = mixing
+        self.n_params = n_params
+        self.max_params = max_params
+        self.params: Optional[np.ndarray] = None
+        self.version = 0
+        self.applied = 0
+        self.rejected = 0
+        self.staleness_sum = 0
+        self._scratch: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        return 0
+
+    def snapshot(self) -> tuple:
+        """(version, copy of the global params or None) taken under the lock."""
+        with self._lock:
+            return self.version, None if self.params is None else self.params.copy()
+
+    def weight(self, staleness: int) -> float:
+        return self.mixing * (1.0 + staleness) ** -self.alpha
+
+    def _ensure_params(self, n_params: int):
+        expected = self.n_params if self.params is None else self.params.size
+        _check_width(n_params, expected, self.max_params)
+        if self.params is None:
+            try:
+                self.params = np.zeros(n_params, dtype=np.float32)
+                self._scratch = np.empty(n_params, dtype=np.float32)
+            except MemoryError:
+                self.params = self._scratch = None
+                raise ValueError(f"Cannot allocate params for {n_params} params") from None
+
+    def _apply(self, trainer: str, delta: np.ndarray, base_version: Optional[int]) -> dict:
+        # без base_version считаем дельту свежей: старые тренеры версию не присылают
+        staleness = 0 if base_version is None else max(0, self.version - base_version)
+        if staleness > self.max_staleness:
+            self.rejected += 1
+            logger.info(f"Rejected delta from {trainer}: staleness {staleness} > {self.max_staleness}")
+            return {"applied": False, "staleness": staleness, "version": self.version}
+        weight = self.weight(staleness)
+        # через scratch-буфер: без временного массива размером с модель на каждую дельту
+        np.multiply(delta, np.float32(weight), out=self._scratch)
+        self.params += self._scratch
+        self.version += 1
+        self.applied += 1
+        self.staleness_sum += staleness
+        return {"applied": True, "staleness": staleness, "weight": round(weight, 6), "version": self.version}
+
+    def add_delta(self, trainer: str, delta: np.ndarray, base_version: Optional[int] = None) -> dict:
+        """Apply a flat float32 delta computed from `base_version` right away."""
+        delta = np.asarray(delta, dtype=np.float32).reshape(-1)
+        with self._lock:
+            self._ensure_params(delta.size)
+            return self._apply(trainer, delta, base_version)
+
+    def add_with(self, trainer: str, n_params: int, fill, base_version: Optional[int] = None) -> dict:
+        """Let `fill(buf)` decode the delta into a scratch buffer, then apply it."""
+        with self._lock:
+            self._ensure_params(n_params)
+            fill(self._scratch)
+            return self._apply(trainer, self._scratch, base_version)
+
+    def aggregate(self) -> Optional[dict]:
+        """Nothing to do: deltas are applied on arrival."""
+        return None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "max_staleness": self.max_staleness,
+                "alpha": self.alpha,
+                "mixing": self.mixing,
+                "applied": self.applied,
+                "rejected": self.rejected,
+                "mean_staleness": round(self.staleness_sum / self.applied, 3) if self.applied else 0.0,
+            }
@@ -0,0 +1,142 @@
+"""
+Size/time based batching of on-chain submissions.
+
+Handlers only append reports to a buffer; a single background thread
+flushes it when `max_size` items are pending or the oldest item has waited
+`max_delay` seconds, so one transaction carries many updates. Having one
+flushing thread also keeps nonce usage of the operator account sequential.
+
+A batch whose flush raises (send error, reverted transaction) goes back to
+the front of its job's buffer and is retried on the next flush, up to
+`max_attempts` times; after that its items are dropped and counted.
+"""
+
+import logging
+import threading
+import time
+from collections import defaultdict
+from typing import Callable
+
+logger = logging.getLogger("orchestrator.batching")
+
+
+class Batcher:
+    """Buffers items per job id and hands them to `flush(job_id, items)` in batches."""
+
+    def __init__(self, name: str, flush: Callable[[int, list], None], max_size: int = 32, max_delay: float = 2.0,
+                 max_attempts: int = 5):
+        self.name = name
+        self.flush_fn = flush
+        self.max_size = max_size
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+        # подряд неудачных отправок по заданию
+        self._failures: dict = defaultdict(int)
+        self._retry_at = 0.0
+        self._items: dict = defaultdict(list)
+        self._pending = 0
+        self._oldest = 0.0
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+        self.flushed_batches = 0
+        self.flushed_items = 0
+        self.retried_batches = 0
+        self.dropped_items = 0
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def add(self, job_id: int, item) -> int:
+        with self._cond:
+            first = not self._pending
+            if first:
+                self._oldest = time.monotonic()
+            self._items[job_id].append(item)
+            self._pending += 1
+            # первый элемент будит поток, чтобы тот начал отсчёт max_delay
+            if first or self._pending >= self.max_size:
+                self._cond.notify()
+            return self._pending
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._loop, name=f"batcher-{self.name}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=self.max_delay + 5)
+        self.flush(retry=False)
+
+    def _take(self) -> dict:
+        items = self._items
+        self._items = defaultdict(list)
+        self._pending = 0
+        return items
+
+    def flush(self, retry: bool = True):
+        """Flush everything pending right now (in the caller's thread)."""
+        with self._cond:
+            batches = self._take()
+        self._flush(batches, retry)
+
+    def _requeue(self, job_id: int, items: list):
+        with self._cond:
+            if not self._pending:
+                self._oldest = time.monotonic()
+            self._retry_at = time.monotonic() + self.max_delay
+            # в начало: порядок отправки внутри задания сохраняется
+            self._items[job_id][:0] = items
+            self._pending += len(items)
+
+    def _flush(self, batches: dict, retry: bool = True):
+        for job_id, items in batches.items():
+            for start in range(0, len(items), self.max_size):
+                chunk = items[start:start + self.max_size]
+                try:
+                    self.flush_fn(job_id, chunk)
+                except Exception as e:
+                    self._failures[job_id] += 1
+                    attempts = self._failures[job_id]
+                    if retry and attempts < self.max_attempts:
+                        logger.warning(f"{self.name} batch of {len(chunk)} for job {job_id} failed "
+                                       f"(attempt {attempts}/{self.max_attempts}), retrying: {e}")
+                        self.retried_batches += 1
+                        # остаток задания тоже возвращается, чтобы не обогнать неотправленный пакет
+                        self._requeue(job_id, items[start:])
+                        break
+                    logger.error(f"{self.name} batch of {len(chunk)} for job {job_id} dropped "
+                                 f"after {attempts} attempts: {e}")
+                    self.dropped_items += len(chunk)
+                    self._failures[job_id] = 0
+                    continue
+                self._failures[job_id] = 0
+                self.flushed_batches += 1
+                self.flushed_items += len(chunk)
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while self._running and self._pending < self.max_size:
+                    if self._pending:
+                        remaining = self._oldest + self.max_delay - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._cond.wait(remaining)
+                    else:
+                        self._cond.wait()
+                # после неудачи следующая попытка — не раньше чем через max_delay
+                while self._running and time.monotonic() < self._retry_at:
+                    self._cond.wait(self._retry_at - time.monotonic())
+                if not self._running:
+                    return
+                batches = self._take()
+            self._flush(batches)
@@ -0,0 +1,391 @@
+"""
+Cached Web3 access for the orchestrator.
+
+One HTTP provider with a pooled requests session is shared by background
+threads (batcher, indexer). Request handlers use the `*_async` methods,
+backed by `AsyncWeb3`: they await the node instead of holding a threadpool
+worker, at most `max_concurrency` calls are in flight at once, and every
+call (including the wait for a slot) is bounded by `timeout`, so a slow
+node fails individual requests instead of stalling the server.
+
+Connectivity, chain id and gas price are served from TTL caches. Nonces
+of the operator account, whose transactions the orchestrator signs itself,
+are reserved in-process; a transaction prepared for a trainer to sign gets
+the trainer's pending transaction count from the node.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from typing import Awaitable, Callable, Optional
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+from web3 import AsyncHTTPProvider, AsyncWeb3, Web3
+
+logger = logging.getLogger("orchestrator.chain")
+
+
+class TimedHTTPProvider(Web3.HTTPProvider):
+    """HTTP provider that reports every JSON-RPC call as (method, seconds, ok) to `on_rpc`."""
+
+    def __init__(self, *args, on_rpc: Optional[Callable[[str, float, bool], None]] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.on_rpc = on_rpc
+
+    def make_request(self, method, params):
+        if self.on_rpc is None:
+            return super().make_request(method, params)
+        started = time.perf_counter()
+        ok = False
+        try:
+            response = super().make_request(method, params)
+            ok = "error" not in response
+            return response
+        finally:
+            self.on_rpc(str(method), time.perf_counter() - started, ok)
+
+
+class TimedAsyncHTTPProvider(AsyncHTTPProvider):
+    """`TimedHTTPProvider` for `AsyncWeb3`; cancelled calls are reported as failed.
+
+    Posts through its own keep-alive aiohttp session. web3's session cache
+    takes a thread-pool lock per request and leaks it when the call is
+    cancelled by a deadline, after which every later call hangs.
+    """
+
+    def __init__(self, *args, on_rpc: Optional[Callable[[str, float, bool], None]] = None,
+                 pool_size: int = 32, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.on_rpc = on_rpc
+        self.pool_size = pool_size
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def _make_request(self, method, request_data: bytes) -> bytes:
+        session = self._session
+        if session is None or session.closed or session._loop.is_closed():
+            session = self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size), raise_for_status=True)
+        async with session.post(self.endpoint_uri, data=request_data, **self.get_request_kwargs()) as response:
+            return await response.read()
+
+    async def make_request(self, method, params):
+        if self.on_rpc is None:
+            return await super().make_request(method, params)
+        started = time.perf_counter()
+        ok = False
+        try:
+            response = await super().make_request(method, params)
+            ok = "error" not in response
+            return response
+        finally:
+            self.on_rpc(str(method), time.perf_counter() - started, ok)
+
+    async def disconnect(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+class TTLCache:
+    """Single cached value refreshed by `loader` after `ttl` seconds."""
+
+    def __init__(self, loader: Callable, ttl: float):
+        self.loader = loader
+        self.ttl = ttl
+        self._value = None
+        self._expires = 0.0
+        self._lock = threading.Lock()
+
+    def get(self):
+        if time.monotonic() < self._expires:
+            return self._value
+        with self._lock:
+            # другой поток мог обновить значение, пока мы ждали блокировку
+            if time.monotonic() < self._expires:
+                return self._value
+            self._value = self.loader()
+            self._expires = time.monotonic() + self.ttl
+            return self._value
+
+    def invalidate(self):
+        self._expires = 0.0
+
+
+class AsyncTTLCache:
+    """`TTLCache` with a coroutine loader.
+
+    Once a value is loaded, an expired one is still returned while a single
+    background refresh runs, so handlers never wait for the node to re-read
+    connectivity or gas price. Only the first load is awaited; concurrent
+    callers share it and fail together if it fails.
+    """
+
+    def __init__(self, loader: Callable[[], Awaitable], ttl: float):
+        self.loader = loader
+        self.ttl = ttl
+        self._value = None
+        self._loaded = False
+        self._expires = 0.0
+        self._refreshing: Optional[asyncio.Future] = None
+
+    async def get(self):
+        if time.monotonic() < self._expires:
+            return self._value
+        if self._refreshing is None:
+            self._refreshing = asyncio.ensure_future(self._refresh())
+            self._refreshing.add_done_callback(self._refreshed)
+        if self._loaded:
+            return self._value
+        # отмена одного ожидающего не должна отменять общую загрузку
+        return await asyncio.shield(self._refreshing)
+
+    async def _refresh(self):
+        value = await self.loader()
+        self._value, self._loaded = value, True
+        self._expires = time.monotonic() + self.ttl
+        return value
+
+    def _refreshed(self, future: asyncio.Future):
+        self._refreshing = None
+        if not future.cancelled() and future.exception() is not None and self._loaded:
+            # фоновое обновление: остаётся старое значение, следующий запрос попробует снова
+            logger.debug(f"Background refresh failed: {future.exception()!r}")
+
+    def invalidate(self):
+        self._expires = 0.0
+        self._loaded = False
+
+
+class NonceManager:
+    """Hands out consecutive nonces per address without asking the node each time.
+
+    The first reservation for an address (or the first after `resync` or
+    `idle_ttl` seconds of inactivity) reads the pending transaction count
+    from the chain; later ones are incremented locally. Entries idle for
+    longer than `idle_ttl` are dropped.
+
+    Only for accounts whose transactions the orchestrator signs and sends
+    itself (the operator account, from the batcher thread): a nonce handed
+    out for a transaction someone else may never send would leave a gap
+    that stalls every later one.
+    """
+
+    def __init__(self, fetch: Callable[[str], int], idle_ttl: float = 30.0):
+        self.fetch = fetch
+        self.idle_ttl = idle_ttl
+        self._next: dict = {}
+        self._touched: dict = {}
+        # адресов один-два (операторы), общий замок не мешает
+        self._lock = threading.Lock()
+
+    def reserve(self, address: str) -> int:
+        with self._lock:
+            now = time.monotonic()
+            self._evict(now)
+            nonce = self._next.get(address)
+            if nonce is None:
+                nonce = self.fetch(address)
+            self._next[address] = nonce + 1
+            self._touched[address] = now
+            return nonce
+
+    def _evict(self, now: float):
+        for address, touched in list(self._touched.items()):
+            if now - touched > self.idle_ttl:
+                del self._touched[address]
+                self._next.pop(address, None)
+
+    def resync(self, address: Optional[str] = None):
+        with self._lock:
+            if address is None:
+                self._next.clear()
+                self._touched.clear()
+            else:
+                self._next.pop(address, None)
+                self._touched.pop(address, None)
+
+
+class ChainClient:
+    def __init__(self, provider_url: str, timeout: float = 3, pool_size: int = 32,
+                 status_ttl: float = 5.0, gas_price_ttl: float = 5.0, nonce_idle_ttl: float = 30.0,
+                 max_concurrency: int = 32, on_rpc: Optional[Callable[[str, float, bool], None]] = None):
+        self.provider_url = provider_url
+        self.on_rpc = on_rpc
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.max_concurrency = max_concurrency
+        self._w3: Optional[Web3] = None
+        self._w3_lock = threading.Lock()
+        self._aw3: Optional[AsyncWeb3] = None
+        # создаётся в цикле событий при первом вызове, а не при импорте модуля
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.in_flight = 0
+        self.timeouts = 0
+        self._connected = TTLCache(self._check_connected, status_ttl)
+        self._chain_id = TTLCache(lambda: self.w3.eth.chain_id, float("inf"))
+        self._gas_price = TTLCache(lambda: self.w3.eth.gas_price, gas_price_ttl)
+        self._connected_async = AsyncTTLCache(self._check_connected_async, status_ttl)
+        self._chain_id_async = AsyncTTLCache(lambda: self._call(lambda: self.aw3.eth.chain_id), float("inf"))
+        self._gas_price_async = AsyncTTLCache(lambda: self._call(lambda: self.aw3.eth.gas_price), gas_price_ttl)
+        self.nonces = NonceManager(
+            lambda address: self.w3.eth.get_transaction_count(address, "pending"),
+            idle_ttl=nonce_idle_ttl,
+        )
+
+    @property
+    def w3(self) -> Web3:
+        if self._w3 is None:
+            with self._w3_lock:
+                if self._w3 is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                    session.mount("http://", adapter)
+                    session.mount("https://", adapter)
+                    self._w3 = Web3(TimedHTTPProvider(
+                        self.provider_url,
+                        request_kwargs={"timeout": self.timeout},
+                        session=session,
+                        on_rpc=self.on_rpc,
+                    ))
+        return self._w3
+
+    @property
+    def aw3(self) -> AsyncWeb3:
+        if self._aw3 is None:
+            # повторы web3 после таймаута съели бы дедлайн запроса — ретраев нет
+            self._aw3 = AsyncWeb3(TimedAsyncHTTPProvider(
+                self.provider_url,
+                request_kwargs={"timeout": aiohttp.ClientTimeout(total=self.timeout)},
+                exception_retry_configuration=None,
+                on_rpc=self.on_rpc,
+                pool_size=self.max_concurrency,
+            ))
+        return self._aw3
+
+    async def _call(self, make: Callable[[], Awaitable], queue: bool = True):
+        """Await one RPC call under the concurrency limit; the deadline covers queueing for a slot.
+
+        `queue=False` skips the slot queue (still under the deadline): the
+        periodic connectivity probe must not time out behind a backlog of
+        our own calls and report a slow node as gone.
+        """
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+
+        async def limited():
+            async with self._slots:
+                return await counted()
+
+        async def counted():
+            self.in_flight += 1
+            try:
+                return await make()
+            finally:
+                self.in_flight -= 1
+        try:
+            return await asyncio.wait_for(limited() if queue else counted(), self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+
+    def _check_connected(self) -> bool:
+        try:
+            connected = self.w3.is_connected()
+        except Exception as e:
+            logger.warning(f"Web3 connectivity check error: {e}")
+            connected = False
+        if not connected:
+            # после переподключения ноды счётчики могли уехать
+            self.nonces.resync()
+        return connected
+
+    async def _check_connected_async(self) -> bool:
+        try:
+            connected = await self._call(self.aw3.is_connected, queue=False)
+        except asyncio.TimeoutError:
+            # медленная нода — не потеря ноды: счётчики nonce не сбрасываем
+            logger.warning(f"Web3 connectivity check timed out after {self.timeout}s")
+            return False
+        except Exception as e:
+            logger.warning(f"Web3 connectivity check error: {e}")
+            connected = False
+        if not connected:
+            self.nonces.resync()
+        return connected
+
+    def is_connected(self) -> bool:
+        """Cached connectivity; refreshes at most once per status TTL."""
+        return self._connected.get()
+
+    def chain_id(self) -> int:
+        return self._chain_id.get()
+
+    def gas_price(self) -> int:
+        return self._gas_price.get()
+
+    async def is_connected_async(self) -> bool:
+        return await self._connected_async.get()
+
+    async def chain_id_async(self) -> int:
+        return await self._chain_id_async.get()
+
+    async def gas_price_async(self) -> int:
+        return await self._gas_price_async.get()
+
+    def build_transaction(self, call, sender: str, gas: int) -> dict:
+        """Fill every field locally so `build_transaction` makes no RPC calls.
+
+        Reserves the nonce, so only for transactions the orchestrator sends itself.
+        """
+        nonce = self.nonces.reserve(sender)
+        try:
+            return call.build_transaction({
+                "from": sender,
+                "nonce": nonce,
+                "gas": gas,
+                "gasPrice": self.gas_price(),
+                "chainId": self.chain_id(),
+            })
+        except Exception:
+            self.nonces.resync(sender)
+            raise
+
+    async def build_transaction_async(self, call, sender: str, gas: int) -> dict:
+        """Prepare a transaction for `sender` to sign and send; the RPC calls it needs are awaited.
+
+        The nonce is the sender's pending transaction count and is not
+        reserved: the orchestrator does not know whether it will be used.
+        Raises `asyncio.TimeoutError` when the node does not answer in time.
+        """
+        chain_id, gas_price, nonce = await asyncio.gather(
+            self.chain_id_async(),
+            self.gas_price_async(),
+            self._call(lambda: self.aw3.eth.get_transaction_count(sender, "pending")),
+        )
+        return call.build_transaction({
+            "from": sender,
+            "nonce": nonce,
+            "gas": gas,
+            "gasPrice": gas_price,
+            "chainId": chain_id,
+        })
+
+    def stats(self) -> dict:
+        return {"in_flight": self.in_flight, "max_concurrency": self.max_concurrency,
+                "timeout": self.timeout, "timeouts": self.timeouts}
+
+    async def close_async(self):
+        """Close the aiohttp session of the async provider (on shutdown)."""
+        if self._aw3 is not None:
+            await self._aw3.provider.disconnect()
+        self._slots = None
+
+    def reset(self):
+        """Drop cached state; the next call re-checks the node."""
+        for cache in (self._connected, self._chain_id, self._gas_price,
+                      self._connected_async, self._chain_id_async, self._gas_price_async):
+            cache.invalidate()
+        self.nonces.resync()
@@ -0,0 +1,145 @@
+"""
+Server-sent events push of graph and job_state changes.
+
+Mutations only bump the graph version (see graph.py); a single broadcaster
+task wakes up once per tick, and if the version or job_state moved it
+builds one delta frame since the previous tick and fans it out to every
+subscriber. A burst of edges within a tick therefore costs one frame, and
+idle dashboards cost nothing but a periodic keep-alive.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Callable, Optional
+
+from orchestrator.graph import GraphStore
+from orchestrator.wire import dumps
+
+logger = logging.getLogger("orchestrator.events")
+
+SUBSCRIBER_QUEUE_SIZE = 32
+KEEPALIVE_INTERVAL = 15.0
+
+
+def sse_frame(data: str, event: str = "graph") -> str:
+    return f"event: {event}\ndata: {data}\n\n"
+
+
+class GraphBroadcaster:
+    def __init__(self, graph: GraphStore, job_state: Callable[[], dict], now_iso: Callable[[], str], tick: float = 0.25,
+                 on_frame: Optional[Callable[[float], None]] = None):
+        self.graph = graph
+        # вызывается с временем сборки и сериализации каждого delta-кадра
+        self.on_frame = on_frame
+        self.job_state = job_state
+        self.now_iso = now_iso
+        self.tick = tick
+        self._subscribers: set = set()
+        self._task: Optional[asyncio.Task] = None
+        self._version = graph.version()
+        self._job_snapshot: tuple = ()
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    def _frame(self, version: int, full: bool, nodes: list, edges: list, removed: dict) -> str:
+        return sse_frame(dumps({
+            "version": version,
+            "full": full,
+            "nodes": nodes,
+            "edges": edges,
+            "removed": removed,
+            "updated_at": self.now_iso(),
+            "job_state": self.job_state(),
+        }).decode())
+
+    def ensure_running(self):
+        if self._task is None or self._task.done():
+            self._version = self.graph.version()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def subscribe(self) -> asyncio.Queue:
+        """Register a subscriber; its queue starts with a full snapshot frame.
+
+        The queue is registered before the snapshot is read, so a delta
+        published meanwhile is not lost; queued deltas the snapshot already
+        covers (version at or below it) are dropped.
+        """
+        self.ensure_running()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers.add(queue)
+        try:
+            version, full, nodes, edges, removed = await asyncio.to_thread(self.graph.changes, None)
+        except BaseException:
+            self.unsubscribe(queue)
+            raise
+        # между drain и повторной вставкой нет await — _publish не вклинится
+        pending = []
+        while not queue.empty():
+            pending.append(queue.get_nowait())
+        if None in pending:
+            # очередь успела переполниться и закрыться, пока строился снимок
+            queue.put_nowait(None)
+            return queue
+        queue.put_nowait((version, self._frame(version, full, nodes, edges, removed)))
+        for item in pending:
+            if item[0] > version:
+                self._offer(queue, item)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    def _offer(self, queue: asyncio.Queue, item: tuple):
+        try:
+            queue.put_nowait(item)
+        except asyncio.QueueFull:
+            # медленный клиент: закрываем поток, EventSource переподключится и получит полный снимок
+            self._subscribers.discard(queue)
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(None)
+
+    def _publish(self, version: int, frame: str):
+        for queue in list(self._subscribers):
+            self._offer(queue, (version, frame))
+
+    async def _run(self):
+        logger.info("Graph broadcaster started")
+        while True:
+            await asyncio.sleep(self.tick)
+            if not self._subscribers:
+                self._version = self.graph.version()
+                continue
+            job_snapshot = tuple(self.job_state().values())
+            if self.graph.version() == self._version and job_snapshot == self._job_snapshot:
+                continue
+            started = time.perf_counter()
+            try:
+                version, full, nodes, edges, removed = await asyncio.to_thread(self.graph.changes, self._version)
+            except Exception as e:
+                logger.error(f"Broadcast error: {e}")
+                continue
+            self._version = version
+            self._job_snapshot = job_snapshot
+            self._publish(version, self._frame(version, full, nodes, edges, removed))
+            if self.on_frame is not None:
+                self.on_frame(time.perf_counter() - started)
+
+    async def stream(self, queue: asyncio.Queue):
+        """Async generator of SSE text for one subscriber."""
+        try:
+            while True:
+                try:
+                    # (версия графа, текст кадра) или None — поток закрыт
+                    frame = await asyncio.wait_for(queue.get(), timeout=KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if frame is None:
+                    break
+                yield frame[1]
+        finally:
+            self.unsubscribe(queue)
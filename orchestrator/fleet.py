@@ -0,0 +1,20 @@
+"""
+Simulated trainer and validator fleet.
+
+Shared by the orchestrator's built-in simulation and the benchmarks, which
+must not import the FastAPI app (it opens the state log and chain index).
+"""
+
+SIMULATED_TRAINERS = [
+    {"address": "0x70997970C51812dc3A010C7d01b50e0d17dc79C8", "name": "Trainer-Alpha"},
+    {"address": "0x3C44CdDdB6a900fa2b585dd299e03d12FA4293BC", "name": "Trainer-Beta"},
+    {"address": "0x90F79bf6EB2c4f870365E785982E1f101E93b906", "name": "Trainer-Gamma"},
+    {"address": "0x15d34AAf54267DB7D7c367839AAf71A00a2C6A65", "name": "Trainer-Delta"},
+    {"address": "0x9965507D1a55bcC2695C58ba16FB37d819B0A4dc", "name": "Trainer-Epsilon"},
+]
+
+SIMULATED_VALIDATORS = [
+    {"address": "0x976EA74026E726554dB657fA54763abd0C3a0aa9", "name": "Validator-Prime"},
+    {"address": "0x14dC79964da2C08b23698B3D3cc7Ca32193d9955", "name": "Validator-Secondary"},
+    {"address": "0x23618e81E3f5cdF7f54C3d65f7FBc0aBf5B21E8f", "name": "Validator-Tertiary"},
+]
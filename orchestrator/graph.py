@@ -0,0 +1,522 @@
+"""
+Thread-safe store for the interaction graph.
+
+Nodes and edges are compact `__slots__` records spread over lock-sharded
+dicts, so the simulation thread and FastAPI's threadpool handlers touching
+different workers do not contend on one lock. Timestamps are stored as
+float epoch seconds and formatted to ISO strings only when the graph is
+read.
+
+Every mutation stamps the record with a value from one monotonically
+increasing version counter, so readers can ask for the records changed
+since a version they already hold instead of the full graph.
+
+Retention keeps the graph bounded for any uptime. `expire()` (called
+periodically by the owner):
+
+- evicts nodes not seen within `node_ttl`, together with their edges;
+- rolls edge counters, which count hits within a sliding window of
+  `edge_window` seconds in `edge_buckets` buckets rather than over the
+  lifetime, and drops edges whose window is empty;
+- when more than `max_nodes` nodes remain, folds the least recently seen
+  nodes of the `collapse_types` into one aggregate node per type
+  (`trainer:*`), merging their edges into its edges.
+
+Removals leave tombstones stamped with a version, so `changes(since)`
+reports them to delta readers; tombstones older than `tombstone_ttl` are
+dropped and readers from before that get a full snapshot instead.
+
+An optional `journal(*record)` callback receives the full state of every
+changed record while its shard lock is held, so a write-ahead log sees
+the changes of one key in the order they happened. Retention itself is not
+journaled: after recovery the first `expire()` derives it again from the
+restored timestamps.
+"""
+
+import functools
+import itertools
+import math
+import threading
+import time
+from contextlib import ExitStack
+from datetime import datetime
+from typing import Callable, Optional
+
+DEFAULT_SHARDS = 16
+AGGREGATE_STATUS = "aggregate"
+
+
+@functools.lru_cache(maxsize=4096)
+def _iso_second(second: int) -> str:
+    return datetime.utcfromtimestamp(second).isoformat()
+
+
+def format_ts(ts: float) -> str:
+    """`datetime.utcfromtimestamp(ts).isoformat() + "Z"` with the date part cached per second."""
+    # записи графа обновляются пачками в одни и те же секунды — дорогой datetime строится один раз
+    frac, whole = math.modf(ts)
+    us = round(frac * 1e6)
+    if us >= 1_000_000:
+        whole, us = whole + 1, us - 1_000_000
+    elif us < 0:
+        whole, us = whole - 1, us + 1_000_000
+    prefix = _iso_second(int(whole))
+    return f"{prefix}.{us:06d}Z" if us else prefix + "Z"
+
+
+def aggregate_id(node_type: str) -> str:
+    return f"{node_type}:*"
+
+
+class NodeRecord:
+    __slots__ = ("id", "label", "type", "status", "last_seen", "version", "members")
+
+    def __init__(self, node_id: str, label: str, node_type: str, now: float, version: int):
+        self.id = node_id
+        self.label = label
+        self.type = node_type
+        self.status = "active"
+        self.last_seen = now
+        self.version = version
+        self.members = 0
+
+    def to_dict(self) -> dict:
+        node = {
+            "id": self.id,
+            "label": self.label,
+            "type": self.type,
+            "last_seen": format_ts(self.last_seen),
+            "status": self.status,
+        }
+        if self.members:
+            node["members"] = self.members
+        return node
+
+
+class EdgeRecord:
+    """Edge with a ring of per-bucket hit counts; `head` is the newest bucket number."""
+
+    __slots__ = ("source", "target", "label", "slots", "head", "last_seen", "version")
+
+    def __init__(self, source: str, target: str, label: str, now: float, version: int,
+                 buckets: int = 1, bucket: int = 0):
+        self.source = source
+        self.target = target
+        self.label = label
+        self.slots = [0] * buckets
+        self.head = bucket
+        self.last_seen = now
+        self.version = version
+
+    @property
+    def id(self) -> str:
+        return f"{self.source}|{self.target}|{self.label}"
+
+    @property
+    def count(self) -> int:
+        return sum(self.slots)
+
+    def count_at(self, bucket: int) -> int:
+        """Hits within the window ending at `bucket`, without rolling the ring."""
+        age = bucket - self.head
+        if age <= 0:
+            # окно не сдвинулось с последнего попадания — частый случай при чтении графа
+            return sum(self.slots)
+        n = len(self.slots)
+        if age >= n:
+            return 0
+        return sum(self.slots[(self.head - k) % n] for k in range(n - age))
+
+    def advance(self, bucket: int) -> bool:
+        """Roll the window forward to `bucket`; True if any hits fell out of it."""
+        shift = bucket - self.head
+        if shift <= 0:
+            return False
+        n = len(self.slots)
+        dropped = False
+        for k in range(1, min(shift, n) + 1):
+            i = (self.head + k) % n
+            if self.slots[i]:
+                dropped = True
+                self.slots[i] = 0
+        self.head = bucket
+        return dropped
+
+    def hit(self, bucket: int, amount: int = 1):
+        self.advance(bucket)
+        # запоздавший (по часам) хит считаем в текущую корзину
+        self.slots[self.head % len(self.slots)] += amount
+
+    def merge(self, other: "EdgeRecord"):
+        """Add the hits of `other` (rolled to the same head) into this edge."""
+        head = max(self.head, other.head)
+        self.advance(head)
+        other.advance(head)
+        for i, hits in enumerate(other.slots):
+            self.slots[i] += hits
+        self.last_seen = max(self.last_seen, other.last_seen)
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "source": self.source,
+            "target": self.target,
+            "label": self.label,
+            "count": self.count,
+            "last_seen": format_ts(self.last_seen),
+        }
+
+
+class _Shard:
+    __slots__ = ("lock", "nodes", "edges", "removed", "version")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.nodes: dict = {}
+        self.edges: dict = {}
+        # надгробия удалённых записей: ("n", id) / ("e", key) -> (версия, время удаления)
+        self.removed: dict = {}
+        self.version = 0
+
+
+class GraphStore:
+    """Sharded, lock-protected node and edge records with optional retention."""
+
+    def __init__(self, shards: int = DEFAULT_SHARDS, journal: Optional[Callable] = None,
+                 node_ttl: Optional[float] = None, edge_window: Optional[float] = None, edge_buckets: int = 10,
+                 max_nodes: Optional[int] = None, collapse_types: tuple = ("trainer", "validator"),
+                 pinned_types: tuple = ("orchestrator", "contract"), tombstone_ttl: float = 300.0,
+                 clock: Callable[[], float] = time.time):
+        self._shards = [_Shard() for _ in range(shards)]
+        self.journal = journal
+        self.node_ttl = node_ttl
+        self.edge_window = edge_window
+        # без окна — одна корзина, которая никогда не сдвигается (счётчик за всё время)
+        self.edge_buckets = edge_buckets if edge_window else 1
+        self._bucket_width = edge_window / edge_buckets if edge_window else float("inf")
+        self.max_nodes = max_nodes
+        self.collapse_types = tuple(collapse_types)
+        self.pinned_types = tuple(pinned_types)
+        self.tombstone_ttl = tombstone_ttl
+        self._now = clock
+        # next() у itertools.count атомарен под GIL; версия берётся под блокировкой шарда
+        self._clock = itertools.count(1)
+        self._cleared_at = 0
+        # версии до этой могли потерять надгробия — таким читателям нужен полный снимок
+        self._pruned_at = 0
+        self.evicted_nodes = 0
+        self.evicted_edges = 0
+        self.folded_nodes = 0
+
+    def _shard(self, key) -> _Shard:
+        return self._shards[hash(key) % len(self._shards)]
+
+    def _stamp(self, shard: _Shard) -> int:
+        shard.version = version = next(self._clock)
+        return version
+
+    def _bucket(self, now: float) -> int:
+        return int(now // self._bucket_width)
+
+    def ensure_node(self, node_id: str, label: str, node_type: str):
+        now = self._now()
+        shard = self._shard(node_id)
+        with shard.lock:
+            node = shard.nodes.get(node_id)
+            if node is None:
+                node = shard.nodes[node_id] = NodeRecord(node_id, label, node_type, now, self._stamp(shard))
+                shard.removed.pop(("n", node_id), None)
+            else:
+                node.last_seen = now
+                node.version = self._stamp(shard)
+            if self.journal is not None:
+                self.journal("n", node.id, node.label, node.type, node.status, now)
+
+    def update_status(self, node_id: str, status: str):
+        now = self._now()
+        shard = self._shard(node_id)
+        with shard.lock:
+            node = shard.nodes.get(node_id)
+            if node is not None:
+                node.status = status
+                node.last_seen = now
+                node.version = self._stamp(shard)
+                if self.journal is not None:
+                    self.journal("n", node.id, node.label, node.type, status, now)
+
+    def record_edge(self, source: str, target: str, label: str):
+        now = self._now()
+        bucket = self._bucket(now)
+        key = (source, target, label)
+        shard = self._shard(key)
+        with shard.lock:
+            edge = shard.edges.get(key)
+            if edge is None:
+                edge = shard.edges[key] = EdgeRecord(source, target, label, now, self._stamp(shard),
+                                                     self.edge_buckets, bucket)
+                shard.removed.pop(("e", key), None)
+            else:
+                edge.last_seen = now
+                edge.version = self._stamp(shard)
+            edge.hit(bucket)
+            if self.journal is not None:
+                self.journal("e", source, target, label, edge.count, now)
+
+    def restore_node(self, node_id: str, label: str, node_type: str, status: str, last_seen: float,
+                     members: int = 0):
+        """Set a node to a journaled state (recovery; not journaled again)."""
+        shard = self._shard(node_id)
+        with shard.lock:
+            node = NodeRecord(node_id, label, node_type, last_seen, self._stamp(shard))
+            node.status = status
+            node.members = members
+            shard.nodes[node_id] = node
+
+    def restore_edge(self, source: str, target: str, label: str, count: int, last_seen: float):
+        # раскладка по корзинам не журналируется: все хиты — в корзину last_seen
+        key = (source, target, label)
+        bucket = self._bucket(last_seen)
+        shard = self._shard(key)
+        with shard.lock:
+            edge = EdgeRecord(source, target, label, last_seen, self._stamp(shard), self.edge_buckets, bucket)
+            edge.hit(bucket, count)
+            shard.edges[key] = edge
+
+    def dump(self) -> dict:
+        """Raw node and edge tuples of the whole graph (for snapshots)."""
+        with ExitStack() as stack:
+            for shard in self._shards:
+                stack.enter_context(shard.lock)
+            return {
+                "nodes": [[n.id, n.label, n.type, n.status, n.last_seen, n.members]
+                          for shard in self._shards for n in shard.nodes.values()],
+                "edges": [[e.source, e.target, e.label, e.count, e.last_seen]
+                          for shard in self._shards for e in shard.edges.values()],
+            }
+
+    def get_node(self, node_id: str) -> Optional[dict]:
+        shard = self._shard(node_id)
+        with shard.lock:
+            node = shard.nodes.get(node_id)
+            return node.to_dict() if node is not None else None
+
+    def node_count(self) -> int:
+        return sum(len(s.nodes) for s in self._shards)
+
+    def edge_count(self) -> int:
+        return sum(len(s.edges) for s in self._shards)
+
+    def version(self) -> int:
+        """Latest issued version, read without locking (may lag an in-flight write)."""
+        return max(self._cleared_at, max(shard.version for shard in self._shards))
+
+    def change_rows(self, since: Optional[int] = None) -> tuple:
+        """Raw form of `changes()`: (version, full, nodes, edges, removed nodes, removed edges).
+
+        Nodes are (id, label, type, status, last_seen, members) tuples, edges
+        (source, target, label, count, last_seen) and removed edges
+        (source, target, label); timestamps stay epoch seconds. Encoders that
+        do not need dicts (`orchestrator.wire`) start from here.
+        """
+        nodes, edges, gone = [], [], []
+        bucket = self._bucket(self._now())
+        with ExitStack() as stack:
+            # все шарды под блокировкой — согласованный срез, ни одна запись не «в полёте»
+            for shard in self._shards:
+                stack.enter_context(shard.lock)
+            version = max(self._cleared_at, max(shard.version for shard in self._shards))
+            full = since is None or since < max(self._cleared_at, self._pruned_at) or since > version
+            floor = 0 if full else since
+            for shard in self._shards:
+                nodes.extend(
+                    (n.id, n.label, n.type, n.status, n.last_seen, n.members)
+                    for n in shard.nodes.values() if n.version > floor
+                )
+                edges.extend(
+                    (e.source, e.target, e.label, e.count_at(bucket), e.last_seen)
+                    for e in shard.edges.values() if e.version > floor
+                )
+                if not full:
+                    gone.extend(key for key, (v, _) in shard.removed.items() if v > floor)
+        return (
+            version,
+            full,
+            nodes,
+            edges,
+            [key for kind, key in gone if kind == "n"],
+            [key for kind, key in gone if kind == "e"],
+        )
+
+    def changes(self, since: Optional[int] = None) -> tuple:
+        """Return (version, full, nodes, edges, removed) with records changed after `since`.
+
+        With an edge window, `count` is the number of hits within it and
+        `rate` the same per second.
+        `removed` lists ids of nodes and edges deleted after `since` as
+        {"nodes": [...], "edges": [...]}. A full snapshot (with nothing
+        removed) is returned when `since` is None, predates the last clear()
+        or the oldest kept tombstone, or is ahead of this store (e.g. a
+        client from before a restart).
+        """
+        version, full, nodes, edges, removed_nodes, removed_edges = self.change_rows(since)
+        node_dicts = []
+        for i, l, t, st, ts, members in nodes:
+            node = {"id": i, "label": l, "type": t, "last_seen": format_ts(ts), "status": st}
+            if members:
+                node["members"] = members
+            node_dicts.append(node)
+        edge_dicts = [
+            {"id": f"{s}|{t}|{l}", "source": s, "target": t, "label": l, "count": c, "last_seen": format_ts(ts)}
+            for s, t, l, c, ts in edges
+        ]
+        if self.edge_window:
+            for edge in edge_dicts:
+                edge["rate"] = round(edge["count"] / self.edge_window, 4)
+        return (
+            version,
+            full,
+            node_dicts,
+            edge_dicts,
+            {"nodes": removed_nodes, "edges": ["|".join(key) for key in removed_edges]},
+        )
+
+    def snapshot(self) -> tuple:
+        """Return (nodes, edges) of the whole graph as lists of dicts."""
+        _, _, nodes, edges, _ = self.changes()
+        return nodes, edges
+
+    def _remove_node(self, node: NodeRecord, now: float):
+        shard = self._shard(node.id)
+        del shard.nodes[node.id]
+        shard.removed[("n", node.id)] = (self._stamp(shard), now)
+
+    def _remove_edge(self, key: tuple, now: float):
+        shard = self._shard(key)
+        del shard.edges[key]
+        shard.removed[("e", key)] = (self._stamp(shard), now)
+
+    def expire(self) -> dict:
+        """Apply retention once: node TTL, edge windows, aggregation over `max_nodes`.
+
+        Returns counts of what was evicted and folded in this pass.
+        """
+        if not (self.node_ttl or self.edge_window or self.max_nodes is not None):
+            return {"evicted_nodes": 0, "evicted_edges": 0, "folded_nodes": 0}
+        now = self._now()
+        bucket = self._bucket(now)
+        evicted_nodes = evicted_edges = folded = 0
+        with ExitStack() as stack:
+            for shard in self._shards:
+                stack.enter_context(shard.lock)
+            gone = set()
+            if self.node_ttl:
+                for shard in self._shards:
+                    for node in list(shard.nodes.values()):
+                        if node.type not in self.pinned_types and now - node.last_seen > self.node_ttl:
+                            self._remove_node(node, now)
+                            gone.add(node.id)
+                evicted_nodes = len(gone)
+
+            for shard in self._shards:
+                for key, edge in list(shard.edges.items()):
+                    dropped = edge.advance(bucket)
+                    if edge.source in gone or edge.target in gone or not edge.count:
+                        self._remove_edge(key, now)
+                        evicted_edges += 1
+                    elif dropped:
+                        # счётчик окна уменьшился — отдаём ребро дельта-читателям
+                        edge.version = self._stamp(shard)
+
+            if self.max_nodes is not None:
+                folded = self._fold_locked(now)
+
+            cutoff = now - self.tombstone_ttl
+            for shard in self._shards:
+                for key, (version, removed_at) in list(shard.removed.items()):
+                    if removed_at < cutoff:
+                        del shard.removed[key]
+                        self._pruned_at = max(self._pruned_at, version)
+
+        self.evicted_nodes += evicted_nodes
+        self.evicted_edges += evicted_edges
+        self.folded_nodes += folded
+        return {"evicted_nodes": evicted_nodes, "evicted_edges": evicted_edges, "folded_nodes": folded}
+
+    def _fold_locked(self, now: float) -> int:
+        """Fold least recently seen collapsible nodes into per-type aggregates (all locks held)."""
+        total = sum(len(s.nodes) for s in self._shards)
+        if total <= self.max_nodes:
+            return 0
+        candidates = sorted(
+            (n for s in self._shards for n in s.nodes.values()
+             if n.type in self.collapse_types and n.status != AGGREGATE_STATUS),
+            key=lambda n: n.last_seen,
+        )
+        aggregates = {}
+        folded = {}
+        for node in candidates:
+            if total <= self.max_nodes:
+                break
+            agg = aggregates.get(node.type)
+            if agg is None:
+                agg_id = aggregate_id(node.type)
+                agg_shard = self._shard(agg_id)
+                agg = agg_shard.nodes.get(agg_id)
+                if agg is None:
+                    agg = agg_shard.nodes[agg_id] = NodeRecord(agg_id, "", node.type, node.last_seen,
+                                                               self._stamp(agg_shard))
+                    agg.status = AGGREGATE_STATUS
+                    agg_shard.removed.pop(("n", agg_id), None)
+                    total += 1
+                aggregates[node.type] = agg
+            agg.members += 1
+            agg.last_seen = max(agg.last_seen, node.last_seen)
+            folded[node.id] = agg.id
+            self._remove_node(node, now)
+            total -= 1
+
+        for agg in aggregates.values():
+            agg.label = f"{agg.members} {agg.type}s (folded)"
+            agg.version = self._stamp(self._shard(agg.id))
+
+        # рёбра свёрнутых узлов переезжают на агрегат, счётчики окна складываются
+        for shard in self._shards:
+            for key, edge in list(shard.edges.items()):
+                source = folded.get(edge.source, edge.source)
+                target = folded.get(edge.target, edge.target)
+                if source == edge.source and target == edge.target:
+                    continue
+                self._remove_edge(key, now)
+                new_key = (source, target, edge.label)
+                new_shard = self._shard(new_key)
+                merged = new_shard.edges.get(new_key)
+                if merged is None:
+                    merged = new_shard.edges[new_key] = EdgeRecord(
+                        source, target, edge.label, edge.last_seen, 0, self.edge_buckets, edge.head)
+                    new_shard.removed.pop(("e", new_key), None)
+                merged.merge(edge)
+                merged.version = self._stamp(new_shard)
+        return len(folded)
+
+    def stats(self) -> dict:
+        return {
+            "node_ttl": self.node_ttl,
+            "edge_window": self.edge_window,
+            "max_nodes": self.max_nodes,
+            "tombstones": sum(len(s.removed) for s in self._shards),
+            "evicted_nodes": self.evicted_nodes,
+            "evicted_edges": self.evicted_edges,
+            "folded_nodes": self.folded_nodes,
+        }
+
+    def clear(self):
+        with ExitStack() as stack:
+            for shard in self._shards:
+                stack.enter_context(shard.lock)
+            for shard in self._shards:
+                shard.nodes.clear()
+                shard.edges.clear()
+                shard.removed.clear()
+            self._cleared_at = next(self._clock)
+            if self.journal is not None:
+                self.journal("c")
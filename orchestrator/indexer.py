@@ -0,0 +1,321 @@
+"""
+Local index of JobManager events.
+
+A background thread follows `JobCreated`, `UpdateSubmitted`,
+`UpdateValidated` and `Paid` logs with `eth_getLogs` over block ranges and
+writes them into SQLite, so job, update and payout queries are answered
+locally instead of calling `jobUpdates(jobId, i)` one index at a time.
+
+Rows of a block range and the new `last_block` are committed in one
+transaction: after a restart indexing resumes from the next block, and a
+half-processed range is simply fetched again. Blocks closer than
+`confirmations` to the head are not indexed yet, which keeps short reorgs
+out of the index. If the chain id or contract address changes (e.g. a
+fresh local node) the index is dropped and rebuilt.
+"""
+
+import logging
+import sqlite3
+import threading
+from typing import Callable, Optional
+
+from web3 import Web3
+
+logger = logging.getLogger("orchestrator.indexer")
+
+EVENT_SIGNATURES = {
+    "JobCreated": "JobCreated(uint256,address,uint256)",
+    "UpdateSubmitted": "UpdateSubmitted(uint256,address,bytes32,uint256)",
+    "UpdateValidated": "UpdateValidated(uint256,address,bytes32,uint256,bool)",
+    "Paid": "Paid(uint256,address,uint256)",
+}
+TOPICS = {"0x" + Web3.keccak(text=sig).hex().removeprefix("0x"): name for name, sig in EVENT_SIGNATURES.items()}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id INTEGER PRIMARY KEY,
+    owner TEXT NOT NULL,
+    deposit TEXT NOT NULL,
+    block INTEGER NOT NULL,
+    tx TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS updates (
+    job_id INTEGER NOT NULL,
+    idx INTEGER NOT NULL,
+    trainer TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    block INTEGER NOT NULL,
+    tx TEXT NOT NULL,
+    valid INTEGER,
+    validated_block INTEGER,
+    PRIMARY KEY (job_id, idx)
+);
+CREATE INDEX IF NOT EXISTS updates_trainer ON updates (trainer, job_id);
+CREATE INDEX IF NOT EXISTS updates_hash ON updates (job_id, hash);
+CREATE TABLE IF NOT EXISTS payments (
+    job_id INTEGER NOT NULL,
+    trainer TEXT NOT NULL,
+    amount TEXT NOT NULL,
+    block INTEGER NOT NULL,
+    tx TEXT NOT NULL,
+    log_index INTEGER NOT NULL,
+    PRIMARY KEY (block, log_index)
+);
+CREATE INDEX IF NOT EXISTS payments_trainer ON payments (trainer, job_id);
+"""
+
+
+def _hex(value) -> str:
+    return "0x" + bytes(value).hex()
+
+
+def _word(data: bytes, i: int) -> bytes:
+    return data[32 * i:32 * (i + 1)]
+
+
+def _address(topic) -> str:
+    return "0x" + bytes(topic)[-20:].hex()
+
+
+def _uint(raw) -> int:
+    return int.from_bytes(bytes(raw), "big")
+
+
+class ChainIndexer:
+    """Follows JobManager logs into SQLite and answers queries from it."""
+
+    def __init__(self, db_path: str, get_web3: Callable, get_chain_id: Callable, address: str,
+                 start_block: int = 0, block_range: int = 2000, confirmations: int = 2,
+                 poll_interval: float = 2.0):
+        self.db_path = db_path
+        self.get_web3 = get_web3
+        self.get_chain_id = get_chain_id
+        self.address = Web3.to_checksum_address(address)
+        self.start_block = start_block
+        self.block_range = block_range
+        self.confirmations = confirmations
+        self.poll_interval = poll_interval
+        # одно соединение на процесс: запись идёт из потока индексатора, чтение — из хендлеров
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.head_block: Optional[int] = None
+        self.last_error: Optional[str] = None
+
+    # --- состояние индекса
+
+    def _meta(self, key: str) -> Optional[str]:
+        row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else None
+
+    def _set_meta(self, key: str, value):
+        self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    @property
+    def last_block(self) -> int:
+        with self._lock:
+            value = self._meta("last_block")
+        return int(value) if value is not None else self.start_block - 1
+
+    def _reset(self, chain_id: int):
+        with self._lock, self._db:
+            for table in ("jobs", "updates", "payments", "meta"):
+                self._db.execute(f"DELETE FROM {table}")
+            self._set_meta("chain_id", chain_id)
+            self._set_meta("contract", self.address.lower())
+        logger.info(f"Index reset for chain {chain_id}, contract {self.address}")
+
+    def _check_identity(self, head: int):
+        chain_id = self.get_chain_id()
+        with self._lock:
+            stored_chain = self._meta("chain_id")
+            stored_contract = self._meta("contract")
+            stored_block = self._meta("last_block")
+        if (stored_chain != str(chain_id) or stored_contract != self.address.lower()
+                or (stored_block is not None and int(stored_block) > head)):
+            self._reset(chain_id)
+
+    # --- обработка логов
+
+    def _apply(self, log: dict):
+        name = TOPICS.get(_hex(log["topics"][0]))
+        if name is None:
+            return
+        topics = log["topics"]
+        data = bytes(log["data"])
+        block = log["blockNumber"]
+        tx = _hex(log["transactionHash"])
+        job_id = _uint(topics[1])
+
+        if name == "JobCreated":
+            self._db.execute(
+                "INSERT OR REPLACE INTO jobs (job_id, owner, deposit, block, tx) VALUES (?, ?, ?, ?, ?)",
+                (job_id, _address(topics[2]), str(_uint(_word(data, 0))), block, tx),
+            )
+        elif name == "UpdateSubmitted":
+            # событие несёт индекс апдейта в jobUpdates — не зависит от того, с какого блока начат индекс
+            self._db.execute(
+                "INSERT OR REPLACE INTO updates (job_id, idx, trainer, hash, block, tx) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, _uint(_word(data, 1)), _address(topics[2]), _hex(_word(data, 0)), block, tx),
+            )
+        elif name == "UpdateValidated":
+            self._db.execute(
+                "UPDATE updates SET valid = ?, validated_block = ? WHERE job_id = ? AND idx = ?",
+                (int(_uint(_word(data, 2)) != 0), block, job_id, _uint(_word(data, 1))),
+            )
+        elif name == "Paid":
+            self._db.execute(
+                "INSERT OR REPLACE INTO payments (job_id, trainer, amount, block, tx, log_index) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, _address(topics[2]), str(_uint(_word(data, 0))), block, tx, log["logIndex"]),
+            )
+
+    def _fetch(self, w3, start: int, end: int) -> list:
+        return w3.eth.get_logs({
+            "fromBlock": start,
+            "toBlock": end,
+            "address": self.address,
+            "topics": [list(TOPICS)],
+        })
+
+    def sync_once(self) -> int:
+        """Index up to the confirmed head; return the number of logs applied."""
+        w3 = self.get_web3()
+        if w3 is None:
+            return 0
+        head = w3.eth.block_number
+        self.head_block = head
+        self._check_identity(head)
+        target = head - self.confirmations
+        applied = 0
+        start = self.last_block + 1
+        step = self.block_range
+        while start <= target and not self._stop.is_set():
+            end = min(start + step - 1, target)
+            try:
+                logs = self._fetch(w3, start, end)
+            except Exception as e:
+                # провайдер ограничивает размер ответа: делим диапазон пополам
+                if step > 1:
+                    step = max(1, step // 2)
+                    logger.debug(f"get_logs {start}-{end} failed ({e}), range -> {step}")
+                    continue
+                raise
+            logs.sort(key=lambda log: (log["blockNumber"], log["logIndex"]))
+            with self._lock, self._db:
+                for log in logs:
+                    self._apply(log)
+                self._set_meta("last_block", end)
+            applied += len(logs)
+            start = end + 1
+            step = min(step * 2, self.block_range)
+        return applied
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                applied = self.sync_once()
+                if applied:
+                    logger.info(f"Indexed {applied} logs up to block {self.last_block}")
+                self.last_error = None
+            except Exception as e:
+                if str(e) != self.last_error:
+                    logger.warning(f"Indexer error: {e}")
+                self.last_error = str(e)
+            self._stop.wait(self.poll_interval)
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="chain-indexer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.poll_interval + 5)
+
+    def close(self):
+        self.stop()
+        self._db.close()
+
+    # --- запросы
+
+    def _rows(self, sql: str, params: tuple = ()) -> list:
+        with self._lock:
+            return [dict(row) for row in self._db.execute(sql, params).fetchall()]
+
+    def status(self) -> dict:
+        jobs = self._rows("SELECT COUNT(*) AS n FROM jobs")[0]["n"]
+        updates = self._rows("SELECT COUNT(*) AS n FROM updates")[0]["n"]
+        return {
+            "running": self._thread is not None and self._thread.is_alive(),
+            "last_block": self.last_block,
+            "head_block": self.head_block,
+            "jobs": jobs,
+            "updates": updates,
+            "error": self.last_error,
+        }
+
+    _JOBS_SQL = (
+        "SELECT j.job_id, j.owner, j.deposit, j.block, COUNT(u.idx) AS updates, "
+        "COALESCE(SUM(u.valid = 1), 0) AS valid, COALESCE(SUM(u.valid IS NULL), 0) AS pending "
+        "FROM jobs j LEFT JOIN updates u ON u.job_id = j.job_id"
+    )
+
+    def jobs(self) -> list:
+        return self._rows(f"{self._JOBS_SQL} GROUP BY j.job_id ORDER BY j.job_id")
+
+    def job(self, job_id: int) -> Optional[dict]:
+        rows = self._rows(f"{self._JOBS_SQL} WHERE j.job_id = ? GROUP BY j.job_id", (job_id,))
+        return rows[0] if rows else None
+
+    def updates(self, job_id: int, trainer: Optional[str] = None, pending: bool = False,
+                offset: int = 0, limit: int = 100) -> list:
+        sql = "SELECT * FROM updates WHERE job_id = ?"
+        params: list = [job_id]
+        if trainer:
+            sql += " AND trainer = ?"
+            params.append(trainer.lower())
+        if pending:
+            sql += " AND valid IS NULL"
+        sql += " ORDER BY idx LIMIT ? OFFSET ?"
+        params += [limit, offset]
+        rows = self._rows(sql, tuple(params))
+        for row in rows:
+            if row["valid"] is not None:
+                row["valid"] = bool(row["valid"])
+        return rows
+
+    def update_indices(self, job_id: int, keys: list) -> dict:
+        """On-chain indices of (hash, trainer) pairs of a job; the earliest unvalidated one wins."""
+        found: dict = {}
+        for row in self._rows(
+            "SELECT idx, hash, trainer, valid FROM updates WHERE job_id = ? AND hash IN "
+            f"({','.join('?' * len(keys))}) ORDER BY valid IS NOT NULL, idx",
+            (job_id, *(h for h, _ in keys)),
+        ):
+            found.setdefault((row["hash"], row["trainer"]), row["idx"])
+        return {key: found[key] for key in keys if key in found}
+
+    def trainer(self, address: str) -> dict:
+        address = address.lower()
+        stats = self._rows(
+            "SELECT COUNT(*) AS updates, SUM(valid = 1) AS valid, SUM(valid = 0) AS invalid "
+            "FROM updates WHERE trainer = ?", (address,)
+        )[0]
+        paid = self._rows("SELECT amount FROM payments WHERE trainer = ?", (address,))
+        return {
+            "trainer": address,
+            "updates": stats["updates"],
+            "valid": stats["valid"] or 0,
+            "invalid": stats["invalid"] or 0,
+            # суммы в wei могут не влезать в INTEGER sqlite, поэтому хранятся строками
+            "paid": str(sum(int(row["amount"]) for row in paid)),
+        }
@@ -0,0 +1,215 @@
+"""
+In-process metrics exposed in the Prometheus text format.
+
+Counters and histograms are plain Python objects updated on the hot path:
+one lock acquisition and, for histograms, a `bisect` over the bucket
+bounds, so an observation costs on the order of a microsecond against
+handlers that take milliseconds (`benchmarks/bench_metrics.py`). Gauges are
+callbacks read only when `/metrics` is scraped, so queue depths and graph
+sizes cost nothing between scrapes.
+
+`MetricsMiddleware` is a bare ASGI middleware (no per-request Starlette
+`Request` objects) that times every HTTP request by its route template.
+"""
+
+import bisect
+import math
+import threading
+import time
+from typing import Callable, Optional
+
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+# секунды: от половины миллисекунды (локальные хэндлеры) до 10 с (RPC к ноде, агрегация)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values: dict = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values) -> float:
+        return self._values.get(label_values, 0)
+
+    def render(self) -> list:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.labels, k)} {_number(v)}" for k, v in items]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # на каждый набор меток: [счётчики по корзинам (+Inf последней), сумма, количество]
+        self._series: dict = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def time(self, *label_values) -> "_Timer":
+        """Context manager observing the wall time of its block."""
+        return _Timer(self, label_values)
+
+    def snapshot(self, *label_values) -> Optional[tuple]:
+        """(count, sum) of one series."""
+        with self._lock:
+            series = self._series.get(label_values)
+            return None if series is None else (series[2], series[1])
+
+    def render(self) -> list:
+        with self._lock:
+            items = sorted((k, (list(s[0]), s[1], s[2])) for k, s in self._series.items())
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (math.inf,), counts):
+                cumulative += n
+                le = 'le="' + _number(float(bound)) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labels, key)} {count}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("histogram", "label_values", "started")
+
+    def __init__(self, histogram: Histogram, label_values: tuple):
+        self.histogram = histogram
+        self.label_values = label_values
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, *self.label_values)
+        return False
+
+
+class Gauge:
+    """Value read at scrape time: `fn()` returns a number or {label values tuple: number}."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, fn: Callable, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.labels = tuple(labels)
+
+    def render(self) -> list:
+        value = self.fn()
+        if value is None:
+            return []
+        if not isinstance(value, dict):
+            return [f"{self.name} {_number(float(value))}"]
+        return [f"{self.name}{_labels(self.labels, k if isinstance(k, tuple) else (k,))} {_number(float(v))}"
+                for k, v in sorted(value.items()) if v is not None]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: list = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labels: tuple = ()) -> Counter:
+        return self.register(Counter(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def gauge(self, name: str, help: str, fn: Callable, labels: tuple = ()) -> Gauge:
+        return self.register(Gauge(name, help, fn, labels))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            try:
+                samples = metric.render()
+            except Exception as e:
+                # сломанный gauge не должен ронять весь scrape
+                lines.append(f"# {metric.name} unavailable: {_escape(e)}")
+                continue
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """Times HTTP requests until the response starts, labelled by method, route template and status."""
+
+    def __init__(self, app, histogram: Histogram):
+        self.app = app
+        self.histogram = histogram
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = [0]
+
+        async def send_timed(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                self._observe(scope, started, status[0])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_timed)
+        finally:
+            if not status[0]:
+                self._observe(scope, started, 500)
+
+    def _observe(self, scope, started: float, status: int):
+        route = scope.get("route")
+        # шаблон маршрута, а не сырой путь: /updates/{update_hash} — одна серия, а не тысячи
+        path = getattr(route, "path", None) or "unmatched"
+        self.histogram.observe(time.perf_counter() - started, scope["method"], path, f"{status // 100}xx")
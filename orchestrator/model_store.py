@@ -0,0 +1,156 @@
+"""
+Versioned store of the global model for distribution to trainers.
+
+The last `keep` versions live in an in-memory LRU; versions pushed out of
+it are spilled to `directory` (up to `keep_on_disk` files) and come back on
+demand. Encoded diffs between versions are cached too, so a round in which
+every trainer moves from version N to N+1 encodes that diff once.
+
+Each store has a random `instance` id that goes into ETags: versions are
+only numbered within one orchestrator run and must not be confused with
+those of a previous run.
+"""
+
+import logging
+import os
+import tempfile
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+from common.model_diff import encode_diff
+
+logger = logging.getLogger("orchestrator.model_store")
+
+
+class ModelStore:
+    def __init__(self, directory: Optional[str] = None, keep: int = 8, keep_on_disk: int = 64,
+                 diff_cache: int = 32):
+        self.directory = directory or tempfile.mkdtemp(prefix="models-")
+        os.makedirs(self.directory, exist_ok=True)
+        self.keep = keep
+        self.keep_on_disk = keep_on_disk
+        self.diff_cache = diff_cache
+        self.instance = uuid.uuid4().hex[:8]
+        # файлы прошлого запуска нумеровались другим экземпляром — они не нужны
+        for name in os.listdir(self.directory):
+            if name.startswith("model.") and name.endswith((".bin", ".tmp")):
+                os.unlink(os.path.join(self.directory, name))
+        self.latest: Optional[int] = None
+        self._memory: "OrderedDict[int, np.ndarray]" = OrderedDict()
+        self._disk: "OrderedDict[int, str]" = OrderedDict()
+        self._diffs: "OrderedDict[tuple, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = {"memory": 0, "disk": 0, "diff_cache": 0, "diff_encoded": 0}
+
+    def etag(self, version: int) -> str:
+        return f'"{self.instance}-{version}"'
+
+    def parse_etag(self, etag: Optional[str]) -> Optional[int]:
+        """Version named by one of our ETags, None for foreign or malformed tags."""
+        if not etag:
+            return None
+        instance, _, version = etag.strip().removeprefix("W/").strip('"').partition("-")
+        if instance != self.instance or not version.isdigit():
+            return None
+        return int(version)
+
+    def path_for(self, version: int) -> str:
+        return os.path.join(self.directory, f"model.{version:08d}.bin")
+
+    def publish(self, version: int, params: np.ndarray):
+        """Register `params` (owned by the store from now on) as `version`."""
+        params.flags.writeable = False
+        with self._lock:
+            if version in self._memory:
+                return
+            self._memory[version] = params
+            if self.latest is None or version > self.latest:
+                self.latest = version
+            spill = self._evict_locked()
+        for old, values in spill:
+            self._spill(old, values)
+
+    def _evict_locked(self) -> list:
+        # версии, которых ещё нет на диске, надо сбросить туда вне блокировки
+        spill = []
+        while len(self._memory) > self.keep:
+            old, values = self._memory.popitem(last=False)
+            if old not in self._disk:
+                spill.append((old, values))
+        return spill
+
+    def _spill(self, version: int, values: np.ndarray):
+        path = self.path_for(version)
+        tmp = path + ".tmp"
+        values.tofile(tmp)
+        os.replace(tmp, path)
+        drop = []
+        with self._lock:
+            self._disk[version] = path
+            while len(self._disk) > self.keep_on_disk:
+                drop.append(self._disk.popitem(last=False)[1])
+        for old in drop:
+            try:
+                os.unlink(old)
+            except FileNotFoundError:
+                pass
+
+    def get(self, version: int) -> Optional[np.ndarray]:
+        """Parameters of `version` (read-only), from memory or disk; None if not retained."""
+        with self._lock:
+            params = self._memory.get(version)
+            if params is not None:
+                self._memory.move_to_end(version)
+                self.hits["memory"] += 1
+                return params
+            path = self._disk.get(version)
+        if path is None:
+            return None
+        try:
+            params = np.fromfile(path, dtype=np.float32)
+        except FileNotFoundError:
+            return None
+        params.flags.writeable = False
+        with self._lock:
+            self.hits["disk"] += 1
+            self._memory[version] = params
+            # поднятая с диска версия вытесняет самую давно не читанную из памяти
+            spill = self._evict_locked()
+        for old, values in spill:
+            self._spill(old, values)
+        return params
+
+    def diff(self, base: int, target: int) -> Optional[bytes]:
+        """Encoded diff from `base` to `target`, None if either version is gone."""
+        key = (base, target)
+        with self._lock:
+            payload = self._diffs.get(key)
+            if payload is not None:
+                self._diffs.move_to_end(key)
+                self.hits["diff_cache"] += 1
+                return payload
+        base_params, target_params = self.get(base), self.get(target)
+        if base_params is None or target_params is None or base_params.size != target_params.size:
+            return None
+        payload = encode_diff(base_params, target_params, base, target)
+        with self._lock:
+            self.hits["diff_encoded"] += 1
+            self._diffs[key] = payload
+            while len(self._diffs) > self.diff_cache:
+                self._diffs.popitem(last=False)
+        return payload
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "instance": self.instance,
+                "latest": self.latest,
+                "memory_versions": sorted(self._memory),
+                "disk_versions": len(self._disk),
+                "cached_diffs": len(self._diffs),
+                "hits": dict(self.hits),
+            }
@@ -2,6 +2,7 @@
 Orchestrator API for distributed training coordination.
 """
 
+import asyncio
 import json
 import logging
 import os
@@ -11,10 +12,33 @@ import time
 from datetime import datetime
 from typing import Optional
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import FileResponse, JSONResponse, ORJSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
 from web3 import Web3
+from web3.logs import DISCARD
+
+from orchestrator.aggregation import AGGREGATION_RULES, AsyncAggregator, EpochAggregator
+from common.delta_format import CONTENT_TYPE as COMPRESSED_DELTA_TYPE
+from common.delta_format import DeltaFormatError, decode_into, read_header
+from common.merkle import DEFAULT_CHUNK_SIZE
+from common.model_diff import CONTENT_TYPE as MODEL_DIFF_TYPE
+from orchestrator.batching import Batcher
+from orchestrator.chain import ChainClient
+from orchestrator.events import GraphBroadcaster
+from orchestrator.fleet import SIMULATED_TRAINERS, SIMULATED_VALIDATORS
+from orchestrator.graph import GraphStore
+from orchestrator.indexer import ChainIndexer
+from orchestrator.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE
+from orchestrator.metrics import MetricsMiddleware, Registry
+from orchestrator.model_store import ModelStore
+from orchestrator.scheduler import ShardScheduler
+from orchestrator.state import StateLog
+from orchestrator.update_store import StoredUpdate, UpdateStore
+from orchestrator.uploads import ChunkedUpload, DeltaUpload, UploadError, parse_hash, raw_delta
+from orchestrator.wire import GRAPH_CONTENT_TYPE, accepts_columns, encode_graph
 
 # логгирование
 logging.basicConfig(
@@ -30,11 +54,106 @@ DEFAULT_JOB_MANAGER_ADDRESS = "0x5fbdb2315678afecb367f032d93f642f64180aa3"
 CONTRACT_ADDRESS = os.environ.get("JOB_MANAGER_ADDRESS", DEFAULT_JOB_MANAGER_ADDRESS)
 SIMULATION_ENABLED = os.environ.get("SIMULATION_ENABLED", "true").lower() == "true"
 SIMULATION_INTERVAL = float(os.environ.get("SIMULATION_INTERVAL", "3"))
+AGGREGATION_RULE = os.environ.get("AGGREGATION_RULE", "trimmed_mean")
+AGGREGATION_TRIM = int(os.environ.get("AGGREGATION_TRIM", "1"))
+AGGREGATION_WORKERS = int(os.environ.get("AGGREGATION_WORKERS", "4"))
+AGGREGATION_MODE = os.environ.get("AGGREGATION_MODE", "sync").lower()
+# sync: эпоха агрегации закрывается не позже чем через столько секунд после первой дельты (0 — без таймера)
+AGGREGATION_EPOCH_SECONDS = float(os.environ.get("AGGREGATION_EPOCH_SECONDS", "60"))
+ASYNC_MAX_STALENESS = int(os.environ.get("ASYNC_MAX_STALENESS", "4"))
+ASYNC_STALENESS_ALPHA = float(os.environ.get("ASYNC_STALENESS_ALPHA", "0.5"))
+ASYNC_MIXING = float(os.environ.get("ASYNC_MIXING", "0.5"))
+UPLOAD_MAX_BYTES = int(os.environ.get("UPLOAD_MAX_BYTES", str(1 << 30)))
+# Число параметров модели; 0 — ширину задаёт первая дельта, но не больше UPLOAD_MAX_BYTES / 4
+MODEL_PARAMS = int(os.environ.get("MODEL_PARAMS", "0"))
+UPLOAD_MEMORY_LIMIT = int(os.environ.get("UPLOAD_MEMORY_LIMIT", str(64 << 20)))
+UPLOAD_SPOOL_DIR = os.environ.get("UPLOAD_SPOOL_DIR") or None
+# столько байт тела копится перед одной передачей в пул потоков на хэширование и запись
+UPLOAD_WRITE_BATCH = 1 << 20
+UPDATE_STORE_DIR = os.environ.get("UPDATE_STORE_DIR") or None
+UPDATE_STORE_MAX = int(os.environ.get("UPDATE_STORE_MAX", "256"))
+MODEL_STORE_DIR = os.environ.get("MODEL_STORE_DIR") or None
+MODEL_CACHE_VERSIONS = int(os.environ.get("MODEL_CACHE_VERSIONS", "8"))
+MODEL_DISK_VERSIONS = int(os.environ.get("MODEL_DISK_VERSIONS", "64"))
+UPLOAD_SESSION_TTL = float(os.environ.get("UPLOAD_SESSION_TTL", "600"))
+EVENTS_TICK = float(os.environ.get("EVENTS_TICK", "0.25"))
+WEB3_POOL_SIZE = int(os.environ.get("WEB3_POOL_SIZE", "32"))
+WEB3_STATUS_TTL = float(os.environ.get("WEB3_STATUS_TTL", "5"))
+# Дедлайн одного RPC-вызова из хэндлера (вместе с ожиданием слота) и число одновременных вызовов к ноде
+WEB3_TIMEOUT = float(os.environ.get("WEB3_TIMEOUT", "3"))
+WEB3_MAX_CONCURRENCY = int(os.environ.get("WEB3_MAX_CONCURRENCY", "32"))
+SUBMIT_UPDATE_GAS = int(os.environ.get("SUBMIT_UPDATE_GAS", "500000"))
+# Пакетная отправка в контракт от имени оператора задания (см. JobManager.setOperator)
+ORCHESTRATOR_ADDRESS = os.environ.get("ORCHESTRATOR_ADDRESS", "")
+ORCHESTRATOR_PRIVATE_KEY = os.environ.get("ORCHESTRATOR_PRIVATE_KEY", "")
+CHAIN_BATCH_SIZE = int(os.environ.get("CHAIN_BATCH_SIZE", "32"))
+CHAIN_BATCH_DELAY = float(os.environ.get("CHAIN_BATCH_DELAY", "2"))
+# Сколько раз пакет отправляется заново после ошибки отправки или отката транзакции
+CHAIN_BATCH_ATTEMPTS = int(os.environ.get("CHAIN_BATCH_ATTEMPTS", "5"))
+BATCH_GAS_BASE = int(os.environ.get("BATCH_GAS_BASE", "80000"))
+BATCH_GAS_PER_ITEM = int(os.environ.get("BATCH_GAS_PER_ITEM", "60000"))
+# Сколько поток пакетов ждёт квитанцию транзакции (индексы апдейтов, проверка status)
+CHAIN_RECEIPT_TIMEOUT = float(os.environ.get("CHAIN_RECEIPT_TIMEOUT", "30"))
+# Индексатор событий контракта (SQLite, продолжает с последнего блока после рестарта)
+INDEXER_ENABLED = os.environ.get("INDEXER_ENABLED", "true").lower() == "true"
+INDEXER_DB = os.environ.get("INDEXER_DB", "chain_index.sqlite")
+INDEXER_START_BLOCK = int(os.environ.get("INDEXER_START_BLOCK", "0"))
+INDEXER_BLOCK_RANGE = int(os.environ.get("INDEXER_BLOCK_RANGE", "2000"))
+INDEXER_CONFIRMATIONS = int(os.environ.get("INDEXER_CONFIRMATIONS", "0"))
+INDEXER_POLL = float(os.environ.get("INDEXER_POLL", "2"))
+# Журнал состояния (граф, job_state, pending_tasks): WAL + снапшоты, пустой STATE_DIR отключает
+STATE_DIR = os.environ.get("STATE_DIR", "orchestrator_state")
+STATE_FLUSH_INTERVAL = float(os.environ.get("STATE_FLUSH_INTERVAL", "0.05"))
+STATE_SNAPSHOT_EVERY = int(os.environ.get("STATE_SNAPSHOT_EVERY", "50000"))
+STATE_FSYNC = os.environ.get("STATE_FSYNC", "false").lower() == "true"
+# Планировщик: эпоха = SCHED_SHARDS шардов по SCHED_SHARD_BATCHES батчей, аренды с дедлайнами
+SCHED_SHARDS = int(os.environ.get("SCHED_SHARDS", "16"))
+SCHED_SHARD_BATCHES = int(os.environ.get("SCHED_SHARD_BATCHES", "100"))
+SCHED_TARGET_SECONDS = float(os.environ.get("SCHED_TARGET_SECONDS", "10"))
+SCHED_DEFAULT_STEPS = int(os.environ.get("SCHED_DEFAULT_STEPS", "10"))
+SCHED_MAX_STEPS = int(os.environ.get("SCHED_MAX_STEPS", "1000"))
+SCHED_LEASE_TIMEOUT = float(os.environ.get("SCHED_LEASE_TIMEOUT", "30"))
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "true").lower() == "true"
+# Ограничение графа: TTL узлов, окно счётчиков рёбер, свёртка тренеров в агрегат сверх лимита (0 — выключено)
+GRAPH_NODE_TTL = float(os.environ.get("GRAPH_NODE_TTL", "900"))
+GRAPH_EDGE_WINDOW = float(os.environ.get("GRAPH_EDGE_WINDOW", "300"))
+GRAPH_EDGE_BUCKETS = int(os.environ.get("GRAPH_EDGE_BUCKETS", "10"))
+GRAPH_MAX_NODES = int(os.environ.get("GRAPH_MAX_NODES", "500"))
+GRAPH_RETENTION_INTERVAL = float(os.environ.get("GRAPH_RETENTION_INTERVAL", "5"))
+
+# Метрики: счётчики и гистограммы пишутся на горячем пути, gauges читаются только при scrape
+metrics = Registry()
+HTTP_SECONDS = metrics.histogram(
+    "orchestrator_http_request_duration_seconds", "HTTP handler latency until the response starts",
+    ("method", "route", "status"))
+RPC_SECONDS = metrics.histogram(
+    "orchestrator_web3_rpc_duration_seconds", "Web3 JSON-RPC call latency", ("method", "outcome"))
+AGGREGATION_SECONDS = metrics.histogram(
+    "orchestrator_aggregation_duration_seconds", "Epoch aggregation time", ("rule",))
+CHAIN_BATCH_SECONDS = metrics.histogram(
+    "orchestrator_chain_batch_duration_seconds", "Build, sign and send of one batched transaction", ("batcher",))
+GRAPH_RENDER_SECONDS = metrics.histogram(
+    "orchestrator_graph_render_seconds", "Graph diff and serialization time", ("kind", "format"))
+VALIDATION_LATENCY = metrics.histogram(
+    "orchestrator_validation_latency_seconds", "Time from delta upload to validator verdict",
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600))
+VALIDATIONS = metrics.counter("orchestrator_validations_total", "Validator verdicts received", ("valid",))
+UPLOADS = metrics.counter("orchestrator_uploads_total", "Delta uploads by outcome", ("outcome",))
+UPLOAD_BYTES = metrics.counter("orchestrator_upload_bytes_total", "Delta payload bytes accepted", ("compression",))
+MODEL_RESPONSES = metrics.counter(
+    "orchestrator_model_responses_total", "Global model responses (full, diff, range, not_modified)", ("kind",))
+MODEL_BYTES = metrics.counter("orchestrator_model_bytes_total", "Global model bytes served", ("kind",))
 
 # Стейты
-_web3: Optional[Web3] = None
+chain = ChainClient(
+    WEB3_PROVIDER_URL, timeout=WEB3_TIMEOUT, pool_size=WEB3_POOL_SIZE, status_ttl=WEB3_STATUS_TTL,
+    max_concurrency=WEB3_MAX_CONCURRENCY,
+    on_rpc=lambda method, seconds, ok: RPC_SECONDS.observe(seconds, method, "ok" if ok else "error"),
+)
+_web3_was_connected: Optional[bool] = None
 _contract = None
 _abi = None
+_abi_loaded = False
 
 
 def _load_abi() -> Optional[list]:
@@ -58,46 +177,261 @@ def _load_abi() -> Optional[list]:
     return None
 
 
+def _note_connectivity(connected: bool):
+    global _web3_was_connected
+    if connected != _web3_was_connected:
+        if connected:
+            logger.info(f"Web3 connected: {WEB3_PROVIDER_URL}")
+        else:
+            logger.warning("Web3 not connected")
+        _web3_was_connected = connected
+
+
 def get_web3() -> Optional[Web3]:
-    """Get or create Web3 instance (lazy)."""
-    global _web3
-    if _web3 is None:
-        try:
-            _web3 = Web3(Web3.HTTPProvider(WEB3_PROVIDER_URL, request_kwargs={"timeout": 3}))
-            if _web3.is_connected():
-                logger.info(f"Web3 connected: {WEB3_PROVIDER_URL}")
-            else:
-                logger.warning("Web3 not connected")
-                _web3 = None
-        except Exception as e:
-            logger.warning(f"Web3 init error: {e}")
-            _web3 = None
-    return _web3
+    """Shared Web3 instance if the node is reachable (connectivity is TTL-cached).
+
+    Blocking; for background threads. Handlers use `web3_connected()`.
+    """
+    connected = chain.is_connected()
+    _note_connectivity(connected)
+    return chain.w3 if connected else None
+
+
+async def web3_connected() -> bool:
+    """Cached connectivity for async handlers; a slow node counts as disconnected."""
+    connected = await chain.is_connected_async()
+    _note_connectivity(connected)
+    return connected
+
+
+def _init_contract():
+    """Create the contract object (no RPC involved) once connectivity is known."""
+    global _contract, _abi, _abi_loaded
+    if not _abi_loaded:
+        # отсутствие ABI тоже запоминаем, чтобы не читать диск на каждый запрос
+        _abi = _load_abi()
+        _abi_loaded = True
+    if _abi is None:
+        return None
+    try:
+        checksum = Web3.to_checksum_address(CONTRACT_ADDRESS)
+        _contract = chain.w3.eth.contract(address=checksum, abi=_abi)
+        logger.info(f"Contract initialized: {checksum}")
+    except Exception as e:
+        logger.warning(f"Contract init error: {e}")
+    return _contract
 
 
 def get_contract():
     """Get or create contract instance (lazy)."""
-    global _contract, _abi
-    if _contract is None:
-        w3 = get_web3()
-        if w3 is None:
-            return None
-        if _abi is None:
-            _abi = _load_abi()
-        if _abi is None:
-            return None
+    if _contract is None and get_web3() is not None:
+        _init_contract()
+    return _contract
+
+
+async def get_contract_async():
+    """`get_contract` for async handlers."""
+    if _contract is None and await web3_connected():
+        # пока ждали ноду, контракт мог создать другой запрос
+        if _contract is None:
+            _init_contract()
+    return _contract
+
+
+def _send_signed(tx: dict, what: str):
+    """Sign `tx` with the operator key, send it and wait for its receipt.
+
+    Raises if sending fails or the transaction reverts, so the batcher
+    retries the batch. Returns None if no receipt arrived within
+    CHAIN_RECEIPT_TIMEOUT: the transaction may still be mined, so it is not
+    sent again.
+    """
+    try:
+        signed = chain.w3.eth.account.sign_transaction(tx, ORCHESTRATOR_PRIVATE_KEY)
+        tx_hash = chain.w3.eth.send_raw_transaction(signed.raw_transaction)
+    except Exception:
+        chain.nonces.resync(tx.get("from"))
+        raise
+    try:
+        receipt = chain.w3.eth.wait_for_transaction_receipt(tx_hash, timeout=CHAIN_RECEIPT_TIMEOUT)
+    except Exception as e:
+        # индексы апдейтов потом подтянутся из индексатора
+        logger.warning(f"No receipt for {what} {tx_hash.hex()[:18]}... (nonce {tx.get('nonce')}): {e}")
+        return None
+    if receipt["status"] != 1:
+        raise RuntimeError(f"{what} {tx_hash.hex()[:18]}... reverted (nonce {tx.get('nonce')})")
+    return receipt
+
+
+def _flush_updates(job_id: int, items: list):
+    with CHAIN_BATCH_SECONDS.time("updates"):
+        _send_update_batch(job_id, items)
+
+
+def _send_update_batch(job_id: int, items: list):
+    contract = get_contract()
+    if contract is None:
+        raise RuntimeError("contract not ready")
+    trainers = [trainer for trainer, _ in items]
+    hashes = [update_hash for _, update_hash in items]
+    tx = chain.build_transaction(
+        contract.functions.submitUpdatesFor(job_id, trainers, hashes),
+        Web3.to_checksum_address(ORCHESTRATOR_ADDRESS),
+        gas=BATCH_GAS_BASE + BATCH_GAS_PER_ITEM * len(items),
+    )
+    receipt = _send_signed(tx, "update batch")
+    _record_edge(ORCHESTRATOR_ID, CONTRACT_ID, "submit_batch")
+    logger.info(f"Update batch for job {job_id}: {len(items)} updates, "
+                f"{'mined' if receipt else 'sent'} (nonce {tx.get('nonce')})")
+    if receipt is not None:
+        # индексы апдейтов в jobUpdates — из событий UpdateSubmitted квитанции
+        for event in contract.events.UpdateSubmitted().process_receipt(receipt, errors=DISCARD):
+            update_store.set_index(bytes(event["args"]["updateHash"]).hex(), event["args"]["index"])
+
+
+def _resolve_chain_indices(job_id: int, updates: list):
+    """Fill in missing on-chain indices (e.g. of trainer-sent submitUpdate) from the indexer."""
+    missing = [u for u in updates if u.index is None]
+    if indexer is None or not missing:
+        return
+    keys = {("0x" + u.root, u.trainer): u for u in missing}
+    for key, index in indexer.update_indices(job_id, list(keys)).items():
+        keys[key].index = index
+
+
+def _flush_validations(job_id: int, items: list):
+    with CHAIN_BATCH_SECONDS.time("validations"):
+        _send_validation_batch(job_id, items)
+
+
+def _send_validation_batch(job_id: int, items: list):
+    contract = get_contract()
+    if contract is None:
+        raise RuntimeError("contract not ready")
+    indices = [index for index, _ in items]
+    verdicts = [valid for _, valid in items]
+    tx = chain.build_transaction(
+        contract.functions.validateUpdates(job_id, indices, verdicts),
+        Web3.to_checksum_address(ORCHESTRATOR_ADDRESS),
+        gas=BATCH_GAS_BASE + BATCH_GAS_PER_ITEM * len(items),
+    )
+    receipt = _send_signed(tx, "validation batch")
+    _record_edge(ORCHESTRATOR_ID, CONTRACT_ID, "validate_batch")
+    logger.info(f"Validation batch for job {job_id}: {len(items)} results, "
+                f"{'mined' if receipt else 'sent'} (nonce {tx.get('nonce')})")
+
+
+# без ключа оператора пакет некому подписать — отчёты не копятся, а идут прежним путём
+BATCHING_ENABLED = bool(ORCHESTRATOR_ADDRESS) and bool(ORCHESTRATOR_PRIVATE_KEY) and CHAIN_BATCH_SIZE > 1
+if ORCHESTRATOR_ADDRESS and not ORCHESTRATOR_PRIVATE_KEY:
+    logger.warning("ORCHESTRATOR_ADDRESS is set without ORCHESTRATOR_PRIVATE_KEY, chain batching disabled")
+update_batcher = Batcher("updates", _flush_updates, max_size=CHAIN_BATCH_SIZE, max_delay=CHAIN_BATCH_DELAY,
+                         max_attempts=CHAIN_BATCH_ATTEMPTS)
+validation_batcher = Batcher("validations", _flush_validations, max_size=CHAIN_BATCH_SIZE,
+                             max_delay=CHAIN_BATCH_DELAY, max_attempts=CHAIN_BATCH_ATTEMPTS)
+
+# Локальный индекс событий JobManager
+indexer: Optional[ChainIndexer] = None
+if INDEXER_ENABLED:
+    indexer = ChainIndexer(
+        INDEXER_DB,
+        get_web3,
+        chain.chain_id,
+        CONTRACT_ADDRESS,
+        start_block=INDEXER_START_BLOCK,
+        block_range=INDEXER_BLOCK_RANGE,
+        confirmations=INDEXER_CONFIRMATIONS,
+        poll_interval=INDEXER_POLL,
+    )
+
+
+# Агрегатор дельт текущей эпохи
+if AGGREGATION_RULE not in AGGREGATION_RULES:
+    logger.warning(f"Unknown AGGREGATION_RULE={AGGREGATION_RULE}, falling back to mean")
+    AGGREGATION_RULE = "mean"
+if AGGREGATION_MODE == "async":
+    # дельты применяются по мере прихода, эпохального барьера нет
+    aggregator = AsyncAggregator(max_staleness=ASYNC_MAX_STALENESS, alpha=ASYNC_STALENESS_ALPHA,
+                                 mixing=ASYNC_MIXING, n_params=MODEL_PARAMS or None,
+                                 max_params=UPLOAD_MAX_BYTES // 4)
+else:
+    if AGGREGATION_MODE != "sync":
+        logger.warning(f"Unknown AGGREGATION_MODE={AGGREGATION_MODE}, falling back to sync")
+        AGGREGATION_MODE = "sync"
+    aggregator = EpochAggregator(rule=AGGREGATION_RULE, trim=AGGREGATION_TRIM, workers=AGGREGATION_WORKERS,
+                                 n_params=MODEL_PARAMS or None, max_params=UPLOAD_MAX_BYTES // 4)
+last_aggregation: Optional[dict] = None
+
+# Раздача глобальной модели по версиям: LRU в памяти, старые версии на диске
+model_store = ModelStore(MODEL_STORE_DIR, keep=MODEL_CACHE_VERSIONS, keep_on_disk=MODEL_DISK_VERSIONS)
+
+
+def _current_model_version() -> Optional[int]:
+    """Latest aggregated version, published to the model store on first request."""
+    if model_store.latest != aggregator.version:
+        # копия параметров снимается один раз на версию, а не на каждый запрос
+        version, params = aggregator.snapshot()
+        if params is not None:
+            model_store.publish(version, params)
+    return model_store.latest
+
+
+def _run_aggregation() -> Optional[dict]:
+    """Aggregate collected deltas of the epoch, if any."""
+    global last_aggregation
+    result = aggregator.aggregate()
+    if result is not None:
+        last_aggregation = result
+        AGGREGATION_SECONDS.observe(result["duration_ms"] / 1000, result["rule"])
+    return result
+
+
+def _aggregate_epoch(reason: str) -> Optional[dict]:
+    """Close the sync aggregation epoch: aggregate its deltas into a new model version."""
+    result = _run_aggregation()
+    if result is not None:
+        _record_edge(ORCHESTRATOR_ID, CONTRACT_ID, "submit_aggregated")
+        _bump("aggregations_done")
+        logger.info(f"Aggregation epoch closed ({reason}): {result['n_deltas']} deltas -> v{result['version']}")
+    return result
+
+
+# sync-агрегация идёт в своём потоке: по таймеру эпохи или по сигналу конца эпохи
+_aggregation_wake = threading.Event()
+_aggregation_stop = threading.Event()
+
+
+def _aggregation_loop():
+    opened = None
+    while not _aggregation_stop.is_set():
+        woken = _aggregation_wake.wait(1.0)
+        _aggregation_wake.clear()
+        if _aggregation_stop.is_set():
+            return
         try:
-            checksum = Web3.to_checksum_address(CONTRACT_ADDRESS)
-            _contract = w3.eth.contract(address=checksum, abi=_abi)
-            logger.info(f"Contract initialized: {checksum}")
+            if not aggregator.pending:
+                opened = None
+                continue
+            now = time.monotonic()
+            opened = opened or now
+            if woken:
+                _aggregate_epoch("epoch done")
+            elif AGGREGATION_EPOCH_SECONDS > 0 and now - opened >= AGGREGATION_EPOCH_SECONDS:
+                _aggregate_epoch(f"{AGGREGATION_EPOCH_SECONDS:g} s timer")
+            else:
+                continue
+            opened = None
         except Exception as e:
-            logger.warning(f"Contract init error: {e}")
-    return _contract
+            logger.error(f"Aggregation error: {e}")
 
 
 # инициализация графа
-graph_nodes: dict = {}
-graph_edges: dict = {}
+graph = GraphStore(
+    node_ttl=GRAPH_NODE_TTL or None,
+    edge_window=GRAPH_EDGE_WINDOW or None,
+    edge_buckets=GRAPH_EDGE_BUCKETS,
+    max_nodes=GRAPH_MAX_NODES or None,
+)
 
 ORCHESTRATOR_ID = "orchestrator"
 CONTRACT_ID = "contract"
@@ -105,30 +439,110 @@ CONTRACT_ID = "contract"
 # стетйы
 simulation_running = False
 simulation_thread: Optional[threading.Thread] = None
-
-# Симуляция воркеров
-SIMULATED_TRAINERS = [
-    {"address": "0x70997970C51812dc3A010C7d01b50e0d17dc79C8", "name": "Trainer-Alpha"},
-    {"address": "0x3C44CdDdB6a900fa2b585dd299e03d12FA4293BC", "name": "Trainer-Beta"},
-    {"address": "0x90F79bf6EB2c4f870365E785982E1f101E93b906", "name": "Trainer-Gamma"},
-    {"address": "0x15d34AAf54267DB7D7c367839AAf71A00a2C6A65", "name": "Trainer-Delta"},
-    {"address": "0x9965507D1a55bcC2695C58ba16FB37d819B0A4dc", "name": "Trainer-Epsilon"},
-]
-
-SIMULATED_VALIDATORS = [
-    {"address": "0x976EA74026E726554dB657fA54763abd0C3a0aa9", "name": "Validator-Prime"},
-    {"address": "0x14dC79964da2C08b23698B3D3cc7Ca32193d9955", "name": "Validator-Secondary"},
-    {"address": "0x23618e81E3f5cdF7f54C3d65f7FBc0aBf5B21E8f", "name": "Validator-Tertiary"},
-]
+_retention_stop = threading.Event()
 
 # стетйы для тренировки
-job_state = {
-    "current_epoch": 0,
-    "total_epochs": 100,
-    "updates_submitted": 0,
-    "validations_completed": 0,
-    "aggregations_done": 0,
-}
+def _default_job_state() -> dict:
+    return {
+        "current_epoch": 0,
+        "total_epochs": 100,
+        "updates_submitted": 0,
+        "validations_completed": 0,
+        "aggregations_done": 0,
+    }
+
+
+job_state = _default_job_state()
+pending_tasks: dict = {}
+_state_lock = threading.Lock()
+
+
+def _bump(key: str) -> int:
+    """Increment a job_state counter and journal its new value."""
+    with _state_lock:
+        job_state[key] += 1
+        value = job_state[key]
+        if state_log is not None:
+            state_log.append("j", key, value)
+    return value
+
+
+# Планировщик аренд шардов, по одному на задание
+schedulers: dict = {}
+_schedulers_lock = threading.Lock()
+
+
+def _scheduler_for(job_id: int) -> ShardScheduler:
+    scheduler = schedulers.get(job_id)
+    if scheduler is None:
+        with _schedulers_lock:
+            scheduler = schedulers.get(job_id)
+            if scheduler is None:
+                scheduler = schedulers[job_id] = ShardScheduler(
+                    n_shards=SCHED_SHARDS,
+                    shard_batches=SCHED_SHARD_BATCHES,
+                    target_seconds=SCHED_TARGET_SECONDS,
+                    default_steps=SCHED_DEFAULT_STEPS,
+                    max_steps=SCHED_MAX_STEPS,
+                    lease_timeout=SCHED_LEASE_TIMEOUT,
+                )
+    return scheduler
+
+
+def _set_task(trainer: str, task: dict):
+    with _state_lock:
+        pending_tasks[trainer] = task
+        if state_log is not None:
+            state_log.append("t", trainer, task)
+
+
+def _apply_record(record: list):
+    op = record[0]
+    if op == "n":
+        graph.restore_node(*record[1:])
+    elif op == "e":
+        graph.restore_edge(*record[1:])
+    elif op == "c":
+        graph.clear()
+    elif op == "j":
+        job_state[record[1]] = record[2]
+    elif op == "J":
+        job_state.clear()
+        job_state.update(record[1])
+    elif op == "t":
+        pending_tasks[record[1]] = record[2]
+
+
+def _load_snapshot(state: dict):
+    for node in state["graph"]["nodes"]:
+        graph.restore_node(*node)
+    for edge in state["graph"]["edges"]:
+        graph.restore_edge(*edge)
+    job_state.update(state["job_state"])
+    pending_tasks.update(state["pending_tasks"])
+
+
+def _state_snapshot() -> dict:
+    with _state_lock:
+        jobs = dict(job_state)
+        tasks = dict(pending_tasks)
+    return {"graph": graph.dump(), "job_state": jobs, "pending_tasks": tasks}
+
+
+# Восстановление: снапшот + хвост журнала, затем все изменения журналируются
+state_log: Optional[StateLog] = None
+if STATE_DIR:
+    state_log = StateLog(
+        STATE_DIR,
+        flush_interval=STATE_FLUSH_INTERVAL,
+        snapshot_every=STATE_SNAPSHOT_EVERY,
+        fsync=STATE_FSYNC,
+    )
+    state_log.recover(_apply_record, _load_snapshot)
+    # вытеснение и свёртка не журналируются — выводим их заново по восстановленным отметкам времени
+    graph.expire()
+    graph.journal = state_log.append
+
 
 
 def _now_iso() -> str:
@@ -143,39 +557,20 @@ def _short_addr(value: str) -> str:
 
 
 def _ensure_node(node_id: str, label: str, node_type: str):
-    if node_id not in graph_nodes:
-        graph_nodes[node_id] = {
-            "id": node_id,
-            "label": label,
-            "type": node_type,
-            "last_seen": _now_iso(),
-            "status": "active",
-        }
-    else:
-        graph_nodes[node_id]["last_seen"] = _now_iso()
+    graph.ensure_node(node_id, label, node_type)
 
 
 def _update_node_status(node_id: str, status: str):
-    if node_id in graph_nodes:
-        graph_nodes[node_id]["status"] = status
-        graph_nodes[node_id]["last_seen"] = _now_iso()
+    graph.update_status(node_id, status)
 
 
 def _record_edge(source: str, target: str, label: str):
-    key = f"{source}|{target}|{label}"
-    if key not in graph_edges:
-        graph_edges[key] = {
-            "id": key,
-            "source": source,
-            "target": target,
-            "label": label,
-            "count": 1,
-            "last_seen": _now_iso(),
-        }
-    else:
-        graph_edges[key]["count"] += 1
-        graph_edges[key]["last_seen"] = _now_iso()
+    graph.record_edge(source, target, label)
+
 
+# Push-канал для дашбордов: один кадр на тик вместо опроса /graph
+broadcaster = GraphBroadcaster(graph, lambda: job_state, _now_iso, tick=EVENTS_TICK,
+                               on_frame=lambda seconds: GRAPH_RENDER_SECONDS.observe(seconds, "sse", "json"))
 
 _ensure_node(ORCHESTRATOR_ID, "Orchestrator", "orchestrator")
 _ensure_node(
@@ -189,8 +584,7 @@ def _simulate_training_round():
     """Simulate one round of distributed training."""
     global job_state
     
-    job_state["current_epoch"] += 1
-    epoch = job_state["current_epoch"]
+    epoch = _bump("current_epoch")
     
     # выборка рандомного активного тренера
     active_trainers = random.sample(SIMULATED_TRAINERS, k=random.randint(2, min(4, len(SIMULATED_TRAINERS))))
@@ -219,8 +613,14 @@ def _simulate_training_round():
         trainer_id = f"trainer:{trainer['address'].lower()}"
         
         _record_edge(trainer_id, ORCHESTRATOR_ID, "submit_update")
-        _update_node_status(trainer_id, "submitted")
-        job_state["updates_submitted"] += 1
+        _bump("updates_submitted")
+        if AGGREGATION_MODE == "async":
+            # в async-режиме дельта применяется сразу, тренер не ждёт остальных
+            _record_edge(ORCHESTRATOR_ID, trainer_id, "model_version")
+            _update_node_status(trainer_id, "idle")
+            time.sleep(random.uniform(0.05, 0.2))
+        else:
+            _update_node_status(trainer_id, "submitted")
     
     time.sleep(0.3)
     
@@ -234,13 +634,14 @@ def _simulate_training_round():
         # Валидатор валидирует
         _record_edge(validator_id, ORCHESTRATOR_ID, "validate_update")
         _update_node_status(validator_id, "validating")
-        job_state["validations_completed"] += 1
+        _bump("validations_completed")
     
     time.sleep(0.3)
     
-    # Оркестратор публикует контракт
+    # Оркестратор «агрегирует» и публикует в контракт — только картинка: настоящие дельты
+    # агрегирует _aggregation_loop, симуляция их не трогает
     _record_edge(ORCHESTRATOR_ID, CONTRACT_ID, "submit_aggregated")
-    job_state["aggregations_done"] += 1
+    _bump("aggregations_done")
     
     # Контракт возвращается, да я знаю что не так как надо но сойдёт
     if random.random() > 0.3:
@@ -275,6 +676,18 @@ def _simulation_loop():
     logger.info("Simulation loop stopped")
 
 
+def _graph_retention_loop():
+    while not _retention_stop.wait(GRAPH_RETENTION_INTERVAL):
+        try:
+            result = graph.expire()
+        except Exception as e:
+            logger.error(f"Graph retention error: {e}")
+            continue
+        if any(result.values()):
+            logger.info(f"Graph retention: {result['evicted_nodes']} nodes and {result['evicted_edges']} edges "
+                        f"evicted, {result['folded_nodes']} nodes folded")
+
+
 def start_simulation():
     global simulation_running, simulation_thread
     
@@ -300,21 +713,41 @@ class TaskRequest(BaseModel):
     trainer: str
     job_id: int
 
+class LeaseRelease(BaseModel):
+    trainer: str
+    job_id: int
+    lease_id: str
+
 class UpdateReport(BaseModel):
     trainer: str
     job_id: int
     update_hash: str
-    index: int
+    lease_id: Optional[str] = None
+
+
+class UploadSessionRequest(BaseModel):
+    trainer: str
+    job_id: int
+    update_hash: str
+    size: int
+    chunk_size: int = DEFAULT_CHUNK_SIZE
+    leaves: list[str]
+    compressed: bool = False
+    base_version: Optional[int] = None
 
 
 class ValidationReport(BaseModel):
     validator: str
     job_id: int
-    index: int
+    update_hash: str
     valid: bool
+    loss: Optional[float] = None
 
 
-pending_tasks: dict = {}
+# Принятые дельты (для валидаторов) и незавершённые resumable-загрузки
+update_store = UpdateStore(UPDATE_STORE_DIR, max_updates=UPDATE_STORE_MAX)
+upload_sessions: dict = {}
+_upload_sessions_lock = threading.Lock()
 
 
 # FastAPI app
@@ -330,7 +763,10 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware, histogram=HTTP_SECONDS)
 
 
 @app.on_event("startup")
@@ -340,37 +776,102 @@ def startup_event():
     logger.info(f"WEB3_PROVIDER_URL: {WEB3_PROVIDER_URL}")
     logger.info(f"CONTRACT_ADDRESS: {CONTRACT_ADDRESS}")
     logger.info(f"SIMULATION_ENABLED: {SIMULATION_ENABLED}")
+    logger.info(f"BATCHING_ENABLED: {BATCHING_ENABLED}")
     logger.info("Orchestrator ready")
     logger.info("=" * 50)
     
     if SIMULATION_ENABLED:
         start_simulation()
+    if BATCHING_ENABLED:
+        update_batcher.start()
+        validation_batcher.start()
+    if indexer is not None:
+        indexer.start()
+    if state_log is not None:
+        state_log.start(_state_snapshot)
+    if GRAPH_RETENTION_INTERVAL > 0:
+        _retention_stop.clear()
+        threading.Thread(target=_graph_retention_loop, name="graph-retention", daemon=True).start()
+    if AGGREGATION_MODE == "sync":
+        _aggregation_stop.clear()
+        threading.Thread(target=_aggregation_loop, name="aggregation", daemon=True).start()
 
 
 @app.on_event("shutdown")
 def shutdown_event():
     stop_simulation()
+    _retention_stop.set()
+    _aggregation_stop.set()
+    _aggregation_wake.set()
+    if BATCHING_ENABLED:
+        update_batcher.stop()
+        validation_batcher.stop()
+    if indexer is not None:
+        indexer.close()
+    if state_log is not None:
+        state_log.close()
     logger.info("Orchestrator shutdown complete")
 
 
+@app.on_event("shutdown")
+async def close_web3():
+    await chain.close_async()
+
+
 # API статусов
 
 @app.get("/health")
-def health_check():
+async def health_check():
     """Health check endpoint."""
     return {"status": "ok", "timestamp": _now_iso()}
 
 
+# Gauges считаются только при scrape, на горячий путь они не влияют
+metrics.gauge("orchestrator_graph_nodes", "Nodes in the interaction graph", lambda: graph.node_count())
+metrics.gauge("orchestrator_graph_edges", "Edges in the interaction graph", lambda: graph.edge_count())
+metrics.gauge("orchestrator_pending_tasks", "Trainers holding an assigned task", lambda: len(pending_tasks))
+metrics.gauge("orchestrator_upload_sessions", "Open chunked upload sessions", lambda: len(upload_sessions))
+metrics.gauge("orchestrator_stored_updates", "Delta payloads held for validators", lambda: len(update_store))
+metrics.gauge("orchestrator_events_subscribers", "Open /events streams", lambda: broadcaster.subscribers)
+metrics.gauge("orchestrator_aggregation_pending_deltas", "Deltas waiting for aggregation", lambda: aggregator.pending)
+metrics.gauge("orchestrator_model_version", "Current global model version", lambda: aggregator.version)
+metrics.gauge("orchestrator_chain_batch_pending", "Items queued for the next batched transaction",
+              lambda: {"updates": update_batcher.pending, "validations": validation_batcher.pending}, ("batcher",))
+metrics.gauge("orchestrator_job_state", "Counters of the current job state",
+              lambda: {k: v for k, v in job_state.items() if isinstance(v, (int, float))}, ("key",))
+metrics.gauge("orchestrator_scheduler_leases", "Active shard leases per job",
+              lambda: {job_id: s.status()["leases"] for job_id, s in list(schedulers.items())}, ("job_id",))
+metrics.gauge("orchestrator_state_log_buffered", "Journal records waiting for the flush thread",
+              lambda: state_log.stats()["buffered"] if state_log is not None else None)
+metrics.gauge("orchestrator_web3_rpc_in_flight", "Async Web3 calls holding a concurrency slot",
+              lambda: chain.in_flight)
+metrics.gauge("orchestrator_indexer_lag_blocks", "Blocks between chain head and the local event index",
+              lambda: _indexer_lag())
+
+
+def _indexer_lag() -> Optional[int]:
+    if indexer is None or indexer.head_block is None:
+        return None
+    return max(0, indexer.head_block - indexer.last_block)
+
+
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus text exposition of in-process counters, histograms and gauges."""
+    return Response(metrics.render(), media_type=METRICS_CONTENT_TYPE)
+
+
 @app.get("/status")
-def get_status():
+async def get_status():
     """Full orchestrator status."""
-    w3 = get_web3()
-    return {
+    # ORJSONResponse напрямую: без обхода jsonable_encoder по всему дереву
+    return ORJSONResponse({
         "orchestrator": "running",
         "timestamp": _now_iso(),
-        "web3_connected": w3 is not None and w3.is_connected() if w3 else False,
-        "contract_ready": get_contract() is not None,
+        "web3_connected": await web3_connected(),
+        "contract_ready": await get_contract_async() is not None,
         "provider_url": WEB3_PROVIDER_URL,
+        "web3": chain.stats(),
         "contract_address": CONTRACT_ADDRESS,
         "simulation": {
             "enabled": SIMULATION_ENABLED,
@@ -378,26 +879,102 @@ def get_status():
             "job_state": job_state,
         },
         "graph": {
-            "nodes_count": len(graph_nodes),
-            "edges_count": len(graph_edges),
+            "nodes_count": graph.node_count(),
+            "edges_count": graph.edge_count(),
+            "retention": graph.stats(),
         },
         "pending_tasks": len(pending_tasks),
-    }
+        "events_subscribers": broadcaster.subscribers,
+        "chain_batches": {
+            "enabled": BATCHING_ENABLED,
+            "updates_pending": update_batcher.pending,
+            "validations_pending": validation_batcher.pending,
+            "batches_flushed": update_batcher.flushed_batches + validation_batcher.flushed_batches,
+            "batches_retried": update_batcher.retried_batches + validation_batcher.retried_batches,
+            "items_dropped": update_batcher.dropped_items + validation_batcher.dropped_items,
+        },
+        "aggregation": {
+            "mode": AGGREGATION_MODE,
+            "rule": aggregator.rule,
+            "pending_deltas": aggregator.pending,
+            "model_version": aggregator.version,
+            "last": last_aggregation,
+            "async": aggregator.stats() if AGGREGATION_MODE == "async" else None,
+        },
+        "model_store": model_store.stats(),
+        # SQLite-запросы индексатора ждут его блокировку — не на event loop
+        "indexer": await run_in_threadpool(indexer.status) if indexer is not None else {"enabled": False},
+        "persistence": state_log.stats() if state_log is not None else {"enabled": False},
+        "scheduler": {job_id: scheduler.status() for job_id, scheduler in list(schedulers.items())},
+    })
+
 
 
 
+def _graph_etag(version: int, columns: bool = False) -> str:
+    # job_state меняется вместе с графом, но не версионируется — подмешиваем его в тег
+    suffix = "-c" if columns else ""
+    return f'W/"{version}-{hash(tuple(job_state.values())) & 0xffffffff:x}{suffix}"'
+
 
 @app.get("/graph")
-def get_graph():
-    """Return interaction graph for visualization."""
-    return {
-        "nodes": list(graph_nodes.values()),
-        "edges": list(graph_edges.values()),
-        "updated_at": _now_iso(),
-        "job_state": job_state,
-    }
+def get_graph(request: Request, since: Optional[int] = None):
+    """Return interaction graph for visualization.
+
+    With `?since=<version>` only nodes/edges changed after that version are
+    returned (`full` is false), plus the ids of those evicted or folded
+    since (`removed`). Polls with a matching `If-None-Match` get 304.
+    `Accept: application/x-parallel-graph` selects the columnar binary
+    encoding of the same payload (`orchestrator/wire.py`).
+    """
+    columns = accepts_columns(request.headers.get("accept", ""))
+    etag = _graph_etag(graph.version(), columns)
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag, "Vary": "Accept"})
+
+    started = time.perf_counter()
+    if columns:
+        version, full, *rows = graph.change_rows(since)
+        response = Response(
+            encode_graph(version, full, *rows, edge_window=graph.edge_window or 0.0,
+                         meta={"updated_at": _now_iso(), "job_state": job_state}),
+            media_type=GRAPH_CONTENT_TYPE,
+            headers={"ETag": _graph_etag(version, True), "Vary": "Accept"},
+        )
+    else:
+        version, full, nodes, edges, removed = graph.changes(since)
+        response = ORJSONResponse(
+            {
+                "version": version,
+                "full": full,
+                "nodes": nodes,
+                "edges": edges,
+                "removed": removed,
+                "updated_at": _now_iso(),
+                "job_state": job_state,
+            },
+            headers={"ETag": _graph_etag(version), "Vary": "Accept"},
+        )
+    GRAPH_RENDER_SECONDS.observe(time.perf_counter() - started, "full" if full else "delta",
+                                 "columns" if columns else "json")
+    return response
+
+
+
 
+@app.get("/events")
+async def graph_events():
+    """Server-sent events stream of graph and job_state changes.
 
+    The first frame is a full snapshot, then one delta frame per tick in
+    which something changed (same payload shape as `/graph?since=`).
+    """
+    queue = await broadcaster.subscribe()
+    return StreamingResponse(
+        broadcaster.stream(queue),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.post("/simulation/start")
@@ -430,30 +1007,156 @@ def simulation_step():
     return {
         "status": "ok",
         "job_state": job_state,
-        "nodes": len(graph_nodes),
-        "edges": len(graph_edges),
+        "nodes": graph.node_count(),
+        "edges": graph.edge_count(),
     }
 
 
 
 
+@app.post("/aggregate")
+def api_aggregate():
+    """Aggregate deltas collected for the current epoch."""
+    if AGGREGATION_MODE == "async":
+        return {"status": "async", "model_version": aggregator.version,
+                "message": "Deltas are applied on arrival"}
+    result = _aggregate_epoch("POST /aggregate")
+    if result is None:
+        return {"status": "empty", "pending_deltas": 0}
+    return {"status": "ok", "aggregation": result}
+
+
+def _model_served(kind: str, size: int):
+    MODEL_RESPONSES.inc(kind)
+    MODEL_BYTES.inc(kind, amount=size)
+
+
+def _byte_range(header: Optional[str], size: int) -> Optional[tuple]:
+    """Single `bytes=a-b` range as [start, stop); None for no/unsupported ranges, ValueError if unsatisfiable."""
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, _, last = header[6:].strip().partition("-")
+    if first:
+        start = int(first)
+        stop = min(int(last) + 1, size) if last else size
+    else:
+        start, stop = max(0, size - int(last)), size
+    if start >= stop:
+        raise ValueError(f"Range {header} not satisfiable for {size} bytes")
+    return start, stop
+
+
+class _BufferResponse(Response):
+    """Response sent straight from a memoryview (a retained model version), without a bytes copy."""
+
+    def render(self, content) -> bytes:
+        # Starlette понимает только bytes; memoryview отдаём серверу как есть — он пишет его в сокет
+        return content if isinstance(content, memoryview) else super().render(content)
+
+
+@app.get("/model")
+def get_model(request: Request, version: Optional[int] = None):
+    """Aggregated global delta (flat float32) on top of the shared initial model.
+
+    `?version=` pins a retained version (immutable, so it can be cached and
+    fetched by `Range`). A trainer that sends the ETag of the version it
+    holds as `If-None-Match` gets 304 if nothing changed and, if it also
+    accepts `application/x-parallel-model-diff`, only the diff from its
+    version while that version is still retained.
+    """
+    latest = _current_model_version()
+    target = latest if version is None else version
+    params = model_store.get(target) if target is not None else None
+    if params is None:
+        reason = "no aggregated model yet" if latest is None else f"version {version} not retained"
+        return JSONResponse({"status": "error", "reason": reason}, status_code=404)
+
+    etag = model_store.etag(target)
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "X-Model-Version": str(target),
+        "X-Model-Params": str(params.size),
+        "Cache-Control": "no-cache" if version is None else "public, max-age=31536000, immutable",
+    }
+    held = request.headers.get("if-none-match")
+    if held == etag:
+        MODEL_RESPONSES.inc("not_modified")
+        return Response(status_code=304, headers=headers)
+
+    base = model_store.parse_etag(held)
+    if base is not None and base != target and MODEL_DIFF_TYPE in request.headers.get("accept", ""):
+        payload = model_store.diff(base, target)
+        if payload is not None and len(payload) < params.nbytes:
+            headers["X-Base-Version"] = str(base)
+            _model_served("diff", len(payload))
+            return Response(payload, media_type=MODEL_DIFF_TYPE, headers=headers)
+
+    body = memoryview(params).cast("B")
+    if request.headers.get("if-range", etag) == etag:
+        try:
+            span = _byte_range(request.headers.get("range"), len(body))
+        except ValueError as e:
+            return JSONResponse({"status": "error", "reason": str(e)}, status_code=416,
+                                headers={"Content-Range": f"bytes */{len(body)}"})
+        if span is not None:
+            start, stop = span
+            headers["Content-Range"] = f"bytes {start}-{stop - 1}/{len(body)}"
+            _model_served("range", stop - start)
+            return _BufferResponse(body[start:stop], status_code=206,
+                                   media_type="application/octet-stream", headers=headers)
+    _model_served("full", len(body))
+    return _BufferResponse(body, media_type="application/octet-stream", headers=headers)
+
+
+@app.get("/model/versions")
+def get_model_versions():
+    """Versions of the global model the orchestrator can still serve (and diff from)."""
+    _current_model_version()
+    return model_store.stats()
+
+
 @app.post("/get_task")
-def get_task(req: TaskRequest):
+async def get_task(req: TaskRequest):
     """Assign task to trainer."""
     trainer_id = f"trainer:{req.trainer.lower()}"
     _ensure_node(trainer_id, f"Trainer {_short_addr(req.trainer)}", "trainer")
     _record_edge(trainer_id, ORCHESTRATOR_ID, "request_task")
     _record_edge(ORCHESTRATOR_ID, trainer_id, "assign_task")
 
-    task = {"steps": 10, "shard_id": 0, "job_id": req.job_id}
-    pending_tasks[req.trainer] = task
-
-    logger.info(f"Task assigned to trainer {_short_addr(req.trainer)}")
+    task = _scheduler_for(req.job_id).acquire(req.trainer, req.job_id)
+    if not task["steps"]:
+        logger.info(f"No shard free for {_short_addr(req.trainer)}, retry in {task['retry_after']}s")
+        return task
+    # версия, от которой тренер начнёт; он вернёт её при загрузке дельты (base_version)
+    task["model_version"] = aggregator.version
+    task["aggregation_mode"] = AGGREGATION_MODE
+    _set_task(req.trainer, task)
+
+    logger.info(f"Task assigned to trainer {_short_addr(req.trainer)}: shard {task['shard_id']}, "
+                f"batches {task['start']}+{task['steps']} (lease {task['lease_id']})")
     return task
 
 
+@app.post("/release_task")
+async def release_task(req: LeaseRelease):
+    """Return an unfinished lease to the pool (the trainer's update was rejected)."""
+    released = _scheduler_for(req.job_id).release(req.trainer, req.lease_id)
+    logger.info(f"Lease {req.lease_id} of {_short_addr(req.trainer)} "
+                f"{'released' if released else 'not held, nothing to release'}")
+    return {"status": "released" if released else "unknown_lease", "lease_id": req.lease_id}
+
+
+def _update_hash_bytes32(value: str) -> bytes:
+    """Merkle roots go on chain as-is; any other string is keccak-ed as before."""
+    try:
+        return bytes.fromhex(parse_hash(value))
+    except (UploadError, ValueError):
+        return Web3.keccak(text=value)
+
+
 @app.post("/submit_update")
-def submit_update(report: UpdateReport):
+async def submit_update(report: UpdateReport):
     """Receive update from trainer."""
     trainer_id = f"trainer:{report.trainer.lower()}"
     _ensure_node(trainer_id, f"Trainer {_short_addr(report.trainer)}", "trainer")
@@ -461,27 +1164,40 @@ def submit_update(report: UpdateReport):
     _record_edge(ORCHESTRATOR_ID, CONTRACT_ID, "submit_update")
 
     logger.info(f"Update from {_short_addr(report.trainer)}: hash={report.update_hash[:16]}...")
+    lease = _scheduler_for(report.job_id).complete(report.trainer, report.lease_id)
+    if lease is not None and lease["epoch_done"] and AGGREGATION_MODE == "sync":
+        # все диапазоны эпохи сданы (дельты загружены до отчёта) — закрываем и эпоху агрегации
+        logger.info(f"Scheduler epoch of job {report.job_id} done, aggregating")
+        _aggregation_wake.set()
 
-    contract = get_contract()
+    contract = await get_contract_async()
     if contract is None:
         return {
             "status": "pending",
             "reason": "contract_not_ready",
             "message": "Update accepted, will be submitted to contract later",
+            "lease": lease,
         }
 
     try:
-        w3 = get_web3()
         trainer_address = Web3.to_checksum_address(report.trainer)
-        update_hash = Web3.keccak(text=report.update_hash)
-
-        tx = contract.functions.submitUpdate(
-            report.job_id, update_hash
-        ).build_transaction({
-            "from": trainer_address,
-            "nonce": w3.eth.get_transaction_count(trainer_address),
-            "gas": 500_000,
-        })
+        update_hash = _update_hash_bytes32(report.update_hash)
+
+        if BATCHING_ENABLED:
+            pending = update_batcher.add(report.job_id, (trainer_address, update_hash))
+            return {
+                "status": "queued",
+                "batch_pending": pending,
+                "message": "Update queued for the next batch transaction",
+                "lease": lease,
+            }
+
+        # gasPrice/chainId из кэша; nonce — pending-счётчик тренера, локально не резервируется
+        tx = await chain.build_transaction_async(
+            contract.functions.submitUpdate(report.job_id, update_hash),
+            trainer_address,
+            gas=SUBMIT_UPDATE_GAS,
+        )
 
         return {
             "status": "prepared",
@@ -491,44 +1207,382 @@ def submit_update(report: UpdateReport):
                 "nonce": tx.get("nonce"),
             },
             "message": "Transaction prepared, signature required",
+            "lease": lease,
+        }
+    except asyncio.TimeoutError:
+        # медленная нода деградирует этот запрос, а не весь сервер: апдейт принят, аренда закрыта
+        logger.warning(f"Node timeout preparing update of {_short_addr(report.trainer)}")
+        return {
+            "status": "pending",
+            "reason": "node_timeout",
+            "message": f"Node did not answer within {WEB3_TIMEOUT}s, retry the submission",
+            "lease": lease,
         }
     except Exception as e:
         logger.error(f"Contract error: {e}")
         return {"status": "error", "reason": str(e)}
 
 
+def _accept_delta(trainer: str, payload, compressed: bool, base_version: Optional[int] = None) -> tuple:
+    """Decode a verified payload into the aggregator; return (compression mode, placement).
+
+    Placement is the buffer row in sync mode and the staleness verdict
+    (applied, staleness, weight, version) in async mode. A delta the async
+    aggregator rejects as too stale raises UploadError.
+    """
+    extra = (base_version,) if AGGREGATION_MODE == "async" else ()
+    if compressed:
+        mode, n_params = read_header(payload)
+        row = aggregator.add_with(trainer.lower(), n_params, lambda out: decode_into(payload, out), *extra)
+    else:
+        mode = "none"
+        row = aggregator.add_delta(trainer.lower(), raw_delta(payload), *extra)
+    if isinstance(row, dict) and not row["applied"]:
+        # слишком старая дельта не попала в модель — не храним её и не даём закоммитить
+        raise UploadError(f"Delta is stale: base v{base_version}, staleness {row['staleness']} "
+                          f"> {aggregator.max_staleness} (model v{row['version']})")
+    return mode, row
+
+
+def _store_update(upload, trainer: str, job_id: int, root: str,
+                  size: int, chunk_size: int, leaves: list, mode: str):
+    path = update_store.path_for(root)
+    upload.persist(path)
+    update_store.add(StoredUpdate(root, trainer.lower(), job_id, size, chunk_size, leaves, mode, path))
+
+
+def _accept_and_store(upload, trainer: str, payload, compressed: bool, base_version: Optional[int],
+                      job_id: int, root: str, size: int, chunk_size: int, leaves: list) -> tuple:
+    """`_accept_delta` then `_store_update`; blocking, run in the threadpool by the upload handlers."""
+    mode, row = _accept_delta(trainer, payload, compressed, base_version)
+    _store_update(upload, trainer, job_id, root, size, chunk_size, leaves, mode)
+    return mode, row
+
+
+def _write_chunks(upload, chunks: list):
+    for chunk in chunks:
+        upload.write(chunk)
+
+
+@app.post("/upload_delta")
+async def upload_delta(request: Request, trainer: str, job_id: int, base_version: Optional[int] = None):
+    """Receive delta bytes as a streamed (chunked) body.
+
+    Raw float32 by default; with `Content-Type: application/x-parallel-delta`
+    the body is a compressed payload that is decoded into the aggregation
+    buffer. The update hash is the Merkle root over `X-Merkle-Chunk-Size`
+    chunks, computed as the body streams in; if the trainer sends
+    `X-Update-Hash`, it must match. The returned hash is what goes to
+    `/submit_update`.
+
+    `base_version` is the `model_version` of the task the delta was trained
+    for; in async aggregation mode it sets the staleness weight.
+    """
+    trainer_id = f"trainer:{trainer.lower()}"
+    _ensure_node(trainer_id, f"Trainer {_short_addr(trainer)}", "trainer")
+    _record_edge(trainer_id, ORCHESTRATOR_ID, "upload_delta")
+
+    content_length = request.headers.get("content-length")
+    chunk_size = int(request.headers.get("x-merkle-chunk-size", DEFAULT_CHUNK_SIZE))
+    upload = None
+    try:
+        upload = DeltaUpload(
+            int(content_length) if content_length else None,
+            max_bytes=UPLOAD_MAX_BYTES,
+            memory_limit=UPLOAD_MEMORY_LIMIT,
+            spool_dir=UPLOAD_SPOOL_DIR,
+            chunk_size=chunk_size,
+        )
+        # хэширование, запись в spool-файл и декодирование — в пуле потоков, event loop
+        # продолжает обслуживать /health, /graph и /get_task во время большой загрузки
+        pending, pending_bytes = [], 0
+        async for chunk in request.stream():
+            pending.append(chunk)
+            pending_bytes += len(chunk)
+            if pending_bytes >= UPLOAD_WRITE_BATCH:
+                await run_in_threadpool(_write_chunks, upload, pending)
+                pending, pending_bytes = [], 0
+        if pending:
+            await run_in_threadpool(_write_chunks, upload, pending)
+        digest, payload = await run_in_threadpool(upload.finish, request.headers.get("x-update-hash"))
+        compressed = request.headers.get("content-type", "").startswith(COMPRESSED_DELTA_TYPE)
+        mode, row = await run_in_threadpool(_accept_and_store, upload, trainer, payload, compressed, base_version,
+                                            job_id, digest, upload.received, chunk_size, upload.leaves)
+    except (UploadError, DeltaFormatError, ValueError) as e:
+        logger.warning(f"Upload from {_short_addr(trainer)} rejected: {e}")
+        UPLOADS.inc("rejected")
+        return {"status": "error", "reason": str(e)}
+    finally:
+        if upload is not None:
+            upload.close()
+
+    logger.info(f"Delta from {_short_addr(trainer)}: {upload.received} bytes ({mode}), root={digest[:16]}...")
+    UPLOADS.inc("stream")
+    UPLOAD_BYTES.inc(mode, amount=upload.received)
+    return {
+        "status": "received",
+        "job_id": job_id,
+        "bytes": upload.received,
+        "compression": mode,
+        "update_hash": digest,
+        "row": row,
+    }
+
+
+def _expire_upload_sessions():
+    now = time.monotonic()
+    with _upload_sessions_lock:
+        expired = [s for s in upload_sessions.values() if now - s.created > UPLOAD_SESSION_TTL]
+        for session in expired:
+            upload_sessions.pop(session.upload_id, None)
+    for session in expired:
+        session.close()
+
+
+@app.post("/uploads")
+def create_upload(req: UploadSessionRequest):
+    """Start (or resume) a chunked upload; returns the chunk indices still missing."""
+    _expire_upload_sessions()
+    try:
+        root = parse_hash(req.update_hash)
+        if req.size > UPLOAD_MAX_BYTES:
+            raise UploadError(f"Upload of {req.size} bytes exceeds limit {UPLOAD_MAX_BYTES}")
+        if update_store.get(root) is not None:
+            # повтор после таймаута на последнем чанке: дельта уже в агрегаторе, второй раз не добавляем
+            return {"status": "complete", "update_hash": root, "missing": []}
+        with _upload_sessions_lock:
+            session = upload_sessions.get(root)
+            if session is None:
+                leaves = [bytes.fromhex(parse_hash(h)) for h in req.leaves]
+                session = ChunkedUpload(
+                    root,
+                    {"trainer": req.trainer, "job_id": req.job_id,
+                     "compressed": req.compressed, "base_version": req.base_version},
+                    req.size, req.chunk_size, leaves, root, spool_dir=UPLOAD_SPOOL_DIR,
+                )
+                upload_sessions[root] = session
+    except (UploadError, ValueError) as e:
+        return {"status": "error", "reason": str(e)}
+    return {"status": "open", "upload_id": session.upload_id, "missing": sorted(session.missing)}
+
+
+@app.get("/uploads/{upload_id}")
+def get_upload(upload_id: str):
+    session = upload_sessions.get(upload_id)
+    if session is None:
+        stored = update_store.get(upload_id)
+        return {"status": "complete" if stored else "unknown", "missing": []}
+    return {"status": "open", "upload_id": upload_id, "missing": sorted(session.missing)}
+
+
+@app.put("/uploads/{upload_id}/chunks/{chunk_index}")
+async def put_upload_chunk(upload_id: str, chunk_index: int, request: Request):
+    """Receive one chunk; it is checked against its declared leaf hash right away."""
+    session = upload_sessions.get(upload_id)
+    if session is None:
+        return {"status": "error", "reason": "unknown upload"}
+    data = await request.body()
+    owner = False
+    try:
+        # проверка хэша чанка и запись на диск — вне event loop
+        await run_in_threadpool(session.write_chunk, chunk_index, data)
+        if not session.complete:
+            return {"status": "open", "missing": len(session.missing)}
+        with _upload_sessions_lock:
+            if upload_sessions.pop(upload_id, None) is None:
+                return {"status": "complete", "update_hash": upload_id}
+        # сессию закрывает только запрос, который её забрал: другой ещё может читать payload
+        owner = True
+        meta = session.meta
+        mode, row = await run_in_threadpool(
+            _accept_and_store, session, meta["trainer"], session.payload(), meta["compressed"],
+            meta["base_version"], meta["job_id"], session.root, session.size,
+            session.chunk_size, session.leaves,
+        )
+    except (UploadError, DeltaFormatError, ValueError) as e:
+        UPLOADS.inc("rejected")
+        return {"status": "error", "reason": str(e)}
+    finally:
+        if owner:
+            session.close()
+    UPLOADS.inc("chunked")
+    UPLOAD_BYTES.inc(mode, amount=session.size)
+
+    trainer_id = f"trainer:{meta['trainer'].lower()}"
+    _ensure_node(trainer_id, f"Trainer {_short_addr(meta['trainer'])}", "trainer")
+    _record_edge(trainer_id, ORCHESTRATOR_ID, "upload_delta")
+    logger.info(f"Chunked delta from {_short_addr(meta['trainer'])}: {session.size} bytes ({mode})")
+    return {"status": "complete", "update_hash": session.root, "compression": mode, "row": row}
+
+
+@app.get("/updates")
+def list_updates(job_id: int, pending: bool = False):
+    """Updates received for a job and still held by the orchestrator.
+
+    `index` is the update's position in `jobUpdates` on chain, or null while
+    its submission has not been seen yet.
+    """
+    updates = update_store.for_job(job_id, pending)
+    _resolve_chain_indices(job_id, updates)
+    return {"job_id": job_id, "updates": [u.to_dict() for u in updates]}
+
+
+@app.get("/updates/{update_hash}")
+def get_update(update_hash: str):
+    update = update_store.get(update_hash)
+    if update is None:
+        return JSONResponse({"status": "error", "reason": "unknown update"}, status_code=404)
+    return update.to_dict()
+
+
+@app.get("/updates/{update_hash}/payload")
+def get_update_payload(update_hash: str):
+    update = update_store.get(update_hash)
+    if update is None:
+        return JSONResponse({"status": "error", "reason": "unknown update"}, status_code=404)
+    return FileResponse(update.path, media_type="application/octet-stream")
+
+
+@app.get("/updates/{update_hash}/chunks/{chunk_index}")
+def get_update_chunk(update_hash: str, chunk_index: int):
+    """One chunk of a stored payload with its Merkle inclusion proof in headers."""
+    update = update_store.get(update_hash)
+    if update is None:
+        return JSONResponse({"status": "error", "reason": "unknown update"}, status_code=404)
+    try:
+        chunk, proof = update_store.read_chunk(update, chunk_index)
+    except IndexError as e:
+        return JSONResponse({"status": "error", "reason": str(e)}, status_code=404)
+    return Response(
+        chunk,
+        media_type="application/octet-stream",
+        headers={
+            "X-Merkle-Proof": ",".join(proof),
+            "X-Merkle-Leaves": str(len(update.leaves)),
+            "X-Update-Hash": update.root,
+        },
+    )
+
+
 @app.post("/submit_validation")
-def submit_validation(report: ValidationReport):
+async def submit_validation(report: ValidationReport):
     """Receive validation result."""
     validator_id = f"validator:{report.validator.lower()}"
     _ensure_node(validator_id, f"Validator {_short_addr(report.validator)}", "validator")
     _record_edge(validator_id, ORCHESTRATOR_ID, "validate_update")
     _record_edge(ORCHESTRATOR_ID, CONTRACT_ID, "validate_update")
 
-    logger.info(f"Validation from {_short_addr(report.validator)}: job={report.job_id}, valid={report.valid}")
+    stored = update_store.get(report.update_hash)
+    if stored is None or stored.job_id != report.job_id:
+        return {"status": "error", "reason": "unknown update"}
+    if stored.index is None:
+        await run_in_threadpool(_resolve_chain_indices, report.job_id, [stored])
+    if BATCHING_ENABLED and stored.index is None:
+        # индекс для validateUpdates берётся только из цепи; вердикт не записан, апдейт остаётся в pending
+        return {"status": "pending", "reason": "not_on_chain", "job_id": report.job_id,
+                "update_hash": stored.root}
+
+    if stored.valid is not None:
+        # контракт принимает один вердикт на апдейт: повтор откатил бы весь пакет validateUpdates
+        VALIDATIONS.inc("duplicate")
+        return {"status": "duplicate", "job_id": report.job_id, "index": stored.index,
+                "update_hash": stored.root, "valid": stored.valid}
+
+    VALIDATIONS.inc(str(report.valid).lower())
+    VALIDATION_LATENCY.observe(time.time() - stored.received_at)
+    update_store.set_verdict(stored.root, report.valid)
+    loss = f", loss={report.loss:.4f}" if report.loss is not None else ""
+    logger.info(f"Validation from {_short_addr(report.validator)}: job={report.job_id}, "
+                f"index={stored.index}, valid={report.valid}{loss}")
+
+    if BATCHING_ENABLED:
+        pending = validation_batcher.add(report.job_id, (stored.index, report.valid))
+        return {
+            "status": "queued",
+            "batch_pending": pending,
+            "job_id": report.job_id,
+            "index": stored.index,
+            "valid": report.valid,
+        }
 
     return {
         "status": "received",
         "job_id": report.job_id,
-        "index": report.index,
+        "index": stored.index,
         "valid": report.valid,
     }
 
 
 
+def _indexer_or_404():
+    if indexer is None:
+        return None, JSONResponse({"status": "error", "reason": "indexer disabled"}, status_code=404)
+    return indexer, None
+
+
+@app.get("/chain/jobs")
+def chain_jobs():
+    """Jobs seen in JobCreated logs with update counters from the local index."""
+    idx, error = _indexer_or_404()
+    if error:
+        return error
+    return {"last_block": idx.last_block, "jobs": idx.jobs()}
+
+
+@app.get("/chain/jobs/{job_id}")
+def chain_job(job_id: int):
+    idx, error = _indexer_or_404()
+    if error:
+        return error
+    job = idx.job(job_id)
+    if job is None:
+        return JSONResponse({"status": "error", "reason": "unknown job"}, status_code=404)
+    return job
+
+
+@app.get("/chain/jobs/{job_id}/updates")
+def chain_job_updates(job_id: int, trainer: Optional[str] = None, pending: bool = False,
+                      offset: int = 0, limit: int = 100):
+    """On-chain updates of a job (index, trainer, hash, verdict) from the local index."""
+    idx, error = _indexer_or_404()
+    if error:
+        return error
+    limit = max(1, min(limit, 1000))
+    return {
+        "job_id": job_id,
+        "last_block": idx.last_block,
+        "updates": idx.updates(job_id, trainer=trainer, pending=pending, offset=offset, limit=limit),
+    }
+
+
+@app.get("/chain/trainers/{address}")
+def chain_trainer(address: str):
+    """Update and payout totals of a trainer across jobs."""
+    idx, error = _indexer_or_404()
+    if error:
+        return error
+    return idx.trainer(address)
+
+
+@app.post("/reconnect")
+async def reconnect():
+    """Drop cached Web3 state (connectivity, chain id, gas price, nonces, contract)."""
+    global _contract, _abi_loaded
+    chain.reset()
+    _contract = None
+    _abi_loaded = False
+    return {"status": "ok", "web3_connected": await web3_connected()}
+
+
 @app.get("/debug/graph/reset")
 def reset_graph():
     """Reset graph (for debugging)."""
-    global job_state
-    graph_nodes.clear()
-    graph_edges.clear()
-    job_state = {
-        "current_epoch": 0,
-        "total_epochs": 100,
-        "updates_submitted": 0,
-        "validations_completed": 0,
-        "aggregations_done": 0,
-    }
+    graph.clear()
+    with _state_lock:
+        job_state.clear()
+        job_state.update(_default_job_state())
+        if state_log is not None:
+            state_log.append("J", dict(job_state))
     _ensure_node(ORCHESTRATOR_ID, "Orchestrator", "orchestrator")
     _ensure_node(CONTRACT_ID, f"JobManager {_short_addr(CONTRACT_ADDRESS)}", "contract")
     logger.info("Graph reset")
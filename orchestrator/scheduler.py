@@ -0,0 +1,290 @@
+"""
+Shard-aware task scheduler with leases.
+
+An epoch is `n_shards` shards of `shard_batches` batches each. A task is a
+lease on a contiguous range of batches inside one shard; the range length
+(`steps`) is sized from the trainer's measured throughput so every lease
+takes about `target_seconds`, no matter how fast the trainer is. Trainers
+stay on the shard they worked on last while it has batches left, so their
+data stays warm.
+
+A lease that is not completed before its deadline is returned to the pool
+and handed to the next trainer. When the pool is empty but leases are
+still out, an idle trainer that would finish a straggler's range sooner
+gets a backup copy of it; whichever copy completes first counts. The epoch
+ends when every batch has been completed once.
+
+A trainer may hold `max_leases` leases at once so it can prefetch the next
+task while training; beyond that, repeated requests get back its oldest
+lease.
+"""
+
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from typing import Callable, Optional
+
+logger = logging.getLogger("orchestrator.scheduler")
+
+
+class Lease:
+    __slots__ = ("id", "trainer", "epoch", "shard", "start", "steps", "issued", "deadline", "backup")
+
+    def __init__(self, lease_id: str, trainer: str, epoch: int, shard: int, start: int, steps: int,
+                 issued: float, deadline: float, backup: bool = False):
+        self.id = lease_id
+        self.trainer = trainer
+        self.epoch = epoch
+        self.shard = shard
+        self.start = start
+        self.steps = steps
+        self.issued = issued
+        self.deadline = deadline
+        self.backup = backup
+
+    @property
+    def key(self) -> tuple:
+        return (self.epoch, self.shard, self.start)
+
+
+class TrainerStats:
+    __slots__ = ("rate", "completed", "expired", "shard", "last_done")
+
+    def __init__(self):
+        self.rate: Optional[float] = None
+        self.last_done = 0.0
+        self.completed = 0
+        self.expired = 0
+        self.shard: Optional[int] = None
+
+
+class ShardScheduler:
+    def __init__(self, n_shards: int = 16, shard_batches: int = 100, target_seconds: float = 10.0,
+                 default_steps: int = 10, min_steps: int = 1, max_steps: int = 1000,
+                 lease_timeout: float = 30.0, deadline_slack: float = 3.0, smoothing: float = 0.3,
+                 max_leases: int = 2, clock: Callable[[], float] = time.monotonic):
+        self.n_shards = n_shards
+        self.shard_batches = shard_batches
+        self.target_seconds = target_seconds
+        self.default_steps = default_steps
+        self.min_steps = min_steps
+        self.max_steps = max_steps
+        self.lease_timeout = lease_timeout
+        self.deadline_slack = deadline_slack
+        self.smoothing = smoothing
+        self.max_leases = max_leases
+        self.clock = clock
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.trainers: dict = {}
+        self.epoch = 0
+        self.epochs_done = 0
+        self.last_epoch_seconds: Optional[float] = None
+        self.reassigned = 0
+        self._start_epoch()
+
+    @property
+    def total_batches(self) -> int:
+        return self.n_shards * self.shard_batches
+
+    def _start_epoch(self):
+        self.epoch += 1
+        self._epoch_started = self.clock()
+        self._cursor = [0] * self.n_shards
+        self._returned: deque = deque()
+        self._leases: dict = {}
+        self._active: dict = {}
+        self._done: set = set()
+        self._done_batches = 0
+
+    def _stats(self, trainer: str) -> TrainerStats:
+        stats = self.trainers.get(trainer)
+        if stats is None:
+            stats = self.trainers[trainer] = TrainerStats()
+        return stats
+
+    def _planned_steps(self, stats: TrainerStats) -> int:
+        if stats.rate is None:
+            return self.default_steps
+        return max(self.min_steps, min(self.max_steps, round(stats.rate * self.target_seconds)))
+
+    def _expected_seconds(self, stats: TrainerStats, steps: int) -> float:
+        return steps / stats.rate if stats.rate else self.target_seconds
+
+    def _deadline(self, stats: TrainerStats, steps: int, now: float) -> float:
+        return now + max(self.lease_timeout, self._expected_seconds(stats, steps) * self.deadline_slack)
+
+    def _reap(self, now: float):
+        for lease in [l for l in self._leases.values() if l.deadline <= now]:
+            self._stats(lease.trainer).expired += 1
+            self._give_back(lease, "expired")
+
+    def _give_back(self, lease: Lease, why: str):
+        self._drop(lease)
+        # диапазон возвращается в пул, только если его не держит другая копия
+        if not any(l.key == lease.key for l in self._leases.values()):
+            self._returned.append((lease.shard, lease.start, lease.steps))
+            self.reassigned += 1
+            logger.info(f"Lease {lease.id} of {lease.trainer[:10]} {why}, shard {lease.shard} "
+                        f"batches {lease.start}+{lease.steps} returned")
+
+    def _drop(self, lease: Lease):
+        self._leases.pop(lease.id, None)
+        held = self._active.get(lease.trainer)
+        if held and lease.id in held:
+            held.remove(lease.id)
+
+    def _take_range(self, stats: TrainerStats, steps: int) -> Optional[tuple]:
+        # сначала — возвращённые диапазоны, предпочтительно с «своего» шарда
+        if self._returned:
+            for i, (shard, start, size) in enumerate(self._returned):
+                if shard == stats.shard:
+                    del self._returned[i]
+                    return shard, start, size
+            return self._returned.popleft()
+        shard = stats.shard
+        if shard is None or self._cursor[shard] >= self.shard_batches:
+            remaining = [self.shard_batches - c for c in self._cursor]
+            shard = max(range(self.n_shards), key=remaining.__getitem__)
+            if remaining[shard] <= 0:
+                return None
+        start = self._cursor[shard]
+        size = min(steps, self.shard_batches - start)
+        self._cursor[shard] = start + size
+        return shard, start, size
+
+    def _backup_for(self, stats: TrainerStats, now: float) -> Optional[Lease]:
+        """Lease of a straggler that this trainer would finish sooner, if any."""
+        if stats.rate is None:
+            return None
+        keys = {}
+        for lease in self._leases.values():
+            keys.setdefault(lease.key, []).append(lease)
+        best = None
+        for copies in keys.values():
+            if len(copies) > 1:
+                continue
+            lease = copies[0]
+            owner = self._stats(lease.trainer)
+            owner_finish = lease.issued + self._expected_seconds(owner, lease.steps)
+            own_finish = now + self._expected_seconds(stats, lease.steps)
+            if own_finish < owner_finish and (best is None or owner_finish > best[0]):
+                best = (owner_finish, lease)
+        return best[1] if best else None
+
+    def _task(self, lease: Lease, job_id: int) -> dict:
+        return {
+            "job_id": job_id,
+            "lease_id": lease.id,
+            "epoch": lease.epoch,
+            "shard_id": lease.shard,
+            "start": lease.start,
+            "steps": lease.steps,
+            "lease_seconds": round(lease.deadline - lease.issued, 3),
+            "n_shards": self.n_shards,
+            "shard_batches": self.shard_batches,
+        }
+
+    def acquire(self, trainer: str, job_id: int = 0) -> dict:
+        """Lease for `trainer`: its current one, a new range, a backup copy or a wait hint."""
+        trainer = trainer.lower()
+        with self._lock:
+            now = self.clock()
+            self._reap(now)
+            stats = self._stats(trainer)
+            held = self._active.setdefault(trainer, [])
+            if len(held) >= self.max_leases:
+                return self._task(self._leases[held[0]], job_id)
+
+            taken = self._take_range(stats, self._planned_steps(stats))
+            backup = False
+            if taken is None:
+                straggler = self._backup_for(stats, now)
+                if straggler is not None:
+                    taken = (straggler.shard, straggler.start, straggler.steps)
+                    backup = True
+                elif not self._leases:
+                    self._finish_epoch(now)
+                    taken = self._take_range(stats, self._planned_steps(stats))
+            if taken is None:
+                # всё роздано и никого не обогнать — ждём завершения эпохи
+                wait = min((l.deadline for l in self._leases.values()), default=now + 1.0) - now
+                return {"job_id": job_id, "steps": 0, "epoch": self.epoch,
+                        "retry_after": round(max(0.5, min(wait, self.target_seconds)), 3)}
+
+            shard, start, steps = taken
+            stats.shard = shard
+            lease = Lease(f"{self.epoch}-{next(self._ids)}", trainer, self.epoch, shard, start, steps,
+                          now, self._deadline(stats, steps, now), backup)
+            self._leases[lease.id] = lease
+            held.append(lease.id)
+            return self._task(lease, job_id)
+
+    def complete(self, trainer: str, lease_id: Optional[str] = None) -> Optional[dict]:
+        """Mark a lease done and learn the trainer's throughput; None for unknown or stale leases."""
+        trainer = trainer.lower()
+        with self._lock:
+            now = self.clock()
+            if lease_id is None:
+                held = self._active.get(trainer)
+                lease_id = held[0] if held else None
+            lease = self._leases.get(lease_id) if lease_id else None
+            if lease is None or lease.trainer != trainer:
+                return None
+            self._drop(lease)
+            stats = self._stats(trainer)
+            # предвыбранная аренда ждала, пока тренер закончит предыдущую — это время не в счёт
+            elapsed = max(now - max(lease.issued, stats.last_done), 1e-6)
+            rate = lease.steps / elapsed
+            stats.last_done = now
+            stats.rate = rate if stats.rate is None else (1 - self.smoothing) * stats.rate + self.smoothing * rate
+            stats.completed += 1
+
+            counted = lease.key not in self._done
+            if counted:
+                self._done.add(lease.key)
+                self._done_batches += lease.steps
+                # вторая копия того же диапазона больше не нужна
+                for other in [l for l in self._leases.values() if l.key == lease.key]:
+                    self._drop(other)
+            epoch_done = self._done_batches >= self.total_batches and not self._leases
+            if epoch_done:
+                self._finish_epoch(now)
+            return {"counted": counted, "steps_per_second": round(stats.rate, 3), "epoch_done": epoch_done}
+
+    def release(self, trainer: str, lease_id: str) -> bool:
+        """Give a lease back unfinished (e.g. its update was rejected); False if it is not held."""
+        trainer = trainer.lower()
+        with self._lock:
+            lease = self._leases.get(lease_id)
+            if lease is None or lease.trainer != trainer:
+                return False
+            self._give_back(lease, "released")
+            return True
+
+    def _finish_epoch(self, now: float):
+        if self._done_batches < self.total_batches:
+            return
+        self.last_epoch_seconds = now - self._epoch_started
+        self.epochs_done += 1
+        logger.info(f"Epoch {self.epoch} done in {self.last_epoch_seconds:.1f} s")
+        self._start_epoch()
+
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                "epoch": self.epoch,
+                "epochs_done": self.epochs_done,
+                "last_epoch_seconds": self.last_epoch_seconds,
+                "progress": round(self._done_batches / self.total_batches, 4),
+                "leases": len(self._leases),
+                "returned": len(self._returned),
+                "reassigned": self.reassigned,
+                "trainers": {
+                    t: {"steps_per_second": round(s.rate, 3) if s.rate else None,
+                        "completed": s.completed, "expired": s.expired, "shard": s.shard}
+                    for t, s in self.trainers.items()
+                },
+            }
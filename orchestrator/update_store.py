@@ -0,0 +1,122 @@
+"""
+On-disk store of received delta payloads, keyed by their Merkle root.
+
+Validators fetch whole payloads or spot-check single chunks together with
+an inclusion proof against the root committed on chain. The store keeps a
+bounded number of updates and deletes the oldest files first.
+"""
+
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from common.merkle import build_levels, merkle_proof
+
+logger = logging.getLogger("orchestrator.update_store")
+
+
+class StoredUpdate:
+    __slots__ = ("root", "trainer", "job_id", "index", "size", "chunk_size", "leaves",
+                 "compression", "path", "received_at", "valid", "_levels")
+
+    def __init__(self, root: str, trainer: str, job_id: int, size: int,
+                 chunk_size: int, leaves: list, compression: str, path: str):
+        self.root = root
+        self.trainer = trainer
+        self.job_id = job_id
+        # позиция в jobUpdates[job_id] на контракте; None, пока отправка не видна в цепи
+        self.index: Optional[int] = None
+        self.size = size
+        self.chunk_size = chunk_size
+        self.leaves = leaves
+        self.compression = compression
+        self.path = path
+        self.received_at = time.time()
+        self.valid: Optional[bool] = None
+        self._levels = None
+
+    @property
+    def levels(self) -> list:
+        if self._levels is None:
+            self._levels = build_levels(self.leaves)
+        return self._levels
+
+    def to_dict(self) -> dict:
+        return {
+            "update_hash": self.root,
+            "trainer": self.trainer,
+            "job_id": self.job_id,
+            "index": self.index,
+            "size": self.size,
+            "chunk_size": self.chunk_size,
+            "n_chunks": len(self.leaves),
+            "compression": self.compression,
+            "received_at": self.received_at,
+            "valid": self.valid,
+        }
+
+
+class UpdateStore:
+    def __init__(self, directory: Optional[str] = None, max_updates: int = 256):
+        self.directory = directory or tempfile.mkdtemp(prefix="updates-")
+        os.makedirs(self.directory, exist_ok=True)
+        self.max_updates = max_updates
+        self._updates: "OrderedDict[str, StoredUpdate]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._updates)
+
+    def path_for(self, root: str) -> str:
+        return os.path.join(self.directory, f"{root}.bin")
+
+    def add(self, update: StoredUpdate):
+        evicted = []
+        with self._lock:
+            self._updates[update.root] = update
+            self._updates.move_to_end(update.root)
+            while len(self._updates) > self.max_updates:
+                evicted.append(self._updates.popitem(last=False)[1])
+        for old in evicted:
+            try:
+                os.unlink(old.path)
+            except FileNotFoundError:
+                pass
+
+    def get(self, root: str) -> Optional[StoredUpdate]:
+        with self._lock:
+            return self._updates.get(root.lower().removeprefix("0x"))
+
+    def for_job(self, job_id: int, pending: bool = False) -> list:
+        """Updates of a job in arrival order; `pending` keeps only those without a verdict."""
+        with self._lock:
+            return [u for u in self._updates.values()
+                    if u.job_id == job_id and not (pending and u.valid is not None)]
+
+    def set_index(self, root: str, index: int) -> bool:
+        """Record the on-chain index of an update once its submission is seen."""
+        update = self.get(root)
+        if update is None:
+            return False
+        update.index = index
+        return True
+
+    def set_verdict(self, root: str, valid: bool) -> bool:
+        update = self.get(root)
+        if update is None:
+            return False
+        update.valid = valid
+        return True
+
+    def read_chunk(self, update: StoredUpdate, i: int) -> tuple:
+        """Return (chunk bytes, proof as hex list) for chunk `i`."""
+        if not 0 <= i < len(update.leaves):
+            raise IndexError(f"Chunk {i} out of range")
+        with open(update.path, "rb") as f:
+            f.seek(i * update.chunk_size)
+            chunk = f.read(update.chunk_size)
+        return chunk, [h.hex() for h in merkle_proof(update.levels, i)]
@@ -0,0 +1,197 @@
+"""
+Receivers for delta uploads.
+
+The payload is either the flat float32 delta exactly as the trainer
+concatenates it, or a compressed payload (see compression.py). Its update
+hash is the Merkle root over fixed-size chunks (common/merkle.py).
+
+`DeltaUpload` takes one streamed body: leaves are hashed as bytes arrive
+and data goes into a preallocated buffer (small deltas) or a temporary
+file that is later memory-mapped, so large uploads never sit in Python
+memory as one bytes object. `ChunkedUpload` is the resumable variant: the
+trainer declares all leaf hashes up front and then sends chunks in any
+order, each verified on arrival.
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+
+from common.merkle import DEFAULT_CHUNK_SIZE, MAX_CHUNK_SIZE, MIN_CHUNK_SIZE, MerkleStream, leaf_hash, merkle_root
+
+DELTA_DTYPE = np.float32
+
+
+class UploadError(Exception):
+    """Upload rejected: wrong size, hash mismatch or limit exceeded."""
+
+
+def check_chunk_size(chunk_size: int) -> int:
+    if not MIN_CHUNK_SIZE <= chunk_size <= MAX_CHUNK_SIZE:
+        raise UploadError(f"Chunk size {chunk_size} outside [{MIN_CHUNK_SIZE}, {MAX_CHUNK_SIZE}]")
+    return chunk_size
+
+
+def parse_hash(value: str) -> str:
+    value = value.lower().removeprefix("0x")
+    if len(value) != 64:
+        raise UploadError("Update hash must be 32 bytes hex")
+    bytes.fromhex(value)
+    return value
+
+
+class DeltaUpload:
+    """Incremental sink for one uploaded delta."""
+
+    def __init__(
+        self,
+        expected_size: Optional[int],
+        max_bytes: int,
+        memory_limit: int,
+        spool_dir: Optional[str] = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ):
+        if expected_size is not None and expected_size > max_bytes:
+            raise UploadError(f"Upload of {expected_size} bytes exceeds limit {max_bytes}")
+        self.expected_size = expected_size
+        self.max_bytes = max_bytes
+        self.received = 0
+        self._merkle = MerkleStream(check_chunk_size(chunk_size))
+        self._buffer: Optional[np.ndarray] = None
+        self._file = None
+        self.path: Optional[str] = None
+
+        if expected_size is not None and expected_size <= memory_limit:
+            self._buffer = np.empty(expected_size, dtype=np.uint8)
+        else:
+            # размер неизвестен или слишком велик — пишем на диск
+            fd, self.path = tempfile.mkstemp(prefix="delta-", suffix=".bin", dir=spool_dir)
+            self._file = os.fdopen(fd, "wb")
+
+    def write(self, chunk: bytes):
+        size = len(chunk)
+        if not size:
+            return
+        end = self.received + size
+        if end > self.max_bytes or (self.expected_size is not None and end > self.expected_size):
+            raise UploadError(f"Upload exceeds declared size after {end} bytes")
+        self._merkle.update(chunk)
+        if self._buffer is not None:
+            self._buffer[self.received:end] = np.frombuffer(chunk, dtype=np.uint8)
+        else:
+            self._file.write(chunk)
+        self.received = end
+
+    @property
+    def leaves(self) -> list:
+        return self._merkle.leaves
+
+    def finish(self, expected_hash: Optional[str] = None) -> tuple:
+        """Return (Merkle root hex, uint8 view of the received payload)."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self.expected_size is not None and self.received != self.expected_size:
+            raise UploadError(f"Received {self.received} of {self.expected_size} bytes")
+        if self.received == 0:
+            raise UploadError("Empty upload")
+        digest = self._merkle.finish().hex()
+        if expected_hash and expected_hash.lower().removeprefix("0x") != digest:
+            raise UploadError(f"Hash mismatch: declared {expected_hash[:16]}..., got {digest[:16]}...")
+
+        if self._buffer is not None:
+            return digest, self._buffer
+        return digest, np.memmap(self.path, dtype=np.uint8, mode="r")
+
+    def persist(self, path: str):
+        """Keep the finished payload at `path` (moves the spool file if there is one)."""
+        if self.path is not None:
+            shutil.move(self.path, path)
+            self.path = None
+        else:
+            self._buffer.tofile(path)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._buffer = None
+        if self.path is not None:
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+            self.path = None
+
+
+def raw_delta(payload: np.ndarray) -> np.ndarray:
+    """Reinterpret an uncompressed payload as the flat float32 delta."""
+    itemsize = np.dtype(DELTA_DTYPE).itemsize
+    if payload.size % itemsize:
+        raise UploadError(f"Upload size {payload.size} is not a multiple of {itemsize}")
+    return payload.view(DELTA_DTYPE)
+
+
+class ChunkedUpload:
+    """Resumable upload: chunks arrive in any order and are checked against declared leaves."""
+
+    def __init__(self, upload_id: str, meta: dict, size: int, chunk_size: int, leaves: list,
+                 root: str, spool_dir: Optional[str] = None):
+        self.upload_id = upload_id
+        self.meta = meta
+        self.size = size
+        self.chunk_size = check_chunk_size(chunk_size)
+        self.leaves = leaves
+        self.root = root
+        if size <= 0:
+            raise UploadError("Empty upload")
+        n_chunks = -(-size // chunk_size)
+        if len(leaves) != n_chunks:
+            raise UploadError(f"Expected {n_chunks} leaves for {size} bytes, got {len(leaves)}")
+        if merkle_root(leaves).hex() != root:
+            raise UploadError("Declared leaves do not match the update hash")
+        self.missing = set(range(n_chunks))
+        self.created = time.monotonic()
+        self._lock = threading.Lock()
+        fd, self.path = tempfile.mkstemp(prefix="delta-", suffix=".part", dir=spool_dir)
+        # файл сразу нужного размера: чанки пишутся по своим смещениям
+        os.ftruncate(fd, size)
+        os.close(fd)
+
+    def write_chunk(self, i: int, data: bytes):
+        if not 0 <= i < len(self.leaves):
+            raise UploadError(f"Chunk index {i} out of range")
+        expected = min(self.chunk_size, self.size - i * self.chunk_size)
+        if len(data) != expected:
+            raise UploadError(f"Chunk {i} has {len(data)} bytes, expected {expected}")
+        if leaf_hash(data) != self.leaves[i]:
+            raise UploadError(f"Chunk {i} does not match its leaf hash")
+        with open(self.path, "r+b") as f:
+            f.seek(i * self.chunk_size)
+            f.write(data)
+        with self._lock:
+            self.missing.discard(i)
+
+    @property
+    def complete(self) -> bool:
+        return not self.missing
+
+    def payload(self) -> np.ndarray:
+        return np.memmap(self.path, dtype=np.uint8, mode="r")
+
+    def persist(self, path: str):
+        shutil.move(self.path, path)
+        self.path = None
+
+    def close(self):
+        if self.path is not None:
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+            self.path = None
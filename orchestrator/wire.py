@@ -0,0 +1,178 @@
+"""
+Compact wire formats for the orchestrator's read endpoints.
+
+JSON bodies of `/graph`, `/status` and the SSE stream are encoded with
+orjson (`ORJSONResponse`), which serializes the same dicts several times
+faster than `json.dumps` and skips FastAPI's `jsonable_encoder` walk.
+
+A client that sends `Accept: application/x-parallel-graph` gets `/graph`
+as columns instead of a list of dicts: every string (ids, labels, types,
+statuses) goes once into a string table and nodes/edges become parallel
+arrays of table indices, counts and epoch-millisecond timestamps. The
+layout is fixed-width little-endian with every section padded to 8
+bytes, so a browser wraps the columns in typed arrays without copying.
+
+    header (56 bytes)
+    meta            orjson {"updated_at", "job_state"}
+    string offsets  uint32[n_strings + 1] into the UTF-8 blob
+    string blob     UTF-8
+    nodes           float64 last_seen ms [n] | uint32 id, label, type, status, members [5][n]
+    edges           float64 last_seen ms [m] | uint32 source, target, label, count [4][m]
+    removed nodes   uint32 id [r]
+    removed edges   uint32 source, target, label [3][re]
+
+Edge ids are `source|target|label` as in the JSON form; `rate` is
+`count / edge_window` when the header's window is nonzero.
+"""
+
+import struct
+
+import numpy as np
+import orjson
+
+GRAPH_CONTENT_TYPE = "application/x-parallel-graph"
+MAGIC = b"GRF1"
+CODEC_COLUMNS = 1
+FLAG_FULL = 1
+# magic, codec, flags, graph version, edge window, meta bytes, strings, blob bytes,
+# nodes, edges, removed nodes, removed edges
+HEADER = struct.Struct("<4sBBxxQdIIIIIIIxxxx")
+JSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+class WireFormatError(ValueError):
+    pass
+
+
+def dumps(obj) -> bytes:
+    """orjson with the options of `ORJSONResponse` (int dict keys, numpy values)."""
+    return orjson.dumps(obj, option=JSON_OPTIONS)
+
+
+def accepts_columns(accept: str) -> bool:
+    """True if an `Accept` header asks for the columnar graph format."""
+    for item in accept.split(","):
+        media, _, params = item.partition(";")
+        if media.strip() == GRAPH_CONTENT_TYPE:
+            return params.replace(" ", "") not in ("q=0", "q=0.0")
+    return False
+
+
+def _pad(n: int) -> int:
+    return -n % 8
+
+
+def _column(rows: list, i: int) -> list:
+    return [row[i] for row in rows]
+
+
+def encode_graph(version: int, full: bool, nodes: list, edges: list, removed_nodes: list,
+                 removed_edges: list, edge_window: float = 0.0, meta: dict = None) -> bytes:
+    """Encode the output of `GraphStore.change_rows()` into the columnar format."""
+    table: dict = {}
+    intern = table.setdefault
+
+    def indices(values) -> np.ndarray:
+        # len(table) вычисляется до вставки — новая строка получает следующий номер
+        return np.fromiter((intern(v, len(table)) for v in values), dtype=np.uint32, count=len(values))
+
+    # id узлов первыми: source/target рёбер попадают в уже занесённые строки
+    node_ids = indices(_column(nodes, 0))
+    node_cols = np.empty((5, len(nodes)), dtype=np.uint32)
+    node_cols[0] = node_ids
+    for row in (1, 2, 3):
+        node_cols[row] = indices(_column(nodes, row))
+    node_cols[4] = np.fromiter(_column(nodes, 5), dtype=np.uint32, count=len(nodes))
+    node_ts = np.rint(np.fromiter(_column(nodes, 4), dtype=np.float64, count=len(nodes)) * 1000)
+
+    edge_cols = np.empty((4, len(edges)), dtype=np.uint32)
+    for row in range(3):
+        edge_cols[row] = indices(_column(edges, row))
+    edge_cols[3] = np.fromiter(_column(edges, 3), dtype=np.uint32, count=len(edges))
+    edge_ts = np.rint(np.fromiter(_column(edges, 4), dtype=np.float64, count=len(edges)) * 1000)
+
+    gone_nodes = indices(removed_nodes)
+    gone_edges = np.empty((3, len(removed_edges)), dtype=np.uint32)
+    for row in range(3):
+        gone_edges[row] = indices(_column(removed_edges, row))
+
+    encoded = [s.encode() for s in table]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.uint32)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    blob = b"".join(encoded)
+    meta_bytes = dumps(meta or {})
+
+    parts = [
+        HEADER.pack(MAGIC, CODEC_COLUMNS, FLAG_FULL if full else 0, version, float(edge_window or 0.0),
+                    len(meta_bytes), len(encoded), len(blob), len(nodes), len(edges),
+                    len(removed_nodes), len(removed_edges)),
+    ]
+    for section in (meta_bytes, offsets.tobytes(), blob,
+                    node_ts.tobytes() + node_cols.tobytes(), edge_ts.tobytes() + edge_cols.tobytes(),
+                    gone_nodes.tobytes(), gone_edges.tobytes()):
+        parts.append(section)
+        parts.append(b"\0" * _pad(len(section)))
+    return b"".join(parts)
+
+
+def decode_graph(payload) -> dict:
+    """Inverse of `encode_graph`: columns as lists/arrays, strings resolved."""
+    if len(payload) < HEADER.size:
+        raise WireFormatError("Truncated graph payload")
+    (magic, codec, flags, version, edge_window, meta_len, n_strings, blob_len,
+     n_nodes, n_edges, n_gone_nodes, n_gone_edges) = HEADER.unpack_from(payload)
+    if magic != MAGIC or codec != CODEC_COLUMNS:
+        raise WireFormatError(f"Not a graph payload (magic {magic!r}, codec {codec})")
+    view = memoryview(payload)
+    pos = HEADER.size
+
+    def take(size: int) -> memoryview:
+        nonlocal pos
+        if pos + size > len(view):
+            raise WireFormatError("Truncated graph payload")
+        section = view[pos:pos + size]
+        pos += size + _pad(size)
+        return section
+
+    meta = orjson.loads(take(meta_len))
+    offsets = np.frombuffer(take(4 * (n_strings + 1)), dtype=np.uint32)
+    blob = bytes(take(blob_len))
+    strings = [blob[offsets[i]:offsets[i + 1]].decode() for i in range(n_strings)]
+    node_section = take(8 * n_nodes + 20 * n_nodes)
+    node_ts = np.frombuffer(node_section[:8 * n_nodes], dtype=np.float64)
+    node_cols = np.frombuffer(node_section[8 * n_nodes:], dtype=np.uint32).reshape(5, n_nodes)
+    edge_section = take(8 * n_edges + 16 * n_edges)
+    edge_ts = np.frombuffer(edge_section[:8 * n_edges], dtype=np.float64)
+    edge_cols = np.frombuffer(edge_section[8 * n_edges:], dtype=np.uint32).reshape(4, n_edges)
+    gone_nodes = np.frombuffer(take(4 * n_gone_nodes), dtype=np.uint32)
+    gone_edges = np.frombuffer(take(12 * n_gone_edges), dtype=np.uint32).reshape(3, n_gone_edges)
+
+    def names(column) -> list:
+        return [strings[i] for i in column]
+
+    return {
+        "version": version,
+        "full": bool(flags & FLAG_FULL),
+        "edge_window": edge_window,
+        "meta": meta,
+        "nodes": {
+            "id": names(node_cols[0]),
+            "label": names(node_cols[1]),
+            "type": names(node_cols[2]),
+            "status": names(node_cols[3]),
+            "members": node_cols[4],
+            "last_seen_ms": node_ts,
+        },
+        "edges": {
+            "source": names(edge_cols[0]),
+            "target": names(edge_cols[1]),
+            "label": names(edge_cols[2]),
+            "count": edge_cols[3],
+            "last_seen_ms": edge_ts,
+        },
+        "removed": {
+            "nodes": names(gone_nodes),
+            "edges": ["|".join(key) for key in zip(names(gone_edges[0]), names(gone_edges[1]),
+                                                    names(gone_edges[2]))],
+        },
+    }
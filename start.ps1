@@ -215,13 +215,13 @@ if ($Workers) {
     Write-Status "Starting workers..." "INFO"
     Write-Host ""
     
-    $trainerCmd = "python trainer/trainer.py --registry $orchestratorUrl --job 0 --trainer $trainerAddress"
+    $trainerCmd = "python -m trainer.trainer --registry $orchestratorUrl --job 0 --trainer $trainerAddress"
     Start-Window "Trainer" $trainerCmd
     Write-Status "Trainer started" "OK"
     
     Start-Sleep -Seconds 1
     
-    $validatorCmd = "python validator/validator.py --registry $orchestratorUrl --job 0 --validator $validatorAddress"
+    $validatorCmd = "python -m validator.validator --registry $orchestratorUrl --job 0 --validator $validatorAddress --daemon"
     Start-Window "Validator" $validatorCmd
     Write-Status "Validator started" "OK"
 }
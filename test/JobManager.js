@@ -0,0 +1,166 @@
+const { loadFixture } = require("@nomicfoundation/hardhat-toolbox/network-helpers");
+const { expect } = require("chai");
+
+describe("JobManager", function () {
+  const BASE_REWARD = 1_000n;
+  const BATCH = 32;
+
+  async function deployJobFixture() {
+    const [owner, operator, validator, ...rest] = await ethers.getSigners();
+    const trainers = rest.slice(0, 4);
+
+    const JobManager = await ethers.getContractFactory("JobManager");
+    const jobManager = await JobManager.deploy();
+
+    await jobManager.createJob(BASE_REWARD, { value: BASE_REWARD * 1_000n });
+    await jobManager.setOperator(0, operator.address, true);
+    await jobManager.connect(validator).registerValidator();
+    for (const trainer of trainers) {
+      await jobManager.connect(trainer).registerTrainer();
+    }
+
+    return { jobManager, owner, operator, validator, trainers };
+  }
+
+  const hashOf = (i) => ethers.keccak256(ethers.toUtf8Bytes(`delta-${i}`));
+
+  const gasOf = async (txPromise) => {
+    const receipt = await (await txPromise).wait();
+    return receipt.gasUsed;
+  };
+
+  describe("Batch submission", function () {
+    it("Should store updates submitted for several trainers in one call", async function () {
+      const { jobManager, operator, trainers } = await loadFixture(deployJobFixture);
+      const list = trainers.map((t) => t.address);
+      const hashes = list.map((_, i) => hashOf(i));
+
+      await expect(jobManager.connect(operator).submitUpdatesFor(0, list, hashes))
+        .to.emit(jobManager, "UpdateSubmitted")
+        .withArgs(0, list[1], hashes[1], 1);
+
+      expect(await jobManager.jobUpdatesCount(0)).to.equal(list.length);
+      const update = await jobManager.jobUpdates(0, 2);
+      expect(update.trainer).to.equal(list[2]);
+      expect(update.hash).to.equal(hashes[2]);
+      // позиционный порядок геттера не зависит от упаковки структуры
+      const [trainer, hash, validated, paid] = update;
+      expect([trainer, hash, validated, paid]).to.deep.equal([list[2], hashes[2], false, false]);
+    });
+
+    it("Should reject batches from accounts that are not job operators", async function () {
+      const { jobManager, trainers } = await loadFixture(deployJobFixture);
+      await expect(
+        jobManager.connect(trainers[0]).submitUpdatesFor(0, [trainers[0].address], [hashOf(0)])
+      ).to.be.revertedWith("Not job operator");
+    });
+
+    it("Should reject unregistered trainers inside a batch", async function () {
+      const { jobManager, operator, validator } = await loadFixture(deployJobFixture);
+      await expect(
+        jobManager.connect(operator).submitUpdatesFor(0, [validator.address], [hashOf(0)])
+      ).to.be.revertedWith("Not registered trainer");
+    });
+  });
+
+  describe("Batch validation and withdrawals", function () {
+    it("Should credit rewards for valid updates and let trainers withdraw them", async function () {
+      const { jobManager, operator, validator, trainers } = await loadFixture(deployJobFixture);
+      const list = trainers.map((t) => t.address);
+      await jobManager.connect(operator).submitUpdatesFor(0, list, list.map((_, i) => hashOf(i)));
+
+      await expect(jobManager.connect(validator).validateUpdates(0, [0, 1, 2, 3], [true, false, true, true]))
+        .to.emit(jobManager, "UpdateValidated")
+        .withArgs(0, list[1], hashOf(1), 1, false);
+
+      expect(await jobManager.pendingWithdrawals(list[0])).to.equal(BASE_REWARD);
+      expect(await jobManager.pendingWithdrawals(list[1])).to.equal(0);
+      expect((await jobManager.jobs(0)).deposit).to.equal(BASE_REWARD * 997n);
+
+      await expect(jobManager.connect(trainers[0]).withdraw()).to.changeEtherBalances(
+        [trainers[0], jobManager],
+        [BASE_REWARD, -BASE_REWARD]
+      );
+      await expect(jobManager.connect(trainers[1]).withdraw()).to.be.revertedWith("Nothing to withdraw");
+    });
+
+    it("Should not validate the same update twice", async function () {
+      const { jobManager, operator, validator, trainers } = await loadFixture(deployJobFixture);
+      await jobManager.connect(operator).submitUpdatesFor(0, [trainers[0].address], [hashOf(0)]);
+      await expect(
+        jobManager.connect(validator).validateUpdates(0, [0, 0], [true, true])
+      ).to.be.revertedWith("Already validated");
+    });
+  });
+
+  describe("Gas per update", function () {
+    it("Should cost less per update when batched", async function () {
+      const { jobManager, operator, validator, trainers } = await loadFixture(deployJobFixture);
+      const trainer = trainers[0];
+
+      let singleSubmit = 0n;
+      for (let i = 0; i < BATCH; i++) {
+        singleSubmit += await gasOf(jobManager.connect(trainer).submitUpdate(0, hashOf(i)));
+      }
+      let singleValidate = 0n;
+      for (let i = 0; i < BATCH; i++) {
+        singleValidate += await gasOf(jobManager.connect(validator).validateUpdate(0, i, true));
+      }
+
+      const list = Array.from({ length: BATCH }, (_, i) => trainers[i % trainers.length].address);
+      const batchSubmit = await gasOf(
+        jobManager.connect(operator).submitUpdatesFor(0, list, list.map((_, i) => hashOf(BATCH + i)))
+      );
+      const indices = Array.from({ length: BATCH }, (_, i) => BATCH + i);
+      const batchValidate = await gasOf(
+        jobManager.connect(validator).validateUpdates(0, indices, indices.map(() => true))
+      );
+
+      const perUpdate = (total) => total / BigInt(BATCH);
+      console.log(`      submit   gas/update: single ${perUpdate(singleSubmit)}, batch ${perUpdate(batchSubmit)}`);
+      console.log(`      validate gas/update: single ${perUpdate(singleValidate)}, batch ${perUpdate(batchValidate)}`);
+
+      expect(batchSubmit).to.be.lessThan(singleSubmit);
+      expect(batchValidate).to.be.lessThan(singleValidate);
+    });
+
+    it("Should cost less per update than the baseline contract", async function () {
+      const { jobManager, operator, validator, trainers } = await loadFixture(deployJobFixture);
+      const [owner] = await ethers.getSigners();
+      const Baseline = await ethers.getContractFactory("JobManagerBaseline");
+      const baseline = await Baseline.deploy();
+      await baseline.connect(owner).createJob(BASE_REWARD, { value: BASE_REWARD * 1_000n });
+      await baseline.connect(validator).registerValidator();
+      await baseline.connect(trainers[0]).registerTrainer();
+
+      // базовый контракт: по вызову на апдейт, награда переводится сразу в validateUpdate
+      let baseSubmit = 0n;
+      let baseValidate = 0n;
+      for (let i = 0; i < BATCH; i++) {
+        baseSubmit += await gasOf(baseline.connect(trainers[0]).submitUpdate(0, hashOf(i)));
+      }
+      for (let i = 0; i < BATCH; i++) {
+        baseValidate += await gasOf(baseline.connect(validator).validateUpdate(0, i, true));
+      }
+
+      const list = Array.from({ length: BATCH }, (_, i) => trainers[i % trainers.length].address);
+      const batchSubmit = await gasOf(
+        jobManager.connect(operator).submitUpdatesFor(0, list, list.map((_, i) => hashOf(i)))
+      );
+      const indices = Array.from({ length: BATCH }, (_, i) => i);
+      const batchValidate = await gasOf(
+        jobManager.connect(validator).validateUpdates(0, indices, indices.map(() => true))
+      );
+      // pull-выплаты: перевод переехал в withdraw, его газ платит тренер один раз за много наград
+      const withdrawGas = await gasOf(jobManager.connect(trainers[0]).withdraw());
+
+      const perUpdate = (total) => total / BigInt(BATCH);
+      console.log(`      baseline submit ${perUpdate(baseSubmit)}, validate+pay ${perUpdate(baseValidate)} gas/update`);
+      console.log(`      batched  submit ${perUpdate(batchSubmit)}, validate ${perUpdate(batchValidate)} gas/update, ` +
+                  `withdraw ${withdrawGas} per trainer`);
+
+      expect(batchSubmit).to.be.lessThan(baseSubmit);
+      expect(batchValidate).to.be.lessThan(baseValidate);
+    });
+  });
+});
@@ -0,0 +1,123 @@
+"""Aggregation rules and the epoch / async aggregators."""
+
+import numpy as np
+import pytest
+
+from orchestrator.aggregation import AsyncAggregator, EpochAggregator, aggregate
+
+
+@pytest.fixture
+def stacked() -> np.ndarray:
+    return np.random.default_rng(0).standard_normal((7, 1000)).astype(np.float32)
+
+
+def reference_trimmed_mean(stacked: np.ndarray, trim: int) -> np.ndarray:
+    ordered = np.sort(stacked, axis=0)
+    return ordered[trim:stacked.shape[0] - trim].mean(axis=0)
+
+
+def test_rules_match_numpy(stacked):
+    np.testing.assert_allclose(aggregate(stacked, "mean"), stacked.mean(axis=0), rtol=1e-6)
+    np.testing.assert_allclose(aggregate(stacked, "median"), np.median(stacked, axis=0))
+    np.testing.assert_allclose(aggregate(stacked, "trimmed_mean", trim=2),
+                               reference_trimmed_mean(stacked, 2), rtol=1e-5, atol=1e-7)
+    np.testing.assert_allclose(aggregate(stacked, "trimmed_mean", trim=0), stacked.mean(axis=0), rtol=1e-6)
+
+
+@pytest.mark.parametrize("rule", ["mean", "median", "trimmed_mean"])
+def test_blocks_and_workers_do_not_change_the_result(stacked, rule):
+    whole = aggregate(stacked, rule)
+    blocked = aggregate(stacked, rule, block_size=64, workers=4)
+    np.testing.assert_array_equal(blocked, whole)
+
+
+def test_robust_rules_ignore_an_outlier(stacked):
+    poisoned = stacked.copy()
+    poisoned[0] = 1e6
+    assert np.abs(aggregate(poisoned, "mean")).max() > 1e4
+    assert np.abs(aggregate(poisoned, "median")).max() < 10
+    assert np.abs(aggregate(poisoned, "trimmed_mean", trim=1)).max() < 10
+
+
+@pytest.mark.parametrize("args, message", [
+    ((np.zeros(5, dtype=np.float32), "mean"), "Expected"),
+    ((np.zeros((0, 5), dtype=np.float32), "mean"), "No deltas"),
+    ((np.zeros((2, 5), dtype=np.float32), "max"), "Unknown"),
+    ((np.zeros((2, 5), dtype=np.float32), "trimmed_mean", 1), "leaves nothing"),
+])
+def test_invalid_input_is_rejected(args, message):
+    with pytest.raises(ValueError, match=message):
+        aggregate(*args)
+
+
+def test_epoch_aggregator_applies_and_resets(stacked):
+    agg = EpochAggregator(rule="mean")
+    for i, row in enumerate(stacked):
+        assert agg.add_delta(f"t{i}", row) == i
+    result = agg.aggregate()
+
+    assert result["n_deltas"] == 7 and result["version"] == 1
+    assert result["trainers"] == [f"t{i}" for i in range(7)]
+    assert agg.pending == 0 and agg.aggregate() is None
+    version, params = agg.snapshot()
+    np.testing.assert_allclose(params, stacked.mean(axis=0), rtol=1e-6)
+
+    agg.add_delta("t0", stacked[0])
+    agg.aggregate()
+    np.testing.assert_allclose(agg.params, stacked.mean(axis=0) + stacked[0], rtol=1e-5, atol=1e-6)
+
+
+def test_trimmed_mean_falls_back_to_median_for_few_deltas(stacked):
+    agg = EpochAggregator(rule="trimmed_mean", trim=1)
+    agg.add_delta("a", stacked[0])
+    agg.add_delta("b", stacked[1])
+    assert agg.aggregate()["rule"] == "median"
+
+
+def test_failed_decode_frees_its_row(stacked):
+    agg = EpochAggregator()
+
+    def broken(row):
+        raise ValueError("bad payload")
+
+    with pytest.raises(ValueError):
+        agg.add_with("a", stacked.shape[1], broken)
+    assert agg.pending == 0
+    assert agg.add_with("b", stacked.shape[1], lambda row: row.__setitem__(slice(None), stacked[0])) == 0
+
+
+def test_buffer_grows_past_its_capacity():
+    agg = EpochAggregator()
+    for i in range(40):
+        agg.add_delta(f"t{i}", np.full(4, i, dtype=np.float32))
+    assert agg.aggregate()["n_deltas"] == 40
+    np.testing.assert_allclose(agg.params, np.full(4, 19.5))
+
+
+def test_width_is_checked_before_allocating():
+    agg = EpochAggregator(max_params=100)
+    with pytest.raises(ValueError, match="limit"):
+        agg.add_with("a", 1 << 40, lambda row: None)
+    agg.add_delta("a", np.ones(10, dtype=np.float32))
+    with pytest.raises(ValueError, match="expected 10"):
+        agg.add_delta("b", np.ones(20, dtype=np.float32))
+
+    pinned = EpochAggregator(n_params=8)
+    with pytest.raises(ValueError, match="expected 8"):
+        pinned.add_delta("a", np.ones(10, dtype=np.float32))
+
+
+def test_async_weights_by_staleness_and_rejects_stale():
+    agg = AsyncAggregator(max_staleness=2, alpha=0.5, mixing=0.5)
+    delta = np.ones(4, dtype=np.float32)
+
+    fresh = agg.add_delta("a", delta, base_version=0)
+    assert fresh["applied"] and fresh["weight"] == 0.5 and agg.version == 1
+    stale = agg.add_delta("b", delta, base_version=0)
+    assert stale["staleness"] == 1 and stale["weight"] == pytest.approx(0.5 / np.sqrt(2), abs=1e-6)
+    np.testing.assert_allclose(agg.params, 0.5 + 0.5 / np.sqrt(2), rtol=1e-6)
+
+    agg.add_delta("c", delta)
+    rejected = agg.add_delta("d", delta, base_version=0)
+    assert not rejected["applied"] and rejected["staleness"] == 3 and agg.version == 3
+    assert agg.stats()["rejected"] == 1
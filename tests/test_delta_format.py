@@ -0,0 +1,102 @@
+"""Encode/decode round-trips of the compressed delta wire format."""
+
+import numpy as np
+import pytest
+import torch
+
+from common import delta_format
+from common.delta_format import DeltaFormatError, decode, decode_into, pack_header, read_header
+from trainer.compression import DeltaCompressor, encode_fp16, encode_int8, encode_topk
+
+N = 1000
+
+
+def payload_of(parts: list) -> bytes:
+    return b"".join(bytes(p) for p in parts)
+
+
+@pytest.fixture
+def delta() -> torch.Tensor:
+    gen = torch.Generator().manual_seed(0)
+    return torch.randn(N, generator=gen)
+
+
+def test_header_round_trip():
+    for mode in ("fp16", "int8", "topk"):
+        header = pack_header(mode, 123)
+        assert len(header) == delta_format.HEADER.size
+        assert read_header(header) == (mode, 123)
+
+
+def test_fp16_round_trip(delta):
+    out = decode(payload_of(encode_fp16(delta)))
+    np.testing.assert_array_equal(out, delta.to(torch.float16).float().numpy())
+
+
+def test_int8_round_trip_within_half_a_step(delta):
+    segments = [600, 400]
+    # у второго тензора масштаб на порядки меньше: у каждого сегмента свой шаг
+    delta[600:] *= 1e-3
+    out = decode(payload_of(encode_int8(delta, segments)))
+    offset = 0
+    for size in segments:
+        part = delta[offset:offset + size].numpy()
+        step = np.abs(part).max() / 127
+        assert np.abs(out[offset:offset + size] - part).max() <= step / 2 + 1e-9
+        offset += size
+
+
+def test_topk_keeps_largest_coordinates(delta):
+    out = decode(payload_of(encode_topk(delta, 0.05)))
+    kept = np.flatnonzero(out)
+    assert len(kept) == 50
+    expected = np.argsort(-np.abs(delta.numpy()))[:50]
+    assert set(kept) == set(expected)
+    np.testing.assert_array_equal(out[kept], delta.numpy()[kept])
+
+
+def test_decode_into_reuses_the_row(delta):
+    row = np.full(N, np.nan, dtype=np.float32)
+    assert decode_into(payload_of(encode_topk(delta, 0.01)), row) == "topk"
+    # координаты вне top-k обнулены, а не оставлены от прошлой дельты
+    assert not np.isnan(row).any()
+
+
+def test_error_feedback_carries_the_residual(delta):
+    compressor = DeltaCompressor("topk", topk_ratio=0.1, error_feedback=True)
+    sent = decode(payload_of(compressor.encode(delta)))
+    sent += decode(payload_of(compressor.encode(torch.zeros(N))))
+    # за два раунда ушло больше массы, чем за один: остаток не потерян
+    once = decode(payload_of(encode_topk(delta, 0.1)))
+    assert np.abs(delta.numpy() - sent).sum() < np.abs(delta.numpy() - once).sum()
+
+
+@pytest.mark.parametrize("payload, message", [
+    (b"DLT1", "shorter than header"),
+    (b"XXXX" + pack_header("fp16", 4)[4:] + bytes(8), "magic"),
+    (pack_header("none", 4), "Unknown delta mode"),
+    (pack_header("fp16", 4) + bytes(6), "Truncated"),
+])
+def test_malformed_payloads_are_rejected(payload, message):
+    with pytest.raises(DeltaFormatError, match=message):
+        decode(payload)
+
+
+def test_width_mismatch_is_rejected(delta):
+    with pytest.raises(DeltaFormatError, match="expected 10"):
+        decode_into(payload_of(encode_fp16(delta)), np.empty(10, dtype=np.float32))
+
+
+def test_topk_index_out_of_range_is_rejected():
+    payload = (pack_header("topk", 4) + np.uint64(1).tobytes()
+               + np.uint32(9).tobytes() + np.float32(1.0).tobytes())
+    with pytest.raises(DeltaFormatError, match="out of range"):
+        decode(payload)
+
+
+def test_int8_segments_must_cover_the_delta(delta):
+    parts = encode_int8(delta, [600, 400])
+    # заголовок обещает на 10 параметров больше, чем покрывают сегменты
+    parts[0] = pack_header("int8", N + 10)
+    with pytest.raises(DeltaFormatError):
+        decode(payload_of(parts))
@@ -0,0 +1,153 @@
+"""GraphStore retention: node TTL, edge windows, folding and tombstones."""
+
+from orchestrator.graph import AGGREGATE_STATUS, GraphStore, aggregate_id
+
+
+class Clock:
+    def __init__(self, now: float = 1_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_graph(clock, **kwargs) -> GraphStore:
+    graph = GraphStore(shards=4, clock=clock, **kwargs)
+    graph.ensure_node("orchestrator", "Orchestrator", "orchestrator")
+    return graph
+
+
+def edge_counts(graph: GraphStore) -> dict:
+    _, edges = graph.snapshot()
+    return {(e["source"], e["target"], e["label"]): e["count"] for e in edges}
+
+
+def test_idle_nodes_expire_with_their_edges():
+    clock = Clock()
+    graph = make_graph(clock, node_ttl=60)
+    graph.ensure_node("trainer:a", "A", "trainer")
+    graph.ensure_node("trainer:b", "B", "trainer")
+    graph.record_edge("trainer:a", "orchestrator", "upload")
+    graph.record_edge("trainer:b", "orchestrator", "upload")
+
+    clock.now += 30
+    graph.ensure_node("trainer:b", "B", "trainer")
+    clock.now += 40
+    result = graph.expire()
+
+    assert result["evicted_nodes"] == 1
+    assert graph.get_node("trainer:a") is None
+    assert graph.get_node("trainer:b") is not None
+    # закреплённые типы не истекают, даже если их давно не трогали
+    assert graph.get_node("orchestrator") is not None
+    assert list(edge_counts(graph)) == [("trainer:b", "orchestrator", "upload")]
+
+
+def test_edge_count_is_a_sliding_window():
+    clock = Clock()
+    graph = make_graph(clock, edge_window=100, edge_buckets=10)
+    graph.ensure_node("trainer:a", "A", "trainer")
+    for _ in range(3):
+        graph.record_edge("trainer:a", "orchestrator", "upload")
+    clock.now += 50
+    graph.record_edge("trainer:a", "orchestrator", "upload")
+    assert edge_counts(graph) == {("trainer:a", "orchestrator", "upload"): 4}
+
+    # первые три хита выпали из окна, последний ещё в нём
+    clock.now += 60
+    graph.expire()
+    assert edge_counts(graph) == {("trainer:a", "orchestrator", "upload"): 1}
+
+    clock.now += 100
+    result = graph.expire()
+    assert result["evicted_edges"] == 1
+    assert edge_counts(graph) == {}
+
+
+def test_fold_least_recently_seen_nodes_into_aggregate():
+    clock = Clock()
+    graph = make_graph(clock, max_nodes=3)
+    for name in "abcd":
+        clock.now += 1
+        graph.ensure_node(f"trainer:{name}", name, "trainer")
+        graph.record_edge(f"trainer:{name}", "orchestrator", "upload")
+
+    result = graph.expire()
+
+    agg = graph.get_node(aggregate_id("trainer"))
+    assert result["folded_nodes"] == 3
+    assert graph.node_count() == 3
+    assert agg["status"] == AGGREGATE_STATUS and agg["members"] == 3
+    assert graph.get_node("trainer:d") is not None
+    for name in "abc":
+        assert graph.get_node(f"trainer:{name}") is None
+    # рёбра свёрнутых узлов слились в одно ребро агрегата
+    assert edge_counts(graph) == {
+        ("trainer:*", "orchestrator", "upload"): 3,
+        ("trainer:d", "orchestrator", "upload"): 1,
+    }
+
+
+def test_changes_report_removals_as_tombstones():
+    clock = Clock()
+    graph = make_graph(clock, node_ttl=60)
+    graph.ensure_node("trainer:a", "A", "trainer")
+    graph.record_edge("trainer:a", "orchestrator", "upload")
+    version, *_ = graph.changes()
+
+    clock.now += 120
+    graph.expire()
+    _, full, nodes, edges, removed = graph.changes(since=version)
+
+    assert not full
+    assert nodes == [] and edges == []
+    assert removed == {"nodes": ["trainer:a"], "edges": ["trainer:a|orchestrator|upload"]}
+
+
+def test_reader_gets_full_snapshot_once_tombstones_are_pruned():
+    clock = Clock()
+    graph = make_graph(clock, node_ttl=60, tombstone_ttl=30)
+    graph.ensure_node("trainer:a", "A", "trainer")
+    version, *_ = graph.changes()
+
+    clock.now += 120
+    graph.expire()
+    assert graph.stats()["tombstones"] == 1
+    clock.now += 60
+    graph.expire()
+
+    assert graph.stats()["tombstones"] == 0
+    _, full, nodes, _, removed = graph.changes(since=version)
+    assert full
+    assert [n["id"] for n in nodes] == ["orchestrator"]
+    assert removed == {"nodes": [], "edges": []}
+
+
+def test_readded_node_clears_its_tombstone():
+    clock = Clock()
+    graph = make_graph(clock, node_ttl=60)
+    graph.ensure_node("trainer:a", "A", "trainer")
+    version, *_ = graph.changes()
+    clock.now += 120
+    graph.expire()
+    graph.ensure_node("trainer:a", "A", "trainer")
+
+    _, full, nodes, _, removed = graph.changes(since=version)
+    assert not full
+    assert [n["id"] for n in nodes] == ["trainer:a"]
+    assert removed["nodes"] == []
+
+
+def test_journal_sees_every_mutation():
+    records = []
+    graph = GraphStore(shards=2, journal=lambda *r: records.append(r), clock=Clock())
+    graph.ensure_node("trainer:a", "A", "trainer")
+    graph.update_status("trainer:a", "training")
+    graph.record_edge("trainer:a", "orchestrator", "upload")
+    graph.record_edge("trainer:a", "orchestrator", "upload")
+    graph.clear()
+
+    assert [r[0] for r in records] == ["n", "n", "e", "e", "c"]
+    assert records[1][4] == "training"
+    # в журнале абсолютный счётчик, а не приращение
+    assert records[3][4] == 2
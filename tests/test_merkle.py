@@ -0,0 +1,80 @@
+"""Merkle roots, inclusion proofs and chunking of delta payloads."""
+
+import os
+
+import pytest
+
+from common.merkle import (
+    MerkleStream,
+    build_levels,
+    hash_leaves,
+    iter_chunks,
+    leaf_hash,
+    merkle_proof,
+    merkle_root,
+    node_hash,
+    verify_proof,
+)
+
+CHUNK = 64
+
+
+def chunks_of(payload: bytes) -> list:
+    return [payload[i:i + CHUNK] for i in range(0, len(payload), CHUNK)]
+
+
+def test_root_of_small_trees():
+    a, b, c = (leaf_hash(x) for x in (b"a", b"b", b"c"))
+    assert merkle_root([a]) == a
+    assert merkle_root([a, b]) == node_hash(a, b)
+    # лист без пары поднимается на уровень выше без изменений
+    assert merkle_root([a, b, c]) == node_hash(node_hash(a, b), c)
+    with pytest.raises(ValueError):
+        merkle_root([])
+
+
+def test_leaf_and_node_hashes_are_domain_separated():
+    a, b = leaf_hash(b"a"), leaf_hash(b"b")
+    assert leaf_hash(a + b) != node_hash(a, b)
+
+
+@pytest.mark.parametrize("n_leaves", [1, 2, 3, 5, 8, 9])
+def test_every_chunk_verifies_against_the_root(n_leaves):
+    chunks = chunks_of(os.urandom(CHUNK * n_leaves - 7))
+    levels = build_levels([leaf_hash(c) for c in chunks])
+    root = levels[-1][0]
+    for i, chunk in enumerate(chunks):
+        proof = merkle_proof(levels, i)
+        assert verify_proof(chunk, i, len(chunks), proof, root)
+
+
+def test_tampered_chunk_or_wrong_position_fails():
+    chunks = chunks_of(os.urandom(CHUNK * 5))
+    levels = build_levels([leaf_hash(c) for c in chunks])
+    root = levels[-1][0]
+    proof = merkle_proof(levels, 2)
+
+    assert not verify_proof(b"x" + chunks[2][1:], 2, len(chunks), proof, root)
+    assert not verify_proof(chunks[2], 3, len(chunks), proof, root)
+    assert not verify_proof(chunks[2], 2, len(chunks), proof[:-1], root)
+    assert not verify_proof(chunks[2], 2, len(chunks), proof + [root], root)
+
+
+def test_chunks_span_part_boundaries():
+    payload = os.urandom(CHUNK * 4 + 10)
+    parts = [payload[:5], payload[5:100], payload[100:101], payload[101:]]
+    assert [bytes(c) for c in iter_chunks(parts, CHUNK)] == chunks_of(payload)
+
+
+def test_parallel_and_streamed_leaves_match_serial():
+    payload = os.urandom(CHUNK * 7 + 3)
+    serial = hash_leaves([payload], CHUNK, workers=1)
+    assert serial == [leaf_hash(c) for c in chunks_of(payload)]
+    assert hash_leaves([payload], CHUNK, workers=4) == serial
+    assert hash_leaves([payload], CHUNK, workers=0) == serial
+
+    stream = MerkleStream(CHUNK)
+    for i in range(0, len(payload), 37):
+        stream.update(payload[i:i + 37])
+    assert stream.finish() == merkle_root(serial)
+    assert stream.leaves == serial
@@ -0,0 +1,128 @@
+"""ShardScheduler leasing, reassignment and epoch completion."""
+
+from orchestrator.scheduler import ShardScheduler
+
+
+class Clock:
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_scheduler(clock, **kwargs) -> ShardScheduler:
+    options = dict(n_shards=2, shard_batches=10, default_steps=5, target_seconds=10.0,
+                   lease_timeout=30.0, max_leases=1, clock=clock)
+    options.update(kwargs)
+    return ShardScheduler(**options)
+
+
+def test_leases_cover_every_batch_once_and_close_the_epoch():
+    clock = Clock()
+    sched = make_scheduler(clock, max_steps=5)
+    seen = set()
+    result = None
+    for _ in range(4):
+        task = sched.acquire("0xA")
+        assert task["steps"] == 5
+        seen.add((task["shard_id"], task["start"]))
+        clock.now += 1
+        result = sched.complete("0xA", task["lease_id"])
+        assert result["counted"]
+
+    assert seen == {(0, 0), (0, 5), (1, 0), (1, 5)}
+    assert result["epoch_done"]
+    status = sched.status()
+    assert status["epoch"] == 2 and status["epochs_done"] == 1 and status["progress"] == 0
+
+
+def test_steps_follow_measured_rate():
+    clock = Clock()
+    sched = make_scheduler(clock, shard_batches=1000, target_seconds=10.0, smoothing=1.0)
+    task = sched.acquire("0xa")
+    clock.now += 2.5
+    result = sched.complete("0xa", task["lease_id"])
+
+    # 5 батчей за 2.5 с = 2 батча/с, на аренду ~10 с — 20 батчей
+    assert result["steps_per_second"] == 2.0
+    assert sched.acquire("0xa")["steps"] == 20
+
+
+def test_trainer_stays_on_its_shard():
+    clock = Clock()
+    sched = make_scheduler(clock, shard_batches=20)
+    first = sched.acquire("0xa")
+    sched.complete("0xa", first["lease_id"])
+    second = sched.acquire("0xa")
+    assert second["shard_id"] == first["shard_id"]
+    assert second["start"] == first["start"] + first["steps"]
+
+
+def test_expired_lease_goes_to_the_next_trainer():
+    clock = Clock()
+    sched = make_scheduler(clock, n_shards=1, shard_batches=5)
+    lost = sched.acquire("0xa")
+    assert sched.acquire("0xb")["steps"] == 0
+
+    clock.now += 31
+    task = sched.acquire("0xb")
+    assert (task["shard_id"], task["start"], task["steps"]) == (lost["shard_id"], lost["start"], lost["steps"])
+    assert sched.complete("0xa", lost["lease_id"]) is None
+    assert sched.complete("0xb", task["lease_id"])["epoch_done"]
+    assert sched.status()["trainers"]["0xa"]["expired"] == 1
+
+
+def test_released_range_is_handed_out_again():
+    clock = Clock()
+    sched = make_scheduler(clock, n_shards=1, shard_batches=5)
+    task = sched.acquire("0xa")
+    assert not sched.release("0xb", task["lease_id"])
+    assert sched.release("0xa", task["lease_id"])
+
+    again = sched.acquire("0xb")
+    assert (again["start"], again["steps"]) == (task["start"], task["steps"])
+    assert sched.status()["reassigned"] == 1
+
+
+def test_held_leases_are_capped():
+    clock = Clock()
+    sched = make_scheduler(clock, max_leases=2)
+    first = sched.acquire("0xa")
+    second = sched.acquire("0xa")
+    assert first["lease_id"] != second["lease_id"]
+    # сверх max_leases тренер получает свою самую старую аренду
+    assert sched.acquire("0xa")["lease_id"] == first["lease_id"]
+
+
+def test_faster_trainer_gets_a_backup_copy_and_first_completion_wins():
+    clock = Clock()
+    sched = make_scheduler(clock, n_shards=1, shard_batches=10, smoothing=1.0)
+    # оба тренера узнают свою скорость: быстрый 5 батчей/с, медленный 0.5
+    for trainer, seconds in (("0xfast", 1.0), ("0xslow", 10.0)):
+        task = sched.acquire(trainer)
+        clock.now += seconds
+        sched.complete(trainer, task["lease_id"])
+    assert sched.status()["epoch"] == 2
+
+    slow = sched.acquire("0xslow")
+    fast = sched.acquire("0xfast")
+    assert fast["steps"] == 5 and fast["start"] != slow["start"]
+    clock.now += 1
+    sched.complete("0xfast", fast["lease_id"])
+
+    backup = sched.acquire("0xfast")
+    assert (backup["start"], backup["steps"]) == (slow["start"], slow["steps"])
+    clock.now += 1
+    result = sched.complete("0xfast", backup["lease_id"])
+    assert result["counted"] and result["epoch_done"]
+    # копия медленного уже отброшена
+    assert sched.complete("0xslow", slow["lease_id"]) is None
+
+
+def test_unknown_or_foreign_lease_is_not_completed():
+    sched = make_scheduler(Clock())
+    task = sched.acquire("0xa")
+    assert sched.complete("0xa", "missing") is None
+    assert sched.complete("0xb", task["lease_id"]) is None
+    assert sched.complete("0xA", task["lease_id"])["counted"]
@@ -0,0 +1,116 @@
+"""StateLog write-ahead log, snapshots and replay after a restart."""
+
+import os
+
+from orchestrator.state import SNAPSHOT_FILE, StateLog
+
+
+def replay(directory: str) -> tuple:
+    """Recover a fresh log from `directory`; return (log, snapshot state or None, replayed records)."""
+    log = StateLog(directory)
+    loaded, records = [], []
+    log.recover(records.append, loaded.append)
+    return log, (loaded[0] if loaded else None), records
+
+
+def wal_files(directory: str) -> list:
+    return sorted(name for name in os.listdir(directory) if name.startswith("wal."))
+
+
+def test_flushed_records_are_replayed_in_order(tmp_path):
+    log, _, _ = replay(str(tmp_path))
+    log.append("n", "trainer:a", "A", "trainer", "active", 1.0)
+    log.append("e", "trainer:a", "orchestrator", "upload", 1, 2.0)
+    log.flush()
+    log.append("e", "trainer:a", "orchestrator", "upload", 2, 3.0)
+    log.flush()
+    log.close()
+
+    _, snapshot, records = replay(str(tmp_path))
+    assert snapshot is None
+    assert records == [
+        ["n", "trainer:a", "A", "trainer", "active", 1.0],
+        ["e", "trainer:a", "orchestrator", "upload", 1, 2.0],
+        ["e", "trainer:a", "orchestrator", "upload", 2, 3.0],
+    ]
+
+
+def test_unflushed_buffer_is_lost_on_crash(tmp_path):
+    log, _, _ = replay(str(tmp_path))
+    log.append("j", "kept")
+    log.flush()
+    log.append("j", "lost")
+    # без close(): процесс упал до следующей записи буфера
+
+    _, _, records = replay(str(tmp_path))
+    assert records == [["j", "kept"]]
+
+
+def test_snapshot_rotates_the_log_and_replays_only_the_tail(tmp_path):
+    state = {"counter": 0}
+    log, _, _ = replay(str(tmp_path))
+    log.start(lambda: dict(state))
+    for i in range(1, 4):
+        state["counter"] = i
+        log.append("j", "counter", i)
+    log.snapshot()
+    state["counter"] = 4
+    log.append("j", "counter", 4)
+    log.flush()
+
+    _, snapshot, records = replay(str(tmp_path))
+    assert snapshot == {"counter": 3}
+    assert records == [["j", "counter", 4]]
+    log.close()
+
+
+def test_snapshot_removes_segments_it_covers(tmp_path):
+    log, _, _ = replay(str(tmp_path))
+    log.start(lambda: {})
+    log.append("j", 1)
+    log.flush()
+    before = wal_files(str(tmp_path))
+    log.snapshot()
+    after = wal_files(str(tmp_path))
+
+    assert len(after) == 1 and after[0] not in before
+    assert os.path.exists(tmp_path / SNAPSHOT_FILE)
+    log.close()
+
+
+def test_close_leaves_nothing_to_replay(tmp_path):
+    log, _, _ = replay(str(tmp_path))
+    log.start(lambda: {"nodes": 2})
+    log.append("j", "x")
+    log.close()
+
+    _, snapshot, records = replay(str(tmp_path))
+    assert snapshot == {"nodes": 2}
+    assert records == []
+
+
+def test_torn_last_record_is_skipped(tmp_path):
+    log, _, _ = replay(str(tmp_path))
+    log.append("j", 1)
+    log.append("j", 2)
+    log.flush()
+    segment = tmp_path / wal_files(str(tmp_path))[-1]
+    with open(segment, "a") as f:
+        f.write('["j", 3')
+    log.close()
+
+    _, _, records = replay(str(tmp_path))
+    assert records == [["j", 1], ["j", 2]]
+
+
+def test_background_thread_flushes(tmp_path):
+    log = StateLog(str(tmp_path), flush_interval=0.01)
+    log.recover(lambda record: None, lambda state: None)
+    log.start(lambda: {})
+    log.append("j", 1)
+    for _ in range(200):
+        if log.records:
+            break
+        log._stop.wait(0.01)
+    assert log.records == 1
+    log.close()
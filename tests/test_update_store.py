@@ -0,0 +1,59 @@
+"""UpdateStore bounded retention, verdicts and chunk proofs."""
+
+import os
+
+from common.merkle import hash_leaves, merkle_root, verify_proof
+from orchestrator.update_store import StoredUpdate, UpdateStore
+
+CHUNK = 4096
+
+
+def put(store: UpdateStore, payload: bytes, job_id: int = 0) -> StoredUpdate:
+    leaves = hash_leaves([payload], CHUNK)
+    root = merkle_root(leaves).hex()
+    path = store.path_for(root)
+    with open(path, "wb") as f:
+        f.write(payload)
+    update = StoredUpdate(root, "0xtrainer", job_id, len(payload), CHUNK, leaves, "none", path)
+    store.add(update)
+    return update
+
+
+def test_oldest_updates_and_files_are_evicted(tmp_path):
+    store = UpdateStore(str(tmp_path), max_updates=2)
+    first, second, third = (put(store, os.urandom(100)) for _ in range(3))
+
+    assert len(store) == 2
+    assert store.get(first.root) is None and not os.path.exists(first.path)
+    assert store.get(second.root) is second and os.path.exists(third.path)
+
+
+def test_lookup_accepts_prefixed_hash(tmp_path):
+    store = UpdateStore(str(tmp_path))
+    update = put(store, os.urandom(100))
+    assert store.get("0x" + update.root.upper()) is update
+
+
+def test_pending_updates_drop_out_after_a_verdict(tmp_path):
+    store = UpdateStore(str(tmp_path))
+    a, b = put(store, os.urandom(100)), put(store, os.urandom(100))
+    put(store, os.urandom(100), job_id=1)
+
+    assert store.set_verdict(a.root, True)
+    assert not store.set_verdict("00" * 32, True)
+    assert store.set_index(b.root, 7)
+    assert store.for_job(0) == [a, b]
+    assert store.for_job(0, pending=True) == [b]
+    assert b.to_dict()["index"] == 7
+
+
+def test_chunks_are_served_with_valid_proofs(tmp_path):
+    store = UpdateStore(str(tmp_path))
+    payload = os.urandom(CHUNK * 3 + 100)
+    update = put(store, payload)
+    root = bytes.fromhex(update.root)
+
+    for i in range(len(update.leaves)):
+        chunk, proof = store.read_chunk(update, i)
+        assert chunk == payload[i * CHUNK:(i + 1) * CHUNK]
+        assert verify_proof(chunk, i, len(update.leaves), [bytes.fromhex(h) for h in proof], root)
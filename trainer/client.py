@@ -0,0 +1,154 @@
+"""
+HTTP client of the trainer to the orchestrator.
+
+One pooled `requests.Session` is kept for the lifetime of the worker so
+task requests, delta uploads and update reports reuse keep-alive
+connections instead of reconnecting each time.
+"""
+
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from common.merkle import DEFAULT_CHUNK_SIZE, iter_chunks
+
+# размер чанка при потоковой отправке дельты
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+
+class UploadRejected(Exception):
+    """The orchestrator answered an upload with `{"status": "error"}`."""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+def _checked(result: dict) -> dict:
+    if result.get("status") == "error":
+        raise UploadRejected(result.get("reason", "unknown reason"))
+    return result
+
+
+class OrchestratorClient:
+    def __init__(self, registry: str, trainer: str, job_id: int, pool_size: int = 4, timeout: float = 30):
+        self.registry = registry.rstrip("/")
+        self.trainer = trainer
+        self.job_id = job_id
+        self.timeout = timeout
+        self.session = requests.Session()
+        # повторяем только установку соединения: потоковое тело нельзя отправить второй раз
+        adapter = HTTPAdapter(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            max_retries=Retry(connect=3, read=0, backoff_factor=0.3),
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def get_task(self) -> dict:
+        resp = self.session.post(
+            f"{self.registry}/get_task",
+            json={"trainer": self.trainer, "job_id": self.job_id},
+            timeout=self.timeout,
+        )
+        resp.raise_for_status()
+        return resp.json()
+
+    def sync_model(self, replica) -> bool:
+        """Refresh a `common.model_diff.ModelReplica` of the global model; True if it changed."""
+        return replica.sync(self.session, self.registry, self.timeout)
+
+    def upload_delta(self, chunks, delta_hash: str, content_type: str = "application/octet-stream",
+                     merkle_chunk_size: int = DEFAULT_CHUNK_SIZE, base_version: Optional[int] = None) -> dict:
+        """Stream the delta to the orchestrator as a chunked request body."""
+        params = {"trainer": self.trainer, "job_id": self.job_id}
+        if base_version is not None:
+            params["base_version"] = base_version
+        resp = self.session.post(
+            f"{self.registry}/upload_delta",
+            params=params,
+            data=chunks,
+            headers={
+                "Content-Type": content_type,
+                "X-Update-Hash": delta_hash,
+                "X-Merkle-Chunk-Size": str(merkle_chunk_size),
+            },
+            timeout=self.timeout,
+        )
+        resp.raise_for_status()
+        return _checked(resp.json())
+
+    def upload_chunks(self, parts, delta_hash: str, leaves: list, compressed: bool = False,
+                      chunk_size: int = DEFAULT_CHUNK_SIZE, attempts: int = 3,
+                      base_version: Optional[int] = None) -> dict:
+        """Resumable upload: declare the Merkle leaves, then send only the chunks still missing.
+
+        A failed chunk does not restart the upload; the next attempt asks
+        the orchestrator which chunks it still lacks. Raises `UploadRejected`
+        if the orchestrator refuses the session, a chunk or the finished delta.
+        """
+        size = sum(memoryview(p).nbytes for p in parts)
+        result = {}
+        for attempt in range(attempts):
+            resp = self.session.post(
+                f"{self.registry}/uploads",
+                json={
+                    "trainer": self.trainer,
+                    "job_id": self.job_id,
+                    "update_hash": delta_hash,
+                    "size": size,
+                    "chunk_size": chunk_size,
+                    "leaves": [leaf.hex() for leaf in leaves],
+                    "compressed": compressed,
+                    "base_version": base_version,
+                },
+                timeout=self.timeout,
+            )
+            resp.raise_for_status()
+            session = _checked(resp.json())
+            missing = set(session["missing"])
+            if not missing:
+                return {"status": "complete", "update_hash": delta_hash}
+            try:
+                for i, chunk in enumerate(iter_chunks(parts, chunk_size)):
+                    if i not in missing:
+                        continue
+                    resp = self.session.put(
+                        f"{self.registry}/uploads/{session['upload_id']}/chunks/{i}",
+                        data=bytes(chunk),
+                        headers={"Content-Type": "application/octet-stream"},
+                        timeout=self.timeout,
+                    )
+                    resp.raise_for_status()
+                    result = _checked(resp.json())
+                return result
+            except requests.RequestException:
+                if attempt == attempts - 1:
+                    raise
+        return result
+
+    def submit_update(self, delta_hash: str, lease_id: Optional[str] = None) -> dict:
+        resp = self.session.post(
+            f"{self.registry}/submit_update",
+            json={"trainer": self.trainer, "job_id": self.job_id, "update_hash": delta_hash,
+                  "lease_id": lease_id},
+            timeout=self.timeout,
+        )
+        resp.raise_for_status()
+        return resp.json()
+
+    def release_task(self, lease_id: str) -> dict:
+        """Give an unfinished lease back to the orchestrator's pool."""
+        resp = self.session.post(
+            f"{self.registry}/release_task",
+            json={"trainer": self.trainer, "job_id": self.job_id, "lease_id": lease_id},
+            timeout=self.timeout,
+        )
+        resp.raise_for_status()
+        return resp.json()
+
+    def close(self):
+        self.session.close()
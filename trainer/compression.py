@@ -0,0 +1,123 @@
+"""
+Delta compression for upload.
+
+Compressed payloads are self-describing: a 16-byte header (magic, mode,
+number of parameters) followed by mode-specific sections, as defined in
+common/delta_format.py, which also decodes them. The update hash is taken
+over the whole payload, header included.
+
+Modes:
+    none   raw float32, no header (what /upload_delta accepted originally)
+    fp16   float16 values
+    int8   per-tensor symmetric int8 with one float32 scale per tensor
+    topk   k largest-magnitude coordinates as uint32 indices + float32 values
+"""
+
+import struct
+from typing import Optional
+
+import numpy as np
+import torch
+
+from common.delta_format import CONTENT_TYPE, MODES, decode_into
+from common.delta_format import pack_header as _header
+from trainer.flatparams import as_bytes
+
+
+def encode_fp16(delta: torch.Tensor) -> list:
+    return [_header("fp16", delta.numel()), as_bytes(delta.to(torch.float16))]
+
+
+def encode_int8(delta: torch.Tensor, segments: list) -> list:
+    """`segments` are the element counts of the original tensors, in flat order."""
+    n = delta.numel()
+    if sum(segments) != n:
+        raise ValueError(f"Segments cover {sum(segments)} of {n} params")
+    sizes = np.asarray(segments, dtype=np.uint64)
+    scales = np.empty(len(segments), dtype=np.float32)
+    quantized = torch.empty(n, dtype=torch.int8)
+    offset = 0
+    for i, size in enumerate(segments):
+        part = delta[offset:offset + size]
+        amax = float(part.abs().max()) if size else 0.0
+        scale = amax / 127.0 if amax > 0 else 1.0
+        scales[i] = scale
+        quantized[offset:offset + size] = torch.round(part / scale).clamp_(-127, 127).to(torch.int8)
+        offset += size
+    return [
+        _header("int8", n),
+        struct.pack("<Ixxxx", len(segments)),
+        sizes.tobytes(),
+        scales.tobytes(),
+        as_bytes(quantized),
+    ]
+
+
+def encode_topk(delta: torch.Tensor, ratio: float) -> list:
+    n = delta.numel()
+    if n >= 1 << 31:
+        raise ValueError("topk indices are 32-bit, model too large")
+    k = max(1, min(n, int(n * ratio)))
+    _, idx = torch.topk(delta.abs(), k, sorted=False)
+    # отсортированные индексы — последовательный scatter при декодировании
+    idx, _ = torch.sort(idx)
+    values = delta[idx]
+    return [
+        _header("topk", n),
+        struct.pack("<Q", k),
+        as_bytes(idx.to(torch.int32)),
+        as_bytes(values),
+    ]
+
+
+def decode(parts: list, n_params: int) -> torch.Tensor:
+    """Local reconstruction of an encoded delta, used for error feedback.
+
+    int8 payloads carry their own segment sizes, so none are passed here.
+    """
+    out = torch.empty(n_params, dtype=torch.float32)
+    # одна склейка частей (memoryview/bytes) в непрерывный payload, декодирование — сразу в out
+    decode_into(np.frombuffer(b"".join(parts), dtype=np.uint8), out.numpy())
+    return out
+
+
+class DeltaCompressor:
+    """Encodes flat deltas; optionally keeps an error-feedback residual across rounds."""
+
+    def __init__(self, mode: str = "none", topk_ratio: float = 0.01,
+                 segments: Optional[list] = None, error_feedback: bool = False):
+        if mode not in MODES:
+            raise ValueError(f"Unknown compression mode: {mode}")
+        if mode == "int8" and not segments:
+            raise ValueError("int8 compression needs tensor segments")
+        self.mode = mode
+        self.topk_ratio = topk_ratio
+        self.segments = segments
+        self.error_feedback = error_feedback and mode != "none"
+        self._residual: Optional[torch.Tensor] = None
+
+    @property
+    def content_type(self) -> str:
+        return "application/octet-stream" if self.mode == "none" else CONTENT_TYPE
+
+    def encode(self, delta: torch.Tensor) -> list:
+        """Return the payload as a list of bytes-like parts (streamed, never joined)."""
+        if self.mode == "none":
+            return [as_bytes(delta)]
+        if self.error_feedback:
+            if self._residual is None:
+                self._residual = torch.zeros_like(delta)
+            # то, что не ушло в прошлых раундах, добавляется к текущей дельте
+            self._residual.add_(delta)
+            delta = self._residual
+        parts = self._encode(delta)
+        if self.error_feedback:
+            self._residual.sub_(decode(parts, delta.numel()))
+        return parts
+
+    def _encode(self, delta: torch.Tensor) -> list:
+        if self.mode == "fp16":
+            return encode_fp16(delta)
+        if self.mode == "int8":
+            return encode_int8(delta, self.segments)
+        return encode_topk(delta, self.topk_ratio)
@@ -0,0 +1,144 @@
+"""
+Training loop of the trainer, kept alive across rounds.
+
+`TrainingEngine` owns one optimizer (and its momentum buffers) for the
+lifetime of the process. The parameters it updates are the views of
+`FlatParameters`, so loading the global model or snapshotting between rounds
+changes the values under the optimizer, not its parameter list. Options:
+
+    accumulate  micro-batches per optimizer step: the effective batch is
+                accumulate * batch_size and the loss is averaged over it
+    precision   "fp32", or "bf16" to run forward/loss under CPU autocast;
+                the weights, gradients and uploaded delta stay float32
+    compile     torch.compile the model; the first round pays for compilation
+    prefetch    batches a background thread prepares ahead (uint8 -> float,
+                flatten) while the current one trains; 0 prepares inline
+
+`benchmarks/bench_train.py` reports samples/s of each option on the host.
+"""
+
+import itertools
+import queue
+import threading
+import time
+from contextlib import nullcontext
+
+import torch
+import torch.nn as nn
+
+PRECISIONS = ("fp32", "bf16")
+
+
+def prepare_batch(x: torch.Tensor, y: torch.Tensor) -> tuple:
+    """Model input of one batch: float [batch, features] and int64 labels."""
+    if not x.is_floating_point():
+        # шарды хранят uint8-пиксели; приведение — единственная копия батча
+        x = x.float().div_(255)
+    return x.reshape(x.size(0), -1), y
+
+
+def _prefetched(batches, depth: int):
+    """Yield prepared batches produced by a background thread, up to `depth` ahead."""
+    ready: queue.Queue = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    done = object()
+
+    def offer(item) -> bool:
+        # put с таймаутом: поток не должен висеть, если потребитель бросил цикл
+        while not stop.is_set():
+            try:
+                ready.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for x, y in batches:
+                if not offer(prepare_batch(x, y)):
+                    return
+            offer(done)
+        except BaseException as e:
+            offer(e)
+
+    thread = threading.Thread(target=produce, name="batch-prefetch", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = ready.get()
+            if item is done:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        thread.join(timeout=5)
+
+
+class TrainingEngine:
+    def __init__(self, model: nn.Module, lr: float = 0.01, momentum: float = 0.0, accumulate: int = 1,
+                 precision: str = "fp32", compile: bool = False, prefetch: int = 0):
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unknown precision {precision!r}, expected one of {PRECISIONS}")
+        if accumulate < 1:
+            raise ValueError(f"accumulate must be >= 1, got {accumulate}")
+        self.model = model
+        self.accumulate = accumulate
+        self.precision = precision
+        self.prefetch = prefetch
+        self.optimizer = torch.optim.SGD(model.parameters(), lr=lr, momentum=momentum)
+        self.loss_fn = nn.CrossEntropyLoss()
+        # скомпилированная обёртка делит параметры с model — FlatParameters и оптимизатор её не замечают
+        self.forward = torch.compile(model) if compile else model
+        self.last_samples = 0
+        self.last_seconds = 0.0
+
+    @property
+    def samples_per_sec(self) -> float:
+        """Throughput of the last `train()` call."""
+        return self.last_samples / self.last_seconds if self.last_seconds else 0.0
+
+    def _autocast(self):
+        if self.precision == "bf16":
+            return torch.autocast("cpu", dtype=torch.bfloat16)
+        return nullcontext()
+
+    def _step(self, micro_batches: int):
+        if micro_batches > 1:
+            # градиенты микробатчей суммировались — шаг делается по среднему
+            for group in self.optimizer.param_groups:
+                for p in group["params"]:
+                    if p.grad is not None:
+                        p.grad.div_(micro_batches)
+        self.optimizer.step()
+        self.optimizer.zero_grad(set_to_none=True)
+
+    def train(self, batches, steps: int) -> int:
+        """Train on the first `steps` batches of `batches`; return the number of samples seen.
+
+        Every `accumulate` batches, and after the last one, make one
+        optimizer step with the mean gradient of those batches.
+        """
+        started = time.perf_counter()
+        self.model.train()
+        source = itertools.islice(batches, steps)
+        prepared = (_prefetched(source, self.prefetch) if self.prefetch
+                    else (prepare_batch(x, y) for x, y in source))
+        samples = pending = 0
+        self.optimizer.zero_grad(set_to_none=True)
+        for x, y in prepared:
+            with self._autocast():
+                loss = self.loss_fn(self.forward(x), y)
+            loss.backward()
+            samples += x.size(0)
+            pending += 1
+            if pending == self.accumulate:
+                self._step(pending)
+                pending = 0
+        if pending:
+            self._step(pending)
+        self.last_samples = samples
+        self.last_seconds = time.perf_counter() - started
+        return samples
@@ -0,0 +1,76 @@
+"""
+Flat contiguous parameter storage for the trainer.
+
+All model parameters are re-pointed into views of one float32 tensor, so
+snapshotting the model is a single copy, the delta is a single in-place
+subtraction and hashing/uploading works on one memoryview.
+"""
+
+import hashlib
+
+import torch
+
+
+class FlatParameters:
+    """Owns the flat parameter buffer of a model and a same-sized snapshot."""
+
+    def __init__(self, model: torch.nn.Module):
+        params = [p for p in model.parameters()]
+        if not params:
+            raise ValueError("Model has no parameters")
+        dtype = params[0].dtype
+        if any(p.dtype != dtype for p in params):
+            raise ValueError("All parameters must share one dtype to be flattened")
+        self.numel = sum(p.numel() for p in params)
+        self.flat = torch.empty(self.numel, dtype=dtype)
+        self.shapes = []
+
+        offset = 0
+        with torch.no_grad():
+            for p in params:
+                n = p.numel()
+                view = self.flat[offset:offset + n]
+                view.copy_(p.detach().reshape(-1))
+                # параметр остаётся тем же объектом, меняется только его хранилище
+                p.data = view.view_as(p)
+                self.shapes.append(tuple(p.shape))
+                offset += n
+
+        self._snapshot = torch.empty_like(self.flat)
+        self._is_delta = False
+
+    @property
+    def nbytes(self) -> int:
+        return self.flat.numel() * self.flat.element_size()
+
+    def snapshot(self):
+        """Remember current parameters (one memcpy into the reusable buffer)."""
+        self._snapshot.copy_(self.flat)
+        self._is_delta = False
+
+    def delta(self) -> torch.Tensor:
+        """Turn the snapshot buffer into `current - snapshot` in place and return it.
+
+        The returned tensor is reused by the next `snapshot()`, so consumers
+        must finish with it (hash, upload) before the next round starts.
+        """
+        if not self._is_delta:
+            self._snapshot.neg_().add_(self.flat)
+            self._is_delta = True
+        return self._snapshot
+
+    def load_(self, values: torch.Tensor):
+        """Overwrite parameters from a flat tensor (e.g. new global weights)."""
+        self.flat.copy_(values.reshape(-1))
+
+    def apply_delta_(self, delta: torch.Tensor):
+        self.flat.add_(delta.reshape(-1))
+
+
+def as_bytes(tensor: torch.Tensor) -> memoryview:
+    """Raw byte view of a contiguous CPU tensor, no copy."""
+    return memoryview(tensor.detach().contiguous().numpy()).cast("B")
+
+
+def hash_tensor(tensor: torch.Tensor) -> str:
+    return hashlib.sha256(as_bytes(tensor)).hexdigest()
@@ -0,0 +1,156 @@
+"""
+Local pool of training processes behind one orchestrator client.
+
+The coordinator keeps the model's flat parameters in shared memory. For
+every leased task it splits the batch range between N worker processes,
+each of which loads the shared weights, trains its sub-range with its own
+`torch.set_num_threads` budget and writes its delta into a row of a
+shared [N, n_params] buffer. The coordinator averages the rows weighted by
+steps and applies the result to the shared parameters, so the pool uploads
+one pre-aggregated delta per task and talks to the orchestrator like a
+single (faster) trainer.
+"""
+
+import os
+import queue
+import time
+
+import torch
+import torch.multiprocessing as mp
+
+from common.shards import ShardedDataset
+from trainer.flatparams import FlatParameters
+from trainer.engine import TrainingEngine
+from trainer.trainer import initial_model, shard_batches
+
+RESULT_TIMEOUT = 600.0
+
+
+def split_steps(steps: int, n: int) -> list:
+    """Contiguous (offset, size) parts of `steps` batches for up to `n` workers."""
+    parts = []
+    offset = 0
+    for i in range(n):
+        size = steps // n + (1 if i < steps % n else 0)
+        if size:
+            parts.append((offset, size))
+        offset += size
+    return parts
+
+
+def _worker_main(rank, global_flat, deltas, tasks, results, seed, data_dir, batch_size, threads, engine_options):
+    torch.set_num_threads(threads)
+    model = initial_model(seed)
+    flat_params = FlatParameters(model)
+    engine = TrainingEngine(model, **engine_options)
+    if data_dir:
+        dataset = ShardedDataset(data_dir)
+        data_for = lambda task: shard_batches(dataset, task, batch_size)
+    else:
+        gen = torch.Generator().manual_seed(seed * 1000 + rank + 1)
+        data = torch.utils.data.TensorDataset(torch.randn(100, 1, 28, 28, generator=gen),
+                                              torch.randint(0, 10, (100,), generator=gen))
+        loader = torch.utils.data.DataLoader(data, batch_size=batch_size)
+        data_for = lambda task: loader
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+        round_id = task["round"]
+        try:
+            started = time.perf_counter()
+            flat_params.load_(global_flat)
+            flat_params.snapshot()
+            samples = engine.train(data_for(task), task["steps"])
+            deltas[rank].copy_(flat_params.delta())
+            results.put((round_id, rank, task["steps"], samples, time.perf_counter() - started, None))
+        except Exception as e:
+            results.put((round_id, rank, 0, 0, 0.0, f"{type(e).__name__}: {e}"))
+
+
+class TrainerPool:
+    def __init__(self, flat_params: FlatParameters, n_workers: int, seed: int = 0,
+                 data_dir=None, batch_size: int = 10, threads_per_worker: int = 0,
+                 engine_options: dict = None):
+        self.flat_params = flat_params
+        self.n_workers = n_workers
+        self.seed = seed
+        self.data_dir = data_dir
+        self.batch_size = batch_size
+        self.threads = threads_per_worker or max(1, (os.cpu_count() or 1) // n_workers)
+        # TrainingEngine каждого воркера: точность, накопление, compile — см. trainer/engine.py
+        self.engine_options = engine_options or {}
+        # параметры координатора и строки дельт — в общей памяти, воркеры читают их без копий по IPC
+        flat_params.flat.share_memory_()
+        self.deltas = torch.zeros(n_workers, flat_params.numel, dtype=flat_params.flat.dtype).share_memory_()
+        self._ctx = mp.get_context("spawn")
+        self._tasks = [self._ctx.SimpleQueue() for _ in range(n_workers)]
+        self._results = self._ctx.Queue()
+        self._procs = []
+        self._round = 0
+        self.last_timings: list = []
+
+    def start(self):
+        for rank in range(self.n_workers):
+            proc = self._ctx.Process(
+                target=_worker_main,
+                args=(rank, self.flat_params.flat, self.deltas, self._tasks[rank], self._results,
+                      self.seed, self.data_dir, self.batch_size, self.threads, self.engine_options),
+                name=f"trainer-worker-{rank}",
+                daemon=True,
+            )
+            proc.start()
+            self._procs.append(proc)
+
+    def train(self, task: dict) -> int:
+        """Train one leased task across the pool and fold the averaged delta into the shared params.
+
+        Returns the number of samples the workers trained on.
+        """
+        self._round += 1
+        parts = split_steps(task["steps"], self.n_workers)
+        for rank, (offset, size) in enumerate(parts):
+            self._tasks[rank].put({
+                "round": self._round,
+                "shard_id": task.get("shard_id", 0),
+                "start": task.get("start", 0) + offset,
+                "steps": size,
+            })
+
+        done = {}
+        errors = []
+        deadline = time.monotonic() + RESULT_TIMEOUT
+        while len(done) + len(errors) < len(parts):
+            try:
+                round_id, rank, steps, samples, seconds, error = self._results.get(timeout=1.0)
+            except queue.Empty:
+                dead = [p.name for p in self._procs if not p.is_alive()]
+                if dead or time.monotonic() > deadline:
+                    raise RuntimeError(f"Trainer pool stalled (dead workers: {dead or 'none'})")
+                continue
+            if round_id != self._round:
+                continue
+            if error:
+                errors.append(f"worker {rank}: {error}")
+            else:
+                done[rank] = (steps, samples, seconds)
+        if errors:
+            raise RuntimeError("; ".join(errors))
+
+        # локальная предагрегация: среднее дельт, взвешенное по числу шагов
+        total = sum(steps for steps, _, _ in done.values())
+        with torch.no_grad():
+            for rank, (steps, _, _) in done.items():
+                self.flat_params.flat.add_(self.deltas[rank], alpha=steps / total)
+        self.last_timings = [done[r][2] for r in sorted(done)]
+        return sum(samples for _, samples, _ in done.values())
+
+    def close(self):
+        for q in self._tasks:
+            q.put(None)
+        for proc in self._procs:
+            proc.join(timeout=5)
+            if proc.is_alive():
+                proc.terminate()
+        self._procs = []
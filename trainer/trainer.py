@@ -1,11 +1,18 @@
 import argparse
 import requests
-from web3 import Web3
 import torch
 import torch.nn as nn
-import hashlib
-import json
-import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from common.merkle import DEFAULT_CHUNK_SIZE, hash_leaves, merkle_root
+from common.model_diff import ModelReplica
+from common.shards import ShardedDataset
+from trainer.client import UPLOAD_CHUNK_SIZE, OrchestratorClient, UploadRejected
+from trainer.compression import MODES as COMPRESSION_MODES
+from trainer.compression import DeltaCompressor
+from trainer.engine import PRECISIONS, TrainingEngine
+from trainer.flatparams import FlatParameters
 
 # Пример простой модели
 class SimpleModel(nn.Module):
@@ -15,51 +22,230 @@ class SimpleModel(nn.Module):
     def forward(self, x):
         return self.layer(x)
 
+def initial_model(seed: int = 0) -> SimpleModel:
+    # начальная модель должна совпадать у тренеров и валидатора: общий seed
+    state = torch.random.get_rng_state()
+    torch.manual_seed(seed)
+    model = SimpleModel()
+    torch.random.set_rng_state(state)
+    return model
+
 def train_steps(model, data_loader, steps=10):
-    model.train()
-    optimizer = torch.optim.SGD(model.parameters(), lr=0.01)
-    loss_fn = nn.CrossEntropyLoss()
-    for i, (x, y) in enumerate(data_loader):
-        if i >= steps:
-            break
-        pred = model(x.view(x.size(0), -1))
-        loss = loss_fn(pred, y)
-        optimizer.zero_grad()
-        loss.backward()
-        optimizer.step()
-
-def compute_delta(old_state, new_state):
-    delta = {}
-    for k in old_state.keys():
-        delta[k] = new_state[k] - old_state[k]
-    # сериализуем дельту в строку для хэширования
-    delta_bytes = b''.join([v.cpu().numpy().tobytes() for v in delta.values()])
-    return hashlib.sha256(delta_bytes).hexdigest()
+    """One-off training with a throwaway engine; long-lived trainers keep a TrainingEngine."""
+    return TrainingEngine(model).train(data_loader, steps)
+
+def shard_batches(dataset, task, batch_size):
+    """Zero-copy torch views of the batches leased in `task` from a memory-mapped dataset."""
+    for x, y in dataset.batches(task.get("shard_id", 0), task.get("start", 0), task["steps"], batch_size):
+        y = torch.from_numpy(y)
+        yield torch.from_numpy(x), y if y.dtype == torch.int64 else y.long()
+
+def delta_chunks(parts, chunk_size=UPLOAD_CHUNK_SIZE):
+    """Yield slices of the payload parts' memoryviews without copying them."""
+    for part in parts:
+        buf = memoryview(part).cast("B")
+        for start in range(0, len(buf), chunk_size):
+            yield buf[start:start + chunk_size]
+
+def compute_delta(flat_params, compressor, chunk_size=DEFAULT_CHUNK_SIZE, hash_workers=0):
+    """Return (Merkle root hex, leaf hashes, payload parts) of the encoded delta.
+
+    Leaves are SHA-256 of fixed-size chunks hashed on a thread pool; the
+    root is what gets committed on chain.
+    """
+    # дельта считается на месте в буфере снапшота, хэш — по сжатому payload
+    parts = compressor.encode(flat_params.delta())
+    leaves = hash_leaves(parts, chunk_size, workers=hash_workers)
+    return merkle_root(leaves).hex(), leaves, parts
+
+def global_model_sync(client, flat_params):
+    """Return `sync(task)` that loads the current global model into `flat_params`.
+
+    The replica is refreshed over HTTP only when the task names a version it
+    does not hold, and then with a diff where possible; the local params are
+    reset to initial + global delta before every task.
+    """
+    init_flat = flat_params.flat.clone()
+    replica = ModelReplica()
+
+    def sync(task):
+        if replica.flat is None or task.get("model_version") != replica.version:
+            try:
+                client.sync_model(replica)
+            except (requests.RequestException, ValueError) as e:
+                print(f"Model sync failed: {e}, training from v{replica.version}")
+        # на месте, в буфер параметров: без временного тензора размером с модель на каждую задачу
+        flat_params.load_(init_flat)
+        if replica.flat is not None:
+            flat_params.apply_delta_(torch.from_numpy(replica.flat))
+        task["model_version"] = replica.version
+        return replica.last_bytes
+
+    return sync
+
+def release_lease(client, task, done):
+    """Give the task's batch range back to the scheduler right away instead of letting it expire."""
+    if task.get("lease_id"):
+        try:
+            client.release_task(task["lease_id"])
+        except requests.RequestException as e:
+            print(f"Round {done}: release_task failed: {e}")
+
+def run_worker(client, flat_params, train, compressor, rounds=1, retry_delay=2.0,
+               upload_mode="stream", hash_workers=0, sync_model=None):
+    """Train round after round, prefetching the next task while the current one trains.
+
+    `train(task)` updates the parameters behind `flat_params` in place (one
+    process or a local pool) and returns the number of samples it trained
+    on. `sync_model(task)`, if given, loads the global model first and
+    returns the bytes it downloaded. rounds=0 means run until interrupted.
+    """
+    prefetcher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch")
+    next_task = prefetcher.submit(client.get_task)
+    done = 0
+    try:
+        while not rounds or done < rounds:
+            started = time.perf_counter()
+            try:
+                task = next_task.result()
+            except requests.RequestException as e:
+                print(f"get_task failed: {e}, retrying in {retry_delay}s")
+                time.sleep(retry_delay)
+                next_task = prefetcher.submit(client.get_task)
+                continue
+            if not task.get("steps"):
+                # планировщику нечего выдать до конца эпохи
+                time.sleep(task.get("retry_after", retry_delay))
+                next_task = prefetcher.submit(client.get_task)
+                continue
+            done += 1
+            # следующая задача запрашивается, пока идёт обучение
+            if not rounds or done < rounds:
+                next_task = prefetcher.submit(client.get_task)
+
+            try:
+                model_bytes = sync_model(task) if sync_model is not None else 0
+                fetched = time.perf_counter()
+                flat_params.snapshot()
+                samples = train(task) or 0
+                trained = time.perf_counter()
+                delta_hash, leaves, parts = compute_delta(flat_params, compressor, hash_workers=hash_workers)
+                hashed = time.perf_counter()
+            except (RuntimeError, ValueError) as e:
+                # упавший пул, OOM или битая дельта — раунд пропускаем, воркер продолжает
+                print(f"Round {done}: training failed: {e!r}")
+                release_lease(client, task, done)
+                continue
+            try:
+                if upload_mode == "chunked":
+                    client.upload_chunks(parts, delta_hash, leaves, compressed=compressor.mode != "none",
+                                         base_version=task.get("model_version"))
+                else:
+                    client.upload_delta(delta_chunks(parts), delta_hash, content_type=compressor.content_type,
+                                        base_version=task.get("model_version"))
+                client.submit_update(delta_hash, lease_id=task.get("lease_id"))
+            except UploadRejected as e:
+                # отклонённую дельту не регистрируем; диапазон сразу отдаём другим тренерам
+                print(f"Round {done}: upload rejected: {e.reason}")
+                release_lease(client, task, done)
+                continue
+            except requests.RequestException as e:
+                print(f"Round {done}: upload failed: {e}")
+                continue
+            uploaded = time.perf_counter()
+            print(
+                f"Round {done} (shard {task.get('shard_id')}, {task['steps']} steps): "
+                f"fetch {(fetched - started) * 1000:.1f} ms (model v{task.get('model_version', 0)}, "
+                f"{model_bytes} bytes), "
+                f"train {(trained - fetched) * 1000:.1f} ms ({samples / (trained - fetched):.0f} samples/s), "
+                f"encode+hash {(hashed - trained) * 1000:.1f} ms, "
+                f"upload {(uploaded - hashed) * 1000:.1f} ms, "
+                f"hash={delta_hash[:16]}..."
+            )
+    finally:
+        next_task.cancel()
+        prefetcher.shutdown(wait=False)
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--registry", required=True)
     parser.add_argument("--job", type=int, required=True)
     parser.add_argument("--trainer", required=True)
+    parser.add_argument("--daemon", action="store_true", help="keep training round after round")
+    parser.add_argument("--rounds", type=int, default=0, help="rounds in daemon mode, 0 = forever")
+    parser.add_argument("--compression", choices=list(COMPRESSION_MODES), default="none")
+    parser.add_argument("--topk-ratio", type=float, default=0.01)
+    parser.add_argument("--error-feedback", action="store_true", help="carry compression error to the next round")
+    parser.add_argument("--upload-mode", choices=["stream", "chunked"], default="stream",
+                        help="chunked = resumable upload of Merkle chunks")
+    parser.add_argument("--hash-workers", type=int, default=0, help="threads for chunk hashing, 0 = one per core")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the shared initial model")
+    parser.add_argument("--data", help="sharded dataset directory (python -m common.shards), random data if unset")
+    parser.add_argument("--batch-size", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="local training processes sharing one model and one upload")
+    parser.add_argument("--threads-per-worker", type=int, default=0, help="torch threads per worker, 0 = cores / workers")
+    parser.add_argument("--sync-model", action=argparse.BooleanOptionalAction, default=True,
+                        help="start every task from the orchestrator's global model")
+    parser.add_argument("--lr", type=float, default=0.01)
+    parser.add_argument("--momentum", type=float, default=0.0, help="SGD momentum, kept across rounds")
+    parser.add_argument("--accumulate", type=int, default=1,
+                        help="batches per optimizer step (effective batch = accumulate * batch size)")
+    parser.add_argument("--precision", choices=list(PRECISIONS), default="fp32",
+                        help="bf16 = CPU autocast for forward/loss, weights stay float32")
+    parser.add_argument("--compile", action="store_true", help="torch.compile the model (slow first round)")
+    parser.add_argument("--prefetch", type=int, default=0,
+                        help="batches prepared ahead by a background thread, 0 = inline")
     args = parser.parse_args()
 
     # Загружаем модель и данные (упрощённо)
-    model = SimpleModel()
-    dataset = torch.utils.data.TensorDataset(torch.randn(100, 1, 28, 28), torch.randint(0,10,(100,)))
-    loader = torch.utils.data.DataLoader(dataset, batch_size=10)
-
-    # Запрос задачи у оркестратора
-    resp = requests.post(f"{args.registry}/get_task", json={"trainer": args.trainer, "job_id": args.job})
-    task = resp.json()
-    # Сохраняем старое состояние модели
-    old_state = {k: v.clone() for k, v in model.state_dict().items()}
-    # Выполняем обучение K шагов
-    train_steps(model, loader, steps=task["steps"])
-    # Вычисляем delta и хэш
-    delta_hash = compute_delta(old_state, model.state_dict())
-    # Отправляем хэш обновления в оркестратор/контракт
-    requests.post(f"{args.registry}/submit_update",
-                  json={"trainer": args.trainer, "job_id": args.job, "update_hash": delta_hash, "index": 0})
+    model = initial_model(args.seed)
+    flat_params = FlatParameters(model)
+    compressor = DeltaCompressor(
+        args.compression,
+        topk_ratio=args.topk_ratio,
+        segments=[p.numel() for p in model.parameters()],
+        error_feedback=args.error_feedback,
+    )
+    # оптимизатор и скомпилированная модель живут весь процесс, а не одну задачу
+    engine_options = dict(lr=args.lr, momentum=args.momentum, accumulate=args.accumulate,
+                          precision=args.precision, compile=args.compile, prefetch=args.prefetch)
+    pool = None
+    if args.workers > 1:
+        # локальный пул: параметры в общей памяти, одна дельта на все процессы
+        from trainer.pool import TrainerPool
+        pool = TrainerPool(flat_params, args.workers, seed=args.seed, data_dir=args.data,
+                           batch_size=args.batch_size, threads_per_worker=args.threads_per_worker,
+                           engine_options=engine_options)
+        pool.start()
+        train = pool.train
+    elif args.data:
+        # шарды отображаются в память лениво: читается только выданный планировщиком диапазон
+        dataset = ShardedDataset(args.data)
+        engine = TrainingEngine(model, **engine_options)
+        train = lambda task: engine.train(shard_batches(dataset, task, args.batch_size), task["steps"])
+    else:
+        dataset = torch.utils.data.TensorDataset(torch.randn(100, 1, 28, 28), torch.randint(0,10,(100,)))
+        loader = torch.utils.data.DataLoader(dataset, batch_size=args.batch_size)
+        engine = TrainingEngine(model, **engine_options)
+        train = lambda task: engine.train(loader, task["steps"])
+
+    # Одна сессия с пулом соединений на всё время жизни процесса
+    client = OrchestratorClient(args.registry, args.trainer, args.job)
+    try:
+        run_worker(
+            client, flat_params, train, compressor,
+            rounds=args.rounds if args.daemon else 1,
+            upload_mode=args.upload_mode,
+            hash_workers=args.hash_workers,
+            sync_model=global_model_sync(client, flat_params) if args.sync_model else None,
+        )
+    except KeyboardInterrupt:
+        pass
+    finally:
+        client.close()
+        if pool is not None:
+            pool.close()
     print("Delta sent")
 
 if __name__ == "__main__":
@@ -0,0 +1,74 @@
+"""
+Batched evaluation of candidate deltas.
+
+Every candidate is `global params + delta`; N candidates are stacked into
+one [N, n_params] tensor, split into per-parameter views and pushed
+through the model in a single `torch.func.vmap` over `functional_call`,
+so validating N updates costs about one forward pass over the held-out
+batch instead of N.
+"""
+
+from typing import Optional
+
+import torch
+import torch.nn as nn
+from torch.func import functional_call, vmap
+
+
+class BatchedValidator:
+    def __init__(self, model: nn.Module, holdout_x: torch.Tensor, holdout_y: torch.Tensor,
+                 tolerance: float = 0.05, max_batch: int = 64):
+        self.model = model.eval()
+        self.names = [name for name, _ in model.named_parameters()]
+        self.shapes = [tuple(p.shape) for _, p in model.named_parameters()]
+        self.sizes = [p.numel() for _, p in model.named_parameters()]
+        self.n_params = sum(self.sizes)
+        self.x = holdout_x.reshape(holdout_x.size(0), -1)
+        self.y = holdout_y
+        self.tolerance = tolerance
+        self.max_batch = max_batch
+        self.loss_fn = nn.CrossEntropyLoss()
+        self.base = torch.cat([p.detach().reshape(-1) for p in model.parameters()])
+        self._base_loss: Optional[float] = None
+
+        def loss_of(params: dict) -> torch.Tensor:
+            return self.loss_fn(functional_call(self.model, params, (self.x,)), self.y)
+
+        # vmap по первой оси каждого параметра: один проход на всю пачку кандидатов
+        self._batched_loss = vmap(loss_of)
+
+    def load_global(self, flat: torch.Tensor):
+        if flat.numel() != self.n_params:
+            raise ValueError(f"Global model has {flat.numel()} params, expected {self.n_params}")
+        self.base = flat.reshape(-1).to(self.base.dtype).clone()
+        self._base_loss = None
+
+    def _split(self, stacked: torch.Tensor) -> dict:
+        n = stacked.size(0)
+        views = torch.split(stacked, self.sizes, dim=1)
+        return {name: v.reshape(n, *shape) for name, v, shape in zip(self.names, views, self.shapes)}
+
+    @torch.no_grad()
+    def base_loss(self) -> float:
+        if self._base_loss is None:
+            self._base_loss = float(self._batched_loss(self._split(self.base.unsqueeze(0)))[0])
+        return self._base_loss
+
+    @torch.no_grad()
+    def losses(self, deltas: torch.Tensor) -> torch.Tensor:
+        """Held-out loss of `global + delta` for each row of a [N, n_params] tensor."""
+        if deltas.dim() != 2 or deltas.size(1) != self.n_params:
+            raise ValueError(f"Expected [N, {self.n_params}] deltas, got {tuple(deltas.shape)}")
+        out = torch.empty(deltas.size(0))
+        for start in range(0, deltas.size(0), self.max_batch):
+            chunk = deltas[start:start + self.max_batch]
+            candidates = chunk + self.base
+            out[start:start + chunk.size(0)] = self._batched_loss(self._split(candidates))
+        return out
+
+    def judge(self, deltas: torch.Tensor) -> tuple:
+        """Return (verdicts, losses): a delta is valid if finite and not worse than base by > tolerance."""
+        losses = self.losses(deltas)
+        limit = self.base_loss() * (1 + self.tolerance)
+        verdicts = torch.isfinite(losses) & (losses <= limit)
+        return verdicts.tolist(), losses.tolist()
@@ -1,37 +1,135 @@
 import argparse
+import math
+import time
+
 import requests
-from web3 import Web3
+import torch
+
+from common.delta_format import decode_into
+from common.merkle import hash_leaves, merkle_root
+from common.model_diff import ModelReplica
+from trainer.trainer import initial_model
+from validator.engine import BatchedValidator
+
+
+def holdout_batch(size: int, seed: int) -> tuple:
+    """Held-out batch drawn from its own generator so it never overlaps training data."""
+    gen = torch.Generator().manual_seed(seed)
+    return torch.randn(size, 1, 28, 28, generator=gen), torch.randint(0, 10, (size,), generator=gen)
+
+
+def fetch_pending(session, registry: str, job_id: int, timeout: float) -> list:
+    resp = session.get(f"{registry}/updates", params={"job_id": job_id, "pending": True}, timeout=timeout)
+    resp.raise_for_status()
+    return resp.json()["updates"]
+
+
+def load_delta(session, registry: str, update: dict, out: torch.Tensor, timeout: float):
+    """Download a payload, check it against its Merkle root and decode it into `out`."""
+    resp = session.get(f"{registry}/updates/{update['update_hash']}/payload", timeout=timeout)
+    resp.raise_for_status()
+    payload = resp.content
+    root = merkle_root(hash_leaves([payload], update["chunk_size"])).hex()
+    if root != update["update_hash"]:
+        raise ValueError(f"Payload does not match root {update['update_hash'][:16]}...")
+    if update["compression"] == "none":
+        if len(payload) != out.numel() * 4:
+            raise ValueError(f"Raw delta has {len(payload)} bytes, expected {out.numel() * 4}")
+        out.copy_(torch.frombuffer(bytearray(payload), dtype=torch.float32))
+    else:
+        decode_into(payload, out.numpy())
+
+
+def validate_round(session, registry: str, job_id: int, validator_address: str,
+                   engine: BatchedValidator, init_flat: torch.Tensor,
+                   replica: ModelReplica, timeout: float = 30) -> dict:
+    """Judge every pending update of the job in batched forward passes and report verdicts."""
+    started = time.perf_counter()
+    # глобальная модель перекачивается только при смене версии, и то диффом
+    if replica.sync(session, registry, timeout):
+        engine.load_global(init_flat + torch.from_numpy(replica.flat))
+    version = replica.version
+    updates = fetch_pending(session, registry, job_id, timeout)
+    if not updates:
+        return {"version": version, "validated": 0, "seconds": time.perf_counter() - started}
+
+    deltas = torch.empty(len(updates), engine.n_params)
+    # повреждённые или непарсящиеся payload сразу считаются невалидными
+    broken = set()
+    for i, update in enumerate(updates):
+        try:
+            load_delta(session, registry, update, deltas[i], timeout)
+        except (requests.RequestException, ValueError) as e:
+            print(f"Update {update['update_hash'][:16]}...: {e}")
+            deltas[i].zero_()
+            broken.add(i)
+    fetched = time.perf_counter()
+
+    verdicts, losses = engine.judge(deltas)
+    evaluated = time.perf_counter()
+
+    for i, update in enumerate(updates):
+        valid = verdicts[i] and i not in broken
+        loss = losses[i] if i not in broken and math.isfinite(losses[i]) else None
+        try:
+            session.post(
+                f"{registry}/submit_validation",
+                json={
+                    "validator": validator_address,
+                    "job_id": job_id,
+                    "valid": valid,
+                    "update_hash": update["update_hash"],
+                    "loss": loss,
+                },
+                timeout=timeout,
+            )
+        except requests.RequestException as e:
+            print(f"submit_validation failed: {e}")
+    n_valid = sum(1 for i in range(len(updates)) if verdicts[i] and i not in broken)
+    print(
+        f"Validated {len(updates)} updates ({n_valid} valid) against model v{version}: "
+        f"fetch {(fetched - started) * 1000:.1f} ms, eval {(evaluated - fetched) * 1000:.1f} ms, "
+        f"base loss {engine.base_loss():.4f}"
+    )
+    return {"version": version, "validated": len(updates), "seconds": time.perf_counter() - started}
+
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--registry", required=True)
     parser.add_argument("--job", type=int, required=True)
     parser.add_argument("--validator", required=True)
+    parser.add_argument("--daemon", action="store_true", help="keep polling for pending updates")
+    parser.add_argument("--interval", type=float, default=5.0, help="seconds between polls in daemon mode")
+    parser.add_argument("--holdout-size", type=int, default=512)
+    parser.add_argument("--tolerance", type=float, default=0.05,
+                        help="allowed relative loss increase over the global model")
+    parser.add_argument("--max-batch", type=int, default=64, help="candidate deltas per forward pass")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the shared initial model")
     args = parser.parse_args()
 
-    # Пример: получаем список апдейтов и валидируем первую запись (индекс=0)
-    # В реальном приложении оркестратор должен предоставить данные для проверки
-    # Здесь логика проверки упрощена: всегда считаем обновление валидным
-    job_id = args.job
-    index = 0
-    valid = True
+    model = initial_model(args.seed)
+    x, y = holdout_batch(args.holdout_size, args.seed + 1)
+    engine = BatchedValidator(model, x, y, tolerance=args.tolerance, max_batch=args.max_batch)
+    init_flat = engine.base.clone()
 
-    # Отправляем транзакцию validateUpdate в контракт
-    # В этом примере отправка в контракт не реализована: требуется подключение к узлу и подпись транзакции
+    registry = args.registry.rstrip("/")
+    session = requests.Session()
+    replica = ModelReplica()
     try:
-        requests.post(
-            f"{args.registry}/submit_validation",
-            json={
-                "validator": args.validator,
-                "job_id": job_id,
-                "index": index,
-                "valid": valid,
-            },
-            timeout=3,
-        )
-    except requests.RequestException:
+        while True:
+            try:
+                validate_round(session, registry, args.job, args.validator,
+                               engine, init_flat, replica)
+            except (requests.RequestException, ValueError) as e:
+                print(f"Validation round failed: {e}")
+            if not args.daemon:
+                break
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
         pass
-    print(f"Validated update {index} for job {job_id}: {valid}")
+    finally:
+        session.close()
 
 if __name__ == "__main__":
     main()